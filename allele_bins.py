@@ -0,0 +1,124 @@
+import hashlib
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from genotype_store import CSV_ENCODING, CSV_SEP, GenotypeTable, split_allele_column
+from parentage_engine import normalize_allele
+
+
+# Bin table (CSV, the scripts' dialect), one row per bin:
+#   source;locus;low;high;allele
+# A raw fragment size of the locus reported by source with low <= size <= high is read as allele.
+# Rows with an empty source hold for every source that has no bins of its own for that locus.
+BIN_COLUMNS = ["source", "locus", "low", "high", "allele"]
+
+# Bins of one (source, locus): sorted lows, highs and the canonical allele of each bin
+Bins = Tuple[np.ndarray, np.ndarray, List[str]]
+
+
+def allele_size(allele: str) -> Optional[float]:
+    """Fragment size of a normalized allele ("266.4" -> 266.4), None for non-numeric alleles."""
+    try:
+        size = float(allele)
+    except ValueError:
+        return None
+    return size if np.isfinite(size) else None
+
+
+class AlleleBins:
+    """Per-source, per-locus bins mapping raw fragment sizes to canonical alleles.
+
+    Labs size the same allele differently (266 / 266.4 / 267); binning is applied once when
+    genotypes are loaded, so the integer codes of all sources compare directly afterwards.
+    Alleles that are not numbers or fall outside every bin are kept as written.
+    """
+
+    def __init__(self, bins: Dict[Tuple[str, str], Bins]):
+        self.bins = bins
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "AlleleBins":
+        missing = [c for c in BIN_COLUMNS if c not in df.columns]
+        if missing:
+            raise ValueError(f"bin table lacks columns {missing}")
+        df = df.fillna("")
+        rows: Dict[Tuple[str, str], List[Tuple[float, float, str]]] = {}
+        for source, locus, low, high, allele in df[BIN_COLUMNS].itertuples(index=False):
+            lo, hi = allele_size(normalize_allele(low)), allele_size(normalize_allele(high))
+            if lo is None or hi is None or lo > hi:
+                raise ValueError(f"bad bin {source!r} {locus!r}: {low!r}..{high!r}")
+            rows.setdefault((str(source).strip(), str(locus).strip()), []).append((lo, hi, normalize_allele(allele)))
+        bins: Dict[Tuple[str, str], Bins] = {}
+        for key, entries in rows.items():
+            entries.sort()
+            lows = np.array([lo for lo, _, _ in entries])
+            highs = np.array([hi for _, hi, _ in entries])
+            if (lows[1:] <= highs[:-1]).any():
+                raise ValueError(f"overlapping bins for source {key[0]!r}, locus {key[1]!r}")
+            bins[key] = (lows, highs, [allele for _, _, allele in entries])
+        return cls(bins)
+
+    @classmethod
+    def load(cls, path: str) -> "AlleleBins":
+        return cls.from_frame(pd.read_csv(path, sep=CSV_SEP, dtype=str, encoding=CSV_ENCODING))
+
+    def __len__(self) -> int:
+        return sum(len(alleles) for _, _, alleles in self.bins.values())
+
+    def lookup(self, source: str, locus: str) -> Optional[Bins]:
+        return self.bins.get((source, locus)) or self.bins.get(("", locus))
+
+    def allele(self, source: str, locus: str, allele: str) -> str:
+        """Canonical allele for one normalized raw allele of source at locus."""
+        bins = self.lookup(source, locus)
+        size = allele_size(allele) if bins is not None else None
+        if size is None:
+            return allele
+        lows, highs, alleles = bins
+        i = int(np.searchsorted(lows, size, side="right")) - 1
+        return alleles[i] if i >= 0 and size <= highs[i] else allele
+
+    def digest(self, source: str) -> str:
+        """Hash of the bins that apply to source, e.g. to tell whether a compiled cache is still valid."""
+        loci = sorted({locus for _, locus in self.bins})
+        h = hashlib.sha256()
+        for locus in loci:
+            bins = self.lookup(source, locus)
+            if bins is not None:
+                h.update(repr((locus, bins[0].tolist(), bins[1].tolist(), bins[2])).encode("utf-8"))
+        return h.hexdigest()
+
+    def apply(self, table: GenotypeTable, source: str) -> int:
+        """Bin every allele group of a table in place; returns the number of changed alleles."""
+        return table.map_alleles(lambda _suffix, locus, allele: self.allele(source, locus, allele))
+
+    def apply_frame(self, df: pd.DataFrame, source: str) -> int:
+        """Bin the allele columns (1_/2_<locus>[suffix]) of a string frame in place."""
+        changed = 0
+        for col in df.columns:
+            parsed = split_allele_column(str(col))
+            if parsed is None:
+                continue
+            codes, uniques = pd.factorize(df[col])
+            raw = [normalize_allele(u) for u in uniques]
+            binned = [self.allele(source, parsed[1], a) for a in raw]
+            if binned != raw:
+                moved = np.array([b != a for a, b in zip(raw, binned)] + [False])[codes]
+                changed += int(moved.sum())
+                df.loc[moved, col] = np.asarray(binned, dtype=object)[codes[moved]]
+        return changed
+
+
+def load_bins(path: Optional[str]) -> Optional[AlleleBins]:
+    """Bin table at path, None without one (alleles are compared as written)."""
+    if not path:
+        return None
+    if not os.path.exists(path):
+        print(f"Таблица бинов аллелей не найдена: {path}, аллели сравниваются как записаны")
+        return None
+    bins = AlleleBins.load(path)
+    print(f"Таблица бинов аллелей: {path} ({len(bins)} бинов)")
+    return bins
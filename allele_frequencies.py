@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from parentage_engine import MISSING, VOCAB_BASE, AlleleCoder
+
+
+# Frequency cache (.npz): meta - JSON (version, counts {locus: {allele: n}}), fingerprints - sorted
+# uint64 per genotype already counted, so every animal is counted once however often it is seen
+FORMAT_VERSION = 3
+
+# Frequency given to rare and not yet seen alleles; keeps likelihood ratios finite
+MIN_FREQUENCY = 0.005
+
+
+def string_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer over uint64 arrays (multiplication wraps around)."""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def genotype_fingerprints(ids: Sequence[str], genotypes: np.ndarray, coder: AlleleCoder) -> np.ndarray:
+    """uint64 per animal from its ID and (animals, loci, 2) alleles.
+
+    Vocabulary alleles are hashed by their text, so the value does not depend on the coder
+    the genotypes were encoded with.
+    """
+    stable = np.arange(VOCAB_BASE + len(coder.vocab), dtype=np.uint64)
+    stable[VOCAB_BASE:] = [string_hash(allele) for allele in coder.vocab]
+    codes, uniques = pd.factorize(pd.Series(ids, dtype=object).fillna(""))
+    fp = np.array([string_hash(str(u)) for u in uniques], dtype=np.uint64)[codes]
+    flat = stable[genotypes.reshape(len(genotypes), -1).astype(np.int64)]
+    for j in range(flat.shape[1]):
+        fp = mix64(fp ^ (flat[:, j] + np.uint64(j)))
+    return fp
+
+
+class AlleleFrequencies:
+    """Allele counts per locus over every distinct genotype seen (registry bulls, herd, parents).
+
+    Counts are keyed by the normalized allele text, so the cache is independent of any coder;
+    table() turns them into a frequency lookup for one coder's int16 codes.
+    """
+
+    def __init__(self, counts: Optional[Dict[str, Dict[str, int]]] = None,
+                 fingerprints: Optional[np.ndarray] = None):
+        self.counts: Dict[str, Dict[str, int]] = counts or {}
+        self.fingerprints = fingerprints if fingerprints is not None else np.zeros(0, dtype=np.uint64)
+        self.changed = False
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def update(self, ids: Sequence[str], genotypes: np.ndarray, loci: Sequence[str], coder: AlleleCoder) -> int:
+        """Count the genotypes not counted before; returns how many were added."""
+        typed = (genotypes != MISSING).any(axis=(1, 2))
+        fp, first = np.unique(genotype_fingerprints(ids, genotypes, coder)[typed], return_index=True)
+        new = ~np.isin(fp, self.fingerprints, assume_unique=True)
+        if not new.any():
+            return 0
+        added = genotypes[typed][first[new]]
+        for j, locus in enumerate(loci):
+            codes, n = np.unique(added[:, j].ravel(), return_counts=True)
+            locus_counts = self.counts.setdefault(locus, {})
+            for code, k in zip(codes.tolist(), n.tolist()):
+                if code != MISSING:
+                    allele = coder.decode(code)
+                    locus_counts[allele] = locus_counts.get(allele, 0) + k
+        self.fingerprints = np.union1d(self.fingerprints, fp[new])
+        self.changed = True
+        return int(new.sum())
+
+    def table(self, loci: Sequence[str], coder: AlleleCoder) -> np.ndarray:
+        """(loci, codes) float64 frequency of every allele code of coder, at least MIN_FREQUENCY.
+
+        Column MISSING is 1.0; callers mask missing alleles, it only keeps divisions defined.
+        """
+        encoded = [[(coder.encode(allele), n) for allele, n in self.counts.get(locus, {}).items()] for locus in loci]
+        freqs = np.full((len(loci), VOCAB_BASE + len(coder.vocab)), MIN_FREQUENCY)
+        for j, pairs in enumerate(encoded):
+            total = sum(n for _, n in pairs)
+            for code, n in pairs:
+                freqs[j, code] = max(n / total, MIN_FREQUENCY)
+        freqs[:, MISSING] = 1.0
+        return freqs
+
+    def save(self, path: str) -> None:
+        meta = json.dumps({"version": FORMAT_VERSION, "counts": self.counts}, ensure_ascii=False).encode("utf-8")
+        # write next to the target and swap in, so readers never see a partial file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, meta=np.frombuffer(meta, dtype=np.uint8), fingerprints=self.fingerprints)
+        os.replace(tmp_path, path)
+        self.changed = False
+
+    @classmethod
+    def load(cls, path: str) -> "AlleleFrequencies":
+        """Cached frequencies, or empty ones if the file is missing or unreadable."""
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                meta = json.loads(npz["meta"].tobytes().decode("utf-8"))
+                fingerprints = npz["fingerprints"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Не удалось прочитать {path} ({e}), частоты аллелей считаются заново")
+            return cls()
+        if meta.get("version") != FORMAT_VERSION:
+            return cls()
+        return cls(meta["counts"], fingerprints)
@@ -1,28 +1,76 @@
+import argparse
+import multiprocessing
 import os
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Tuple, Dict, Any, Iterator, Optional
 
+import numpy as np
 import pandas as pd
 
-
-# Configuration
+from parentage_engine import (
+    MISSING,
+    VOCAB_BASE,
+    AlleleIndex,
+    TopCandidates,
+    best_overall_for_child,
+    decode_genotype,
+    filled_loci,
+    mask_placeholders,
+    paternal_alleles,
+    repeat_steps,
+    score_children,
+)
+from allele_bins import load_bins
+from allele_frequencies import AlleleFrequencies
+import genotype_db
+from genotype_store import GenotypeTable, read_table, save_table
+from registry_cache import BullRegistry, load_registry, read_registry_cache, registry_from_table
+from report_writer import PairReportWriter
+
+
+# Configuration (CSV paths; a newer .npz genotype store next to a CSV is read instead of it)
 CHILD_DB = r"C:\Users\user\Desktop\genetic\zrya_processed\genotypes_unified.csv"
 BULLS_DB = r"C:\Users\user\Desktop\genetic\zrya_processed\fathers_registry.csv"
 OUTPUT_DB = r"C:\Users\user\Desktop\genetic\zrya_processed\lokus_database_with_fathers.csv"
+# Compiled (memory-mapped) copy of BULLS_DB, rebuilt when the CSV changes; None = next to BULLS_DB
+BULLS_CACHE: Optional[str] = None
 
 # Matching thresholds
 MIN_MATCHED_LOCI = 11
 MAX_MUTATIONS = 1
 
+# Prune bulls through the (locus, allele) index before scoring
+USE_ALLELE_INDEX = True
+
+# Allele bin table (allele_bins.py, columns source;locus;low;high;allele) mapping each source's raw fragment
+# sizes (266 / 266.4 / 267) to one canonical allele, applied once when genotypes are loaded; None = compare
+# alleles as written; same as --bins. Herd animals and their parents are source "lab"
+ALLELE_BINS: Optional[str] = None
+# Source name of BULLS_DB in the bin table (fathers_registry.csv holds the fathers from the lab's workbooks)
+BULLS_SOURCE = genotype_db.SOURCE_LAB
+
+# Stepwise mutation tolerance: a locus also matches when child and bull alleles differ by one repeat;
+# repeat length in bp is REPEAT_SIZE unless listed in LOCUS_REPEAT_SIZES; same as --step-tolerance
+STEP_TOLERANCE = False
+REPEAT_SIZE = 2
+LOCUS_REPEAT_SIZES: Dict[str, int] = {}
+
+# Trio check: use the mother's alleles (1_/2_<locus>_materi) to narrow each locus to the allele
+# the father must have given (parentage_engine.paternal_alleles); same as --trio
+USE_MOTHER = False
+
+# Likelihood scores (LOD, exclusion probability) of every kept candidate, from allele frequencies of the
+# registry and the herd; counts are cached in FREQ_CACHE (None = allele_frequencies.npz next to OUTPUT_DB)
+# and only animals not seen before are added on each run
+USE_LIKELIHOOD = True
+FREQ_CACHE: Optional[str] = None
+# Order each child's candidates by LOD instead of the match counts; same as --rank-by-lod
+RANK_BY_LOD = False
 
-def normalize_allele(value: Any) -> str:
-    if pd.isna(value):
-        return ""
-    s = str(value).strip()
-    if s == "-" or s == ".":
-        return ""
-    # unify comma/dot separators, spaces
-    s = s.replace(",", ".").replace(" ", "")
-    return s
+# Candidate fathers kept per child for the reports (bounds memory at children x K)
+MAX_CANDIDATES_PER_CHILD = 50
+
+# Children per task in --workers mode
+WORKER_CHUNK = 256
 
 
 def get_child_loci_pairs(columns: List[str]) -> List[Tuple[str, str, str]]:
@@ -38,39 +86,13 @@ def get_child_loci_pairs(columns: List[str]) -> List[Tuple[str, str, str]]:
     return pairs
 
 
-def get_father_id_column(df_bulls: pd.DataFrame) -> str:
-    candidates = [
-        "reganimal",
-        "regotca",
-        "bull_id",
-        "id",
-        "ID",
-        "Идентификационный номер",
-        "Номер",
-        "Number",
-    ]
-    for c in candidates:
-        if c in df_bulls.columns:
-            return c
-    # fallback: first column
-    return df_bulls.columns[0]
-
-
-def build_signature_counts_for_bulls(df_bulls: pd.DataFrame, child_pairs: List[Tuple[str, str, str]]) -> Dict[int, Dict[str, Tuple[str, str]]]:
-    """Map bulls index -> locus -> (a1, a2) using child locus names (1_/2_)."""
-    bulls: Dict[int, Dict[str, Tuple[str, str]]] = {}
-    for idx, row in df_bulls.iterrows():
-        per_locus: Dict[str, Tuple[str, str]] = {}
-        for locus, c1, c2 in child_pairs:
-            b1 = normalize_allele(row.get(c1, ""))
-            b2 = normalize_allele(row.get(c2, ""))
-            per_locus[locus] = (b1, b2)
-        bulls[idx] = per_locus
-    return bulls
-
-
-def evaluate_match(child_vals: Dict[str, Tuple[str, str]], father_vals: Dict[str, Tuple[str, str]]) -> Tuple[int, int, int]:
-    """Return (matches, mismatches, compared) given locus -> (c1,c2) and (f1,f2)."""
+def evaluate_match(child_vals: Dict[str, Tuple[str, str]], father_vals: Dict[str, Tuple[str, str]],
+                   steps: Optional[Dict[str, int]] = None) -> Tuple[int, int, int]:
+    """Return (matches, mismatches, compared) given locus -> (c1,c2) and (f1,f2).
+
+    Scalar reference for parentage_engine.match_counts, which main() uses; steps (locus -> repeat
+    length) also counts alleles one repeat apart as a match.
+    """
     matches = 0
     mismatches = 0
     compared = 0
@@ -81,94 +103,195 @@ def evaluate_match(child_vals: Dict[str, Tuple[str, str]], father_vals: Dict[str
         compared += 1
         child_set = {x for x in [c1, c2] if x}
         father_set = {x for x in [f1, f2] if x}
+        step = (steps or {}).get(locus, 0)
         if child_set.intersection(father_set):
             matches += 1
+        elif step and any(abs(int(c) - int(f)) == step for c in child_set for f in father_set
+                          if is_allele_size(c) and is_allele_size(f)):
+            matches += 1
         else:
             mismatches += 1
     return matches, mismatches, compared
 
 
-def main():
-    df_children = pd.read_csv(CHILD_DB, sep=";", dtype=str).fillna("")
-    df_bulls = pd.read_csv(BULLS_DB, sep=";", dtype=str).fillna("")
+def is_allele_size(allele: str) -> bool:
+    """A canonical integer fragment size (the alleles parentage_engine stores as their value)."""
+    return allele.isascii() and allele.isdigit() and allele[0] != "0" and int(allele) < VOCAB_BASE
+
+
+def update_frequencies(path: str, registry: BullRegistry, children: GenotypeTable, loci: List[str]) -> np.ndarray:
+    """Count registry bulls, children and their parents not yet in the cache at path; frequency table in registry coding."""
+    freqs = AlleleFrequencies.load(path)
+    coder = registry.coder
+    added = freqs.update(registry.ids, np.asarray(registry.genotypes), loci, coder)
+    columns = set(children.column_names)
+    for suffix, id_col in (("", "reganimal"), ("_otca", "regotca"), ("_materi", "regmateri")):
+        ids = children.column(id_col) if id_col in columns else [""] * len(children)
+        # parents the lab did not type are written as placeholders, which are not alleles
+        added += freqs.update(ids, mask_placeholders(children.genotypes(loci, coder, suffix), coder), loci, coder)
+    if added:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            freqs.save(path)
+        except OSError as e:
+            print(f"Не удалось сохранить частоты аллелей ({e}), продолжаем без кэша")
+        print(f"Частоты аллелей: добавлено генотипов {added}, всего {len(freqs)}")
+    return freqs.table(loci, coder)
+
+
+# Per-process state of --workers mode: bulls genotypes, index and repeat steps, set once by _init_worker
+_worker_bulls: Optional[np.ndarray] = None
+_worker_index: Optional[AlleleIndex] = None
+_worker_steps: Optional[np.ndarray] = None
+
+
+def _init_worker(cache_path: Optional[str], genotypes: Optional[np.ndarray], index: Optional[AlleleIndex], use_index: bool,
+                 steps: Optional[np.ndarray]) -> None:
+    global _worker_bulls, _worker_index, _worker_steps
+    if cache_path is not None:
+        # every worker maps the same compiled file, so the registry is shared through the page cache
+        _header, registry = read_registry_cache(cache_path)
+        genotypes, index = registry.genotypes, registry.index
+    _worker_bulls = genotypes
+    _worker_index = index if use_index else None
+    _worker_steps = steps
+
+
+def _score_chunk(task: Tuple[List[int], np.ndarray, int, int]) -> List[Tuple[int, List[Tuple[int, Tuple[int, int, int]]]]]:
+    child_indices, children_gt, min_matched, max_mutations = task
+    rows = range(len(child_indices))
+    found = score_children(children_gt, _worker_bulls, rows, min_matched, max_mutations, _worker_index, _worker_steps)
+    return [(child_indices[row], candidates) for row, candidates in found]
+
+
+def score_children_parallel(children_gt: np.ndarray, registry: BullRegistry, child_indices: List[int],
+                            workers: int, steps: Optional[np.ndarray] = None
+                            ) -> Iterator[Tuple[int, List[Tuple[int, Tuple[int, int, int]]]]]:
+    """score_children over a process pool; results come back in child_indices order."""
+    if workers <= 1 or len(child_indices) <= WORKER_CHUNK:
+        bulls_index = registry.index if USE_ALLELE_INDEX else None
+        yield from score_children(children_gt, registry.genotypes, child_indices, MIN_MATCHED_LOCI, MAX_MUTATIONS,
+                                  bulls_index, steps)
+        return
+
+    tasks = []
+    for start in range(0, len(child_indices), WORKER_CHUNK):
+        chunk = child_indices[start:start + WORKER_CHUNK]
+        tasks.append((chunk, children_gt[chunk], MIN_MATCHED_LOCI, MAX_MUTATIONS))
+    if registry.path is not None:
+        initargs = (registry.path, None, None, USE_ALLELE_INDEX, steps)
+    else:
+        initargs = (None, np.asarray(registry.genotypes), registry.index, USE_ALLELE_INDEX, steps)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        # imap keeps task order, so the merge is deterministic
+        for chunk_result in pool.imap(_score_chunk, tasks):
+            yield from chunk_result
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Подбор отцов по микросателлитным профилям")
+    parser.add_argument("--workers", type=int, default=1, help="число процессов для подбора (по умолчанию 1)")
+    parser.add_argument("--db", help="брать детей и быков из базы генотипов (genotype_db) вместо CHILD_DB и BULLS_DB")
+    parser.add_argument("--bulls-source", choices=["all", genotype_db.SOURCE_REGISTRY, genotype_db.SOURCE_LAB],
+                        default="all", help="какие быки из базы: реестр быки.рф, отцы из экселей или все")
+    parser.add_argument("--trio", action="store_true", default=USE_MOTHER,
+                        help="учитывать генотип матери: отец должен дать аллель, которую не могла дать мать")
+    parser.add_argument("--rank-by-lod", action="store_true", default=RANK_BY_LOD,
+                        help="упорядочивать кандидатов по LOD, а не по числу совпадений")
+    parser.add_argument("--bins", default=ALLELE_BINS,
+                        help="таблица бинов аллелей (source;locus;low;high;allele) для сведения размеров разных лабораторий")
+    parser.add_argument("--step-tolerance", action="store_true", default=STEP_TOLERANCE,
+                        help="засчитывать совпадение локуса при разнице аллелей на один повтор (ступенчатая мутация)")
+    args = parser.parse_args(argv)
+
+    bins = load_bins(args.bins)
+
+    bulls_table: Optional[GenotypeTable] = None
+    if args.db:
+        conn = genotype_db.connect(args.db)
+        try:
+            herd = genotype_db.herd_frame(conn)
+            if args.bulls_source == "all":
+                sources = [genotype_db.SOURCE_REGISTRY, genotype_db.SOURCE_LAB]
+            else:
+                sources = [args.bulls_source]
+            bull_frames = [genotype_db.bulls_frame(conn, [source]) for source in sources]
+        finally:
+            conn.close()
+        if bins is not None:
+            bins.apply_frame(herd, genotype_db.SOURCE_LAB)
+            for source, frame in zip(sources, bull_frames):
+                bins.apply_frame(frame, source)
+        children = GenotypeTable.from_frame(herd)
+        bulls_table = GenotypeTable.from_frame(pd.concat(bull_frames, ignore_index=True))
+    else:
+        children = read_table(CHILD_DB)
+        if bins is not None:
+            binned = bins.apply(children, genotype_db.SOURCE_LAB)
+            print(f"Бины аллелей: у детей и их родителей изменено аллелей {binned}")
+    df_children = children.to_frame()
 
     child_pairs = get_child_loci_pairs(list(df_children.columns))
     if not child_pairs:
         raise RuntimeError("Не удалось определить список локусов у детей (1_/2_ столбцы)")
 
-    father_id_col = get_father_id_column(df_bulls)
-
-    # Build per-row dicts of locus->(a1,a2)
-    bulls_loci = build_signature_counts_for_bulls(df_bulls, child_pairs)
-
-    # Prepare child loci map
-    children_loci: Dict[int, Dict[str, Tuple[str, str]]] = {}
-    for idx, row in df_children.iterrows():
-        per_locus: Dict[str, Tuple[str, str]] = {}
-        for locus, c1, c2 in child_pairs:
-            a1 = normalize_allele(row.get(c1, ""))
-            a2 = normalize_allele(row.get(c2, ""))
-            per_locus[locus] = (a1, a2)
-        children_loci[idx] = per_locus
+    # Bulls come pre-encoded as int16 allele arrays (bulls x loci x 2, 0 = missing) from the compiled cache;
+    # children are encoded with the same allele coder
+    if bulls_table is not None:
+        registry = registry_from_table(bulls_table, child_pairs)
+    else:
+        registry = load_registry(BULLS_DB, child_pairs, BULLS_CACHE, bins, BULLS_SOURCE)
+    loci_order = registry.loci
+    coder = registry.coder
+    children_gt = children.genotypes(loci_order, coder)
+    bulls_gt = registry.genotypes
+    child_filled = filled_loci(children_gt)
+    steps = repeat_steps(loci_order, REPEAT_SIZE, LOCUS_REPEAT_SIZES) if args.step_tolerance else None
+
+    # Alleles the father is checked against: the child's own, or with --trio only those the mother cannot explain
+    mothers_gt: Optional[np.ndarray] = None
+    if args.trio:
+        mothers_gt = mask_placeholders(children.genotypes(loci_order, coder, suffix="_materi"), coder)
+        scored_gt = paternal_alleles(children_gt, mothers_gt)
+        with_mother = int((filled_loci(mothers_gt) > 0).sum())
+        narrowed = int(((scored_gt[..., 1] == MISSING) & (children_gt[..., 1] != MISSING)).sum())
+        print(f"Трио: генотип матери есть у {with_mother} детей, отцовская аллель определена в {narrowed} локусах")
+    else:
+        scored_gt = children_gt
+
+    def bull_alleles(bi: int) -> Dict[str, Tuple[str, str]]:
+        return decode_genotype(bulls_gt[bi], loci_order, coder)
 
     # Select children without father assigned
     mask_no_father = df_children["regotca"].astype(str).fillna("").str.strip() == ""
     candidate_children_idx = [i for i in df_children.index.tolist() if mask_no_father.iloc[i]]
     pre_assigned_children = set(df_children.index.tolist()) - set(candidate_children_idx)
 
-    # First pass: find best bull per child under thresholds and collect ALL candidates per child
-    best_candidate_for_child: Dict[int, Optional[int]] = {}
-    score_for_pair: Dict[Tuple[int, int], Tuple[int, int, int]] = {}
-    candidates_for_child: Dict[int, List[Tuple[int, Tuple[int, int, int]]]] = {}
-
-    # Keep diagnostics of best overall candidate per child (even if under thresholds)
-    best_overall_for_child: Dict[int, Tuple[Optional[int], Tuple[int, int, int]]] = {}
-
-    for ci in candidate_children_idx:
-        cvals = children_loci[ci]
-
-        # Only proceed if child has sufficient filled loci
-        child_compared_possible = sum(1 for locus, (a1, a2) in cvals.items() if a1 or a2)
-        if child_compared_possible < MIN_MATCHED_LOCI:
-            best_candidate_for_child[ci] = None
-            continue
-
-        best_idx: Optional[int] = None
-        best_tuple: Tuple[int, int, int] = (-1, 999, -1)  # matches desc, mismatches asc, compared desc
-        overall_best_idx: Optional[int] = None
-        overall_best_tuple: Tuple[int, int, int] = (-1, 999, -1)
-        child_candidates: List[Tuple[int, Tuple[int, int, int]]] = []
-
-        for bi in df_bulls.index:
-            bvals = bulls_loci[bi]
-            matches, mismatches, compared = evaluate_match(cvals, bvals)
-            score_for_pair[(ci, bi)] = (matches, mismatches, compared)
-
-            # Track overall best regardless of thresholds
-            candidate_tuple_any = (matches, -mismatches, compared)
-            overall_best_cmp = (overall_best_tuple[0], -overall_best_tuple[1], overall_best_tuple[2])
-            if candidate_tuple_any > overall_best_cmp:
-                overall_best_tuple = (matches, mismatches, compared)
-                overall_best_idx = bi
-
-            if matches < MIN_MATCHED_LOCI or mismatches > MAX_MUTATIONS:
-                continue
-
-            # tie-break: higher matches, then lower mismatches, then higher compared
-            candidate_tuple = (matches, -mismatches, compared)
-            best_tuple_cmp = (best_tuple[0], -best_tuple[1], best_tuple[2])
-            if candidate_tuple > best_tuple_cmp:
-                best_tuple = (matches, mismatches, compared)
-                best_idx = bi
-
-            # collect as valid candidate
-            child_candidates.append((bi, (matches, mismatches, compared)))
-
-        # sort candidates: matches desc, mismatches asc, compared desc
-        child_candidates.sort(key=lambda x: (x[1][0], -x[1][1], x[1][2]), reverse=True)
-        best_candidate_for_child[ci] = best_idx
-        best_overall_for_child[ci] = (overall_best_idx, overall_best_tuple)
-        candidates_for_child[ci] = child_candidates
+    # Single scoring pass over ALL children: top-K candidates per child feed the assignment and both reports.
+    # Only children with sufficient filled loci are scored.
+    original_fathers = df_children["regotca"].astype(str).str.strip().tolist()
+    top_candidates = TopCandidates(len(df_children), MAX_CANDIDATES_PER_CHILD)
+    # Whether the lab's father is among ALL candidates (not only the kept top-K), for stats
+    original_in_candidates: Dict[int, bool] = {}
+    scored_children_idx = [ci for ci in df_children.index.tolist() if child_filled[ci] >= MIN_MATCHED_LOCI]
+    for ci, child_candidates in score_children_parallel(scored_gt, registry, scored_children_idx, args.workers, steps):
+        # candidates are sorted: matches desc, mismatches asc, compared desc
+        top_candidates.store(ci, child_candidates, scored_gt, bulls_gt, steps)
+        if original_fathers[ci]:
+            original_in_candidates[ci] = any(registry.bull_id(bi) == original_fathers[ci] for bi, _ in child_candidates)
+    truncated = int((top_candidates.total > MAX_CANDIDATES_PER_CHILD).sum())
+    if truncated:
+        print(f"У {truncated} детей кандидатов больше {MAX_CANDIDATES_PER_CHILD}, в отчеты попадут лучшие {MAX_CANDIDATES_PER_CHILD}")
+
+    # LOD and exclusion probability of the kept candidates; with --rank-by-lod they also decide the order
+    report_extra_cols: List[str] = []
+    if USE_LIKELIHOOD:
+        freq_path = FREQ_CACHE or os.path.join(os.path.dirname(OUTPUT_DB), "allele_frequencies.npz")
+        freq_table = update_frequencies(freq_path, registry, children, loci_order)
+        top_candidates.add_likelihood(children_gt, mothers_gt, scored_gt, bulls_gt, freq_table, rank=args.rank_by_lod)
+        report_extra_cols = ["LOD", "P_excl"]
+
+    best_candidate_for_child: Dict[int, Optional[int]] = {ci: top_candidates.best(ci) for ci in candidate_children_idx}
 
     # Diagnostics
     total_candidates = len(candidate_children_idx)
@@ -191,17 +314,17 @@ def main():
 
     # Update regotca and father loci
     for bi, kids in bull_to_children.items():
-        father_id = str(df_bulls.at[bi, father_id_col]).strip()
-        bvals = bulls_loci[bi]
+        father_id = registry.bull_id(bi)
+        bvals = bull_alleles(bi)
         for ci in kids:
             df_children.at[ci, "regotca"] = father_id
             for locus, (f1, f2) in bvals.items():
                 df_children.at[ci, f"1_{locus}_otca"] = f1
                 df_children.at[ci, f"2_{locus}_otca"] = f2
 
-    # Save updated children CSV
+    # Save updated children CSV and its genotype store
     os.makedirs(os.path.dirname(OUTPUT_DB), exist_ok=True)
-    df_children.to_csv(OUTPUT_DB, sep=";", index=False, encoding="utf-8-sig")
+    save_table(df_children, OUTPUT_DB)
 
     # Print fathers and number of children
     print("Подтвержденные отцы и число потомков:")
@@ -212,199 +335,98 @@ def main():
     for reg, cnt in counts.items():
         print(f"{reg};{cnt}")
 
-    # Build human-readable Excel report with loci horizontally and exactly two rows per pair (child, father)
+    # Human-readable Excel reports with loci horizontally: child row, father row, blank row per pair,
+    # streamed straight to xlsx. Mismatched loci (flagged by the scoring step) are filled red.
+    def child_row_alleles(ci: int) -> List[Tuple[str, str]]:
+        return [(coder.decode(a1), coder.decode(a2)) for a1, a2 in children_gt[ci]]
+
+    def bull_row_alleles(bi: int) -> List[Tuple[str, str]]:
+        return [(coder.decode(a1), coder.decode(a2)) for a1, a2 in bulls_gt[bi]]
+
+    def get_reganimal(ci: int) -> str:
+        return str(df_children.at[ci, "reganimal"]).strip() if "reganimal" in df_children.columns else str(ci)
+
+    def write_candidates(writer: PairReportWriter, ci: int) -> List[str]:
+        """Write all kept candidate pairs of one child; return the candidate father IDs in order."""
+        reganimal = get_reganimal(ci)
+        child_row = child_row_alleles(ci)
+        father_ids: List[str] = []
+        for slot, (bi, _score) in enumerate(top_candidates.get(ci)):
+            father_id = registry.bull_id(bi)
+            extra: Tuple = ()
+            if report_extra_cols:
+                lod, exclusion = top_candidates.likelihood(ci, slot)
+                extra = (round(lod, 2), round(exclusion, 6))
+            writer.write_pair(reganimal, father_id, child_row, bull_row_alleles(bi),
+                              top_candidates.mismatch_loci(ci, slot), extra)
+            father_ids.append(father_id)
+        return father_ids
+
     # Report will include ALL candidates per child (children without pre-assigned father only),
     # so user can choose among multiple suitable fathers.
-    loci_order = [locus for locus, _, _ in child_pairs]
-
-    # Build columns: meta + per-locus two columns
-    meta_cols = ["reganimal", "father", "role"]
-    locus_cols: List[str] = []
-    for locus in loci_order:
-        locus_cols.append(f"{locus}_1")
-        locus_cols.append(f"{locus}_2")
-    all_cols = meta_cols + locus_cols
-
-    report_rows: List[Dict[str, Any]] = []
-
-    # Iterate children without pre-assigned father; for each - include ALL candidate fathers
-    total_pairs = 0
-    for ci in candidate_children_idx:
-        if ci in pre_assigned_children:
-            continue
-        reganimal = str(df_children.at[ci, "reganimal"]).strip() if "reganimal" in df_children.columns else str(ci)
-        child_candidates = candidates_for_child.get(ci, [])
-        if not child_candidates:
-            continue
-        for bi, _score in child_candidates:
-            father_id = str(df_bulls.at[bi, father_id_col]).strip()
-            bvals = bulls_loci[bi]
-            total_pairs += 1
-
-            # Child row
-            row_child: Dict[str, Any] = {c: "" for c in all_cols}
-            row_child["reganimal"] = reganimal
-            row_child["father"] = father_id
-            row_child["role"] = "child"
-            for locus in loci_order:
-                c1, c2 = children_loci.get(ci, {}).get(locus, ("", ""))
-                row_child[f"{locus}_1"] = c1
-                row_child[f"{locus}_2"] = c2
-            report_rows.append(row_child)
-
-            # Father row
-            row_father: Dict[str, Any] = {c: "" for c in all_cols}
-            row_father["reganimal"] = reganimal
-            row_father["father"] = father_id
-            row_father["role"] = "father"
-            for locus in loci_order:
-                f1, f2 = bvals.get(locus, ("", ""))
-                row_father[f"{locus}_1"] = f1
-                row_father[f"{locus}_2"] = f2
-            report_rows.append(row_father)
-
-            # Blank separator
-            report_rows.append({c: "" for c in all_cols})
+    report_path = os.path.join(os.path.dirname(OUTPUT_DB), "assigned_fathers_report.xlsx")
+    with PairReportWriter(report_path, loci_order, extra_cols=report_extra_cols) as writer:
+        for ci in candidate_children_idx:
+            if ci in pre_assigned_children:
+                continue
+            write_candidates(writer, ci)
+        total_pairs = writer.pairs
 
     print(f"Паров ребенок-отец для отчета (только новые): {total_pairs}")
 
     if total_pairs == 0:
         # Print top-1 candidate per child for diagnostics
+        # best overall candidate per child (even if under thresholds) needs a full scan, so only here
         print("Не назначено ни одной пары. Диагностика по детям:")
         for ci in candidate_children_idx:
-            reganimal = str(df_children.at[ci, "reganimal"]).strip() if "reganimal" in df_children.columns else str(ci)
-            overall_idx, (m, mm, cmpd) = best_overall_for_child.get(ci, (None, (-1, -1, -1)))
+            reganimal = get_reganimal(ci)
+            if child_filled[ci] >= MIN_MATCHED_LOCI:
+                overall_idx, (m, mm, cmpd) = best_overall_for_child(scored_gt[ci], bulls_gt, steps)
+            else:
+                overall_idx, (m, mm, cmpd) = None, (-1, -1, -1)
             if overall_idx is None:
                 print(f"  {reganimal}: нет подходящих быков с пересечением локусов")
             else:
-                father_id = str(df_bulls.at[overall_idx, father_id_col]).strip()
+                father_id = registry.bull_id(overall_idx)
                 print(f"  {reganimal}: лучший {father_id} — совпадений={m}, несовпадений={mm}, сравнивали={cmpd} (пороги: MIN_MATCHED_LOCI={MIN_MATCHED_LOCI}, MAX_MUTATIONS={MAX_MUTATIONS})")
 
     # ------------------------------
-    # Build ALL-children report and stats (ignoring pre-existing fathers)
+    # ALL-children report and stats (ignoring pre-existing fathers)
     # ------------------------------
-    def compute_candidates_for_child(ci: int) -> List[Tuple[int, Tuple[int, int, int]]]:
-        cvals = children_loci.get(ci, {})
-        # If child has too few filled loci, return empty
-        child_compared_possible = sum(1 for _l, (a1, a2) in cvals.items() if a1 or a2)
-        if child_compared_possible < MIN_MATCHED_LOCI:
-            return []
-        found: List[Tuple[int, Tuple[int, int, int]]] = []
-        for bi in df_bulls.index:
-            bvals = bulls_loci[bi]
-            matches, mismatches, compared = evaluate_match(cvals, bvals)
-            if matches >= MIN_MATCHED_LOCI and mismatches <= MAX_MUTATIONS:
-                found.append((bi, (matches, mismatches, compared)))
-        # sort by matches desc, mismatches asc, compared desc
-        found.sort(key=lambda x: (x[1][0], -x[1][1], x[1][2]), reverse=True)
-        return found
-
-    loci_order = [locus for locus, _, _ in child_pairs]
-    meta_cols = ["reganimal", "father", "role"]
-    locus_cols: List[str] = []
-    for locus in loci_order:
-        locus_cols.append(f"{locus}_1")
-        locus_cols.append(f"{locus}_2")
-    all_cols = meta_cols + locus_cols
-
-    report_all_rows: List[Dict[str, Any]] = []
-    stats_diff_rows: List[Dict[str, Any]] = []
-    stats_original_not_in_candidates: List[Dict[str, Any]] = []
-
-    for ci in df_children.index.tolist():
-        reganimal = str(df_children.at[ci, "reganimal"]).strip() if "reganimal" in df_children.columns else str(ci)
-        original_father = str(df_children.at[ci, "regotca"]).strip() if "regotca" in df_children.columns else ""
-
-        child_candidates_all = compute_candidates_for_child(ci)
-        candidate_father_ids = [str(df_bulls.at[bi, father_id_col]).strip() for bi, _ in child_candidates_all]
-
-        # Build stacked rows for each candidate
-        for bi, _score in child_candidates_all:
-            father_id = str(df_bulls.at[bi, father_id_col]).strip()
-            bvals = bulls_loci[bi]
-
-            row_child: Dict[str, Any] = {c: "" for c in all_cols}
-            row_child["reganimal"] = reganimal
-            row_child["father"] = father_id
-            row_child["role"] = "child"
-            for locus in loci_order:
-                c1, c2 = children_loci.get(ci, {}).get(locus, ("", ""))
-                row_child[f"{locus}_1"] = c1
-                row_child[f"{locus}_2"] = c2
-            report_all_rows.append(row_child)
-
-            row_father: Dict[str, Any] = {c: "" for c in all_cols}
-            row_father["reganimal"] = reganimal
-            row_father["father"] = father_id
-            row_father["role"] = "father"
-            for locus in loci_order:
-                f1, f2 = bvals.get(locus, ("", ""))
-                row_father[f"{locus}_1"] = f1
-                row_father[f"{locus}_2"] = f2
-            report_all_rows.append(row_father)
-
-            report_all_rows.append({c: "" for c in all_cols})
-
-        # Stats
-        best_found = candidate_father_ids[0] if candidate_father_ids else ""
-        if original_father:
-            if best_found and best_found != original_father:
-                stats_diff_rows.append({
-                    "reganimal": reganimal,
-                    "original_father": original_father,
-                    "best_found_father": best_found,
-                })
-            if original_father not in set(candidate_father_ids):
-                stats_original_not_in_candidates.append({
-                    "reganimal": reganimal,
-                    "original_father": original_father,
-                })
-
-    # Write ALL-children report with highlighting
-    report_all_df = pd.DataFrame(report_all_rows, columns=all_cols)
     report_all_path = os.path.join(os.path.dirname(OUTPUT_DB), "assigned_fathers_all_report.xlsx")
-    with pd.ExcelWriter(report_all_path, engine="xlsxwriter") as writer:
-        report_all_df.to_excel(writer, index=False, sheet_name="report")
-
-        # Highlight mutations
-        wb = writer.book
-        ws = writer.sheets["report"]
-        red_fmt = wb.add_format({"bg_color": "#FFC7CE"})
-
-        col_to_idx = {col_name: idx for idx, col_name in enumerate(all_cols)}
-        row_idx_excel = 1
-        total_rows = len(report_all_rows)
-        while row_idx_excel - 1 < total_rows:
-            rr_index = row_idx_excel - 1
-            role = str(report_all_df.at[rr_index, "role"]).strip() if rr_index < len(report_all_df) else ""
-            if role == "child":
-                rr_father_index = rr_index + 1
-                if rr_father_index < len(report_all_df) and str(report_all_df.at[rr_father_index, "role"]).strip() == "father":
-                    for locus in loci_order:
-                        c1 = str(report_all_df.at[rr_index, f"{locus}_1"]).strip() if f"{locus}_1" in report_all_df.columns else ""
-                        c2 = str(report_all_df.at[rr_index, f"{locus}_2"]).strip() if f"{locus}_2" in report_all_df.columns else ""
-                        f1 = str(report_all_df.at[rr_father_index, f"{locus}_1"]).strip() if f"{locus}_1" in report_all_df.columns else ""
-                        f2 = str(report_all_df.at[rr_father_index, f"{locus}_2"]).strip() if f"{locus}_2" in report_all_df.columns else ""
-                        child_set = {x for x in [c1, c2] if x}
-                        father_set = {x for x in [f1, f2] if x}
-                        is_mismatch = bool(child_set) and bool(father_set) and child_set.isdisjoint(father_set)
-                        if is_mismatch:
-                            for suffix in ("_1", "_2"):
-                                col_name = f"{locus}{suffix}"
-                                col_index = col_to_idx.get(col_name)
-                                if col_index is not None:
-                                    val_child = report_all_df.at[rr_index, col_name]
-                                    val_father = report_all_df.at[rr_father_index, col_name]
-                                    ws.write(row_idx_excel, col_index, val_child, red_fmt)
-                                    ws.write(row_idx_excel + 1, col_index, val_father, red_fmt)
-                row_idx_excel += 3
-                continue
-            else:
-                row_idx_excel += 1
+    with PairReportWriter(report_all_path, loci_order, extra_cols=report_extra_cols) as writer:
+        stats_diff_rows: List[Dict[str, Any]] = []
+        stats_original_not_in_candidates: List[Dict[str, Any]] = []
+
+        for ci in df_children.index.tolist():
+            reganimal = get_reganimal(ci)
+            original_father = str(df_children.at[ci, "regotca"]).strip() if "regotca" in df_children.columns else ""
+
+            candidate_father_ids = write_candidates(writer, ci)
+
+            # Stats
+            best_found = candidate_father_ids[0] if candidate_father_ids else ""
+            if original_father:
+                if best_found and best_found != original_father:
+                    stats_diff_rows.append({
+                        "reganimal": reganimal,
+                        "original_father": original_father,
+                        "best_found_father": best_found,
+                    })
+                # lab fathers were checked against all candidates while scoring; newly assigned ones are the top candidate
+                if original_fathers[ci]:
+                    in_candidates = original_in_candidates.get(ci, False)
+                else:
+                    in_candidates = original_father == best_found
+                if not in_candidates:
+                    stats_original_not_in_candidates.append({
+                        "reganimal": reganimal,
+                        "original_father": original_father,
+                    })
 
         # Stats sheet
         stats_start_row = 0
-        stats_sheet = wb.add_worksheet("stats")
+        stats_sheet = writer.add_worksheet("stats")
         # Part 1: best found father differs from original
         stats_sheet.write(stats_start_row, 0, "reganimal")
         stats_sheet.write(stats_start_row, 1, "original_father")
@@ -428,63 +450,8 @@ def main():
 
     print(f"Полный отчет по всем детям: {report_all_path}")
 
-    report_df = pd.DataFrame(report_rows, columns=all_cols)
-    report_path = os.path.join(os.path.dirname(OUTPUT_DB), "assigned_fathers_report.xlsx")
-    with pd.ExcelWriter(report_path, engine="xlsxwriter") as writer:
-        report_df.to_excel(writer, index=False, sheet_name="report")
-
-        # Highlight mutations (loci where child and father share no alleles) in red fill
-        wb = writer.book
-        ws = writer.sheets["report"]
-        red_fmt = wb.add_format({"bg_color": "#FFC7CE"})
-
-        # Build column index mapping
-        col_to_idx = {col_name: idx for idx, col_name in enumerate(all_cols)}
-
-        # Iterate over rows: data starts at row 1 (row 0 is header)
-        row_idx_excel = 1
-        total_rows = len(report_rows)
-        while row_idx_excel - 1 < total_rows:
-            # Map excel row to our report_rows index
-            rr_index = row_idx_excel - 1
-            role = str(report_df.at[rr_index, "role"]).strip() if rr_index < len(report_df) else ""
-
-            if role == "child":
-                # father row should be next (child then father then blank)
-                rr_father_index = rr_index + 1
-                if rr_father_index < len(report_df) and str(report_df.at[rr_father_index, "role"]).strip() == "father":
-                    # for each locus, check mismatch
-                    for locus in loci_order:
-                        c1 = str(report_df.at[rr_index, f"{locus}_1"]).strip() if f"{locus}_1" in report_df.columns else ""
-                        c2 = str(report_df.at[rr_index, f"{locus}_2"]).strip() if f"{locus}_2" in report_df.columns else ""
-                        f1 = str(report_df.at[rr_father_index, f"{locus}_1"]).strip() if f"{locus}_1" in report_df.columns else ""
-                        f2 = str(report_df.at[rr_father_index, f"{locus}_2"]).strip() if f"{locus}_2" in report_df.columns else ""
-
-                        child_set = {x for x in [c1, c2] if x}
-                        father_set = {x for x in [f1, f2] if x}
-                        is_mismatch = bool(child_set) and bool(father_set) and child_set.isdisjoint(father_set)
-                        if is_mismatch:
-                            # Color both child's and father's allele cells for this locus
-                            for suffix in ("_1", "_2"):
-                                col_name = f"{locus}{suffix}"
-                                col_index = col_to_idx.get(col_name)
-                                if col_index is not None:
-                                    # write back same value but with format
-                                    val_child = report_df.at[rr_index, col_name]
-                                    val_father = report_df.at[rr_father_index, col_name]
-                                    ws.write(row_idx_excel, col_index, val_child, red_fmt)
-                                    ws.write(row_idx_excel + 1, col_index, val_father, red_fmt)
-
-                # advance: child row, father row, blank row → +3
-                row_idx_excel += 3
-                continue
-            else:
-                # not a child row, advance by 1
-                row_idx_excel += 1
-
     print(f"\nГотово. Обновленный файл: {OUTPUT_DB}")
     print(f"Отчет: {report_path}")
 
-
 if __name__ == "__main__":
     main()
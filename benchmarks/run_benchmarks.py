@@ -0,0 +1,269 @@
+"""Throughput and peak memory of the pipeline steps on synthetic data, compared with a stored baseline.
+
+    python benchmarks/run_benchmarks.py                       # all cases at 1k/10k/100k
+    python benchmarks/run_benchmarks.py --scales 1000 10000 --cases assing_fathers
+    python benchmarks/run_benchmarks.py --save-baseline       # store the results as the new baseline
+
+Every case runs in a fresh process, so peak memory is that step's own (imports included).
+Generated data is cached in --data-dir and reused: it only depends on the scale.
+Exit code 1 when a result is slower or larger than the baseline beyond --tolerance.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# Configuration
+SCALES = [1000, 10000, 100000]
+DATA_DIR = os.path.join(tempfile.gettempdir(), "cattle_genetic_bench")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+TOLERANCE = 0.25  # allowed slowdown / memory growth against the baseline
+BULLS_PER_CHILD = 0.1  # registry size for the assing_fathers case
+
+
+# -------------------------
+# Data (generated once per scale)
+# -------------------------
+def prepare_profiles(folder: str, scale: int) -> None:
+    import synthetic_data
+    bulls = synthetic_data.generate_bulls(scale, seed=1)
+    with open(os.path.join(folder, "profiles.json"), "w", encoding="utf-8") as f:
+        json.dump(synthetic_data.profile_strings(bulls, seed=3, messy_rate=0.1), f, ensure_ascii=False)
+
+
+def prepare_herd(folder: str, scale: int) -> None:
+    import synthetic_data
+    from genotype_store import save_table
+    bulls, children = synthetic_data.herd_for_registry(scale, max(100, int(scale * BULLS_PER_CHILD)))
+    save_table(bulls, os.path.join(folder, "bulls.csv"))
+    save_table(children, os.path.join(folder, "genotypes_unified.csv"))
+
+
+def prepare_workbooks(folder: str, scale: int) -> None:
+    import synthetic_data
+    _bulls, children = synthetic_data.herd_for_registry(scale)
+    synthetic_data.write_workbooks(children, os.path.join(folder, "raw"))
+
+
+# -------------------------
+# Cases: run the step on prepared data, return the number of items processed
+# -------------------------
+def run_parse_profiles(folder: str, work: str) -> int:
+    from bull_profiles import parse_profile_to_dict
+    with open(os.path.join(folder, "profiles.json"), encoding="utf-8") as f:
+        texts = json.load(f)
+    for text in texts:
+        parse_profile_to_dict(text)
+    return len(texts)
+
+
+def run_parse_profiles_batch(folder: str, work: str) -> int:
+    from bull_profiles import parse_profiles_batch
+    with open(os.path.join(folder, "profiles.json"), encoding="utf-8") as f:
+        texts = json.load(f)
+    return len(parse_profiles_batch(texts))
+
+
+def run_excel_to_csv(folder: str, work: str) -> int:
+    import excel_to_csv
+    from genotype_store import read_table
+    excel_to_csv.raw_folder = os.path.join(folder, "raw")
+    excel_to_csv.output_folder = work
+    excel_to_csv.incremental = False
+    excel_to_csv.main()
+    return len(read_table(os.path.join(work, "genotypes_unified.csv")))
+
+
+def run_assing_fathers(folder: str, work: str) -> int:
+    import assing_fathers
+    from genotype_store import read_table
+    assing_fathers.CHILD_DB = os.path.join(folder, "genotypes_unified.csv")
+    assing_fathers.BULLS_DB = os.path.join(folder, "bulls.csv")
+    assing_fathers.OUTPUT_DB = os.path.join(work, "lokus_database_with_fathers.csv")
+    assing_fathers.BULLS_CACHE = os.path.join(work, "bulls.registry.bin")  # compiled on every run
+    assing_fathers.main([])
+    return len(read_table(assing_fathers.CHILD_DB))
+
+
+CASES: Dict[str, Dict] = {
+    "parse_profiles": {"data": "profiles", "run": run_parse_profiles},
+    "parse_profiles_batch": {"data": "profiles", "run": run_parse_profiles_batch},
+    "excel_to_csv": {"data": "workbooks", "run": run_excel_to_csv},
+    "assing_fathers": {"data": "herd", "run": run_assing_fathers},
+}
+
+PREPARE: Dict[str, Callable[[str, int], None]] = {
+    "profiles": prepare_profiles,
+    "herd": prepare_herd,
+    "workbooks": prepare_workbooks,
+}
+
+
+def data_folder(data_dir: str, kind: str, scale: int) -> str:
+    """Folder with the generated data; generated into a temp folder and renamed, so it is never partial."""
+    folder = os.path.join(data_dir, f"{kind}_{scale}")
+    if not os.path.isdir(folder):
+        print(f"Генерация данных: {kind}, {scale}")
+        tmp = folder + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        PREPARE[kind](tmp, scale)
+        os.replace(tmp, folder)
+    return folder
+
+
+# -------------------------
+# Measurement (in the child process)
+# -------------------------
+def peak_memory_mb() -> float:
+    """Peak resident memory of this process and its finished children (excel_to_csv's pool)."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+        return counters.PeakWorkingSetSize / 2 ** 20
+    import resource
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == "darwin":
+        return max(own, children) / 2 ** 20  # bytes
+    # Linux carries ru_maxrss over fork and exec, so it would include the runner's own memory;
+    # VmHWM is the peak of this process image only
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    own = int(line.split()[1])
+    return max(own, children) / 2 ** 10  # kilobytes
+
+
+def run_child(case: str, folder: str, work: str) -> None:
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        items = CASES[case]["run"](folder, work)
+        seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "items": items, "peak_mb": peak_memory_mb()}))
+
+
+def measure(case: str, scale: int, data_dir: str, repeat: int) -> Optional[Dict]:
+    """Best time and largest peak memory over repeat fresh processes."""
+    folder = data_folder(data_dir, CASES[case]["data"], scale)
+    runs = []
+    for _ in range(repeat):
+        work = tempfile.mkdtemp(prefix=f"{case}_", dir=data_dir)
+        try:
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", case, folder, work],
+                                  capture_output=True, text=True, encoding="utf-8")
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+        if proc.returncode != 0:
+            print(f"  {case} {scale}: ошибка\n{proc.stderr.strip()}")
+            return None
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    seconds = min(r["seconds"] for r in runs)
+    return {
+        "seconds": round(seconds, 4),
+        "per_second": round(runs[0]["items"] / seconds, 1) if seconds > 0 else None,
+        "peak_mb": round(max(r["peak_mb"] for r in runs), 1),
+        "items": runs[0]["items"],
+    }
+
+
+# -------------------------
+# Baseline
+# -------------------------
+def load_baseline(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, baseline: Dict, results: Dict) -> None:
+    for case, by_scale in results.items():
+        baseline.setdefault("results", {}).setdefault(case, {}).update(by_scale)
+    baseline["machine"] = {"platform": platform.platform(), "python": platform.python_version(),
+                           "cpus": os.cpu_count()}
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def compare(result: Dict, base: Optional[Dict], tolerance: float) -> str:
+    """'' without a baseline, otherwise the ratios and a REGRESSION mark."""
+    if not base:
+        return ""
+    speed = result["seconds"] / base["seconds"] if base["seconds"] else 1.0
+    memory = result["peak_mb"] / base["peak_mb"] if base["peak_mb"] else 1.0
+    text = f"время x{speed:.2f}, память x{memory:.2f}"
+    if speed > 1 + tolerance or memory > 1 + tolerance:
+        text += "  REGRESSION"
+    return text
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Бенчмарки на синтетических данных")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--scales", nargs="+", type=int, default=SCALES)
+    parser.add_argument("--repeat", type=int, default=1, help="запусков на замер, берется лучшее время")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="где хранить сгенерированные данные")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--save-baseline", action="store_true", help="сохранить результаты как новую базу")
+    parser.add_argument("--child", nargs=3, metavar=("CASE", "DATA", "WORK"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(*args.child)
+        return
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    baseline = load_baseline(args.baseline)
+    results: Dict[str, Dict[str, Dict]] = {}
+    regressions = 0
+    print(f"{'case':<22}{'scale':>8}{'сек':>10}{'в секунду':>12}{'пик МБ':>9}  сравнение с базой")
+    for case in args.cases:
+        for scale in args.scales:
+            result = measure(case, scale, args.data_dir, max(1, args.repeat))
+            if result is None:
+                regressions += 1
+                continue
+            results.setdefault(case, {})[str(scale)] = result
+            base = baseline.get("results", {}).get(case, {}).get(str(scale))
+            verdict = compare(result, base, args.tolerance)
+            regressions += verdict.endswith("REGRESSION")
+            print(f"{case:<22}{scale:>8}{result['seconds']:>10.3f}{result['per_second'] or 0:>12.0f}"
+                  f"{result['peak_mb']:>9.0f}  {verdict or 'нет базы'}")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, baseline, results)
+        print(f"База сохранена: {args.baseline}")
+    elif regressions:
+        print(f"Замедлений или ошибок: {regressions}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
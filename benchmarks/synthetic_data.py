@@ -0,0 +1,221 @@
+"""Deterministic synthetic data in the layouts the scripts read.
+
+- bull registries like bulls_data_converted.csv (parser_batch output),
+- herds like genotypes_unified.csv, with children genotyped from those bulls,
+- lab workbooks in the 6-row "Потомок / Мать / Отец" layout excel_to_csv parses.
+
+The same (size, seed) always gives the same data.
+"""
+import os
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bull_profiles import CSV_KEYS, ORDERED_LOCI  # noqa: E402
+from excel_to_csv import FIXED_LOCI  # noqa: E402
+
+# Allele frequencies per locus (alleles >= 0.5%), from bulls_data_converted.csv and the sample
+# workbook (CSSM43, HAUT27 are not typed in the registry); AMEL is never filled in the registry
+ALLELE_FREQUENCIES: Dict[str, Dict[int, float]] = {
+    "TGLA227": {81: 0.056, 83: 0.04, 85: 0.005, 87: 0.073, 89: 0.351, 91: 0.2, 93: 0.031, 97: 0.163, 99: 0.024, 103: 0.038},
+    "BM2113": {125: 0.187, 127: 0.211, 131: 0.009, 133: 0.027, 135: 0.297, 137: 0.072, 139: 0.187},
+    "TGLA53": {154: 0.038, 158: 0.145, 160: 0.18, 162: 0.139, 166: 0.027, 168: 0.21, 170: 0.027, 172: 0.007, 176: 0.058, 184: 0.071, 186: 0.083},
+    "ETH10": {209: 0.089, 213: 0.041, 215: 0.025, 217: 0.166, 219: 0.292, 221: 0.034, 223: 0.219, 225: 0.13},
+    "SPS115": {141: 0.063, 143: 0.006, 147: 0.035, 151: 0.114, 153: 0.024, 155: 0.013, 248: 0.449, 252: 0.147, 254: 0.038, 256: 0.036, 258: 0.006, 260: 0.05},
+    "TGLA122": {141: 0.009, 143: 0.288, 147: 0.012, 149: 0.133, 151: 0.101, 153: 0.009, 155: 0.005, 161: 0.062, 163: 0.231, 171: 0.054, 183: 0.077},
+    "INRA23": {198: 0.016, 200: 0.012, 202: 0.169, 206: 0.222, 208: 0.033, 210: 0.192, 214: 0.339},
+    "TGLA126": {115: 0.31, 117: 0.562, 119: 0.018, 121: 0.063, 123: 0.038},
+    "BM1818": {258: 0.007, 260: 0.017, 262: 0.372, 264: 0.064, 266: 0.487, 268: 0.023, 270: 0.025},
+    "ETH225": {140: 0.072, 142: 0.015, 144: 0.084, 146: 0.035, 148: 0.402, 150: 0.358, 152: 0.028},
+    "BM1824": {178: 0.327, 180: 0.161, 182: 0.092, 188: 0.406, 190: 0.009},
+    "CSRM60": {92: 0.212, 94: 0.008, 96: 0.136, 98: 0.07, 100: 0.077, 102: 0.444, 104: 0.035},
+    "CSSM43": {252: 0.027, 254: 0.125, 256: 0.544, 258: 0.089, 260: 0.141, 262: 0.059, 264: 0.015},
+    "ETH3": {117: 0.403, 119: 0.031, 121: 0.008, 125: 0.081, 127: 0.068, 129: 0.4},
+    "ILST006": {286: 0.007, 288: 0.269, 290: 0.046, 292: 0.18, 293: 0.012, 294: 0.335, 296: 0.087, 297: 0.012, 298: 0.008, 299: 0.016, 300: 0.005},
+    "HAUT27": {142: 0.126, 144: 0.114, 146: 0.042, 148: 0.449, 150: 0.048, 152: 0.033, 154: 0.177},
+    "AMEL": {},
+}
+
+# Share of registry bulls without a locus, as in bulls_data_converted.csv
+REGISTRY_MISSING: Dict[str, float] = {
+    "TGLA227": 0.01, "BM2113": 0.0, "TGLA53": 0.04, "ETH10": 0.0, "SPS115": 0.01, "TGLA122": 0.01,
+    "INRA23": 0.01, "TGLA126": 0.01, "BM1818": 0.05, "ETH225": 0.01, "BM1824": 0.01, "CSRM60": 0.8,
+    "CSSM43": 1.0, "ETH3": 0.05, "ILST006": 0.82, "HAUT27": 1.0, "AMEL": 1.0,
+}
+
+# Cell the lab puts into the mother's rows when she was not genotyped
+NOT_TYPED = "─"
+
+STATUS_TEXT = {
+    0: "",
+    1: "Достоверность происхождения подтверждена по отцу и по матери",
+    2: "Достоверность происхождения подтверждена по отцу",
+    3: "Достоверность происхождения подтверждена по матери",
+}
+
+
+def sample_alleles(rng: np.random.Generator, locus: str, size) -> np.ndarray:
+    freqs = ALLELE_FREQUENCIES[locus]
+    alleles = np.fromiter(freqs.keys(), dtype=np.int64)
+    p = np.fromiter(freqs.values(), dtype=float)
+    return rng.choice(alleles, size=size, p=p / p.sum())
+
+
+def to_cells(alleles: np.ndarray, missing: np.ndarray, fill: str = "") -> np.ndarray:
+    """int alleles -> object array of strings, fill where missing."""
+    cells = alleles.astype(str).astype(object)
+    cells[missing] = fill
+    return cells
+
+
+def generate_bulls(n: int, seed: int = 1) -> pd.DataFrame:
+    """Bull registry in the bulls_data_converted.csv layout (CSV_KEYS columns, strings)."""
+    rng = np.random.default_rng(seed)
+    data: Dict[str, object] = {
+        "Идентификационный номер": [f"US{v:012d}" for v in rng.choice(10 ** 12, size=n, replace=False)],
+        "Дата рождения": [f"{d:02d}.{m:02d}.{y}" for d, m, y in zip(rng.integers(1, 29, n), rng.integers(1, 13, n),
+                                                                    rng.integers(2005, 2024, n))],
+        "Ссылка": [f"https://xn--90aof1e.xn--p1ai/bulls/bull/{10000000 + i}?token={rng.bytes(16).hex()}" for i in range(n)],
+    }
+    for locus in ORDERED_LOCI:
+        if not ALLELE_FREQUENCIES[locus]:
+            data[f"1_{locus}"] = data[f"2_{locus}"] = np.full(n, "", dtype=object)
+            continue
+        missing = rng.random(n) < REGISTRY_MISSING[locus]
+        pair = np.sort(sample_alleles(rng, locus, (n, 2)), axis=1)
+        data[f"1_{locus}"] = to_cells(pair[:, 0], missing)
+        data[f"2_{locus}"] = to_cells(pair[:, 1], missing)
+    return pd.DataFrame(data, columns=CSV_KEYS)
+
+
+def generate_children(bulls: pd.DataFrame, n: int, seed: int = 2, mutation_rate: float = 0.002,
+                      missing_rate: float = 0.005, assigned_rate: float = 0.9, mother_typed_rate: float = 0.06,
+                      n_herds: int = 1) -> pd.DataFrame:
+    """Herd in the genotypes_unified.csv layout: children of registry bulls and random dams.
+
+    Each child gets one allele of its father and one of its dam per locus. With mutation_rate
+    per locus the paternal allele is replaced by a neighbouring fragment size (a mismatch the
+    matcher has to tolerate); with missing_rate a child's locus is not typed. assigned_rate of
+    children carry their father in regotca (and his alleles in *_otca), the rest are left for
+    assing_fathers to find. Popular bulls have many more offspring than others.
+    """
+    rng = np.random.default_rng(seed)
+    loci = FIXED_LOCI
+    bull_ids = bulls["Идентификационный номер"].to_numpy(dtype=object)
+    weights = rng.pareto(1.2, len(bulls)) + 1e-3
+    fathers = rng.choice(len(bulls), size=n, p=weights / weights.sum())
+    assigned = rng.random(n) < assigned_rate
+    mother_typed = rng.random(n) < mother_typed_rate
+    statuses = np.where(assigned, np.where(mother_typed, 1, 2), np.where(mother_typed, 3, 0))
+
+    data: Dict[str, object] = {
+        "nomanimal": np.arange(1, n + 1),
+        "reganimal": [str(v) for v in rng.choice(10 ** 7, size=n, replace=False)],
+        "nomhoz": np.sort(rng.integers(1, n_herds + 1, n)),
+        "regotca": np.where(assigned, bull_ids[fathers], ""),
+        "regmateri": np.where(mother_typed, [f"RU{v:09d}" for v in rng.integers(10 ** 9, size=n)], ""),
+        "status": statuses,
+    }
+    child, father, mother = {}, {}, {}
+    for locus in loci:
+        dam = sample_alleles(rng, locus, (n, 2))
+        # bulls still have alleles at loci the registry lacks: draw them once per bull
+        genotype = np.sort(sample_alleles(rng, locus, (len(bulls), 2)), axis=1)
+        for k in (0, 1):
+            col = bulls[f"{k + 1}_{locus}"].to_numpy(dtype=object)
+            typed = col != ""
+            genotype[typed, k] = col[typed].astype(np.int64)
+        sire = genotype[fathers]
+        paternal = sire[np.arange(n), rng.integers(0, 2, n)]
+        mutated = rng.random(n) < mutation_rate
+        paternal[mutated] += rng.choice([-2, 2], size=int(mutated.sum()))
+        maternal = dam[np.arange(n), rng.integers(0, 2, n)]
+        pair = np.sort(np.stack([paternal, maternal], axis=1), axis=1)
+        not_typed = rng.random(n) < missing_rate
+        child[locus] = [to_cells(pair[:, k], not_typed) for k in (0, 1)]
+        registry_missing = bulls[f"1_{locus}"].to_numpy(dtype=object)[fathers] == ""
+        father[locus] = [to_cells(sire[:, k], ~assigned | registry_missing) for k in (0, 1)]
+        mother[locus] = [to_cells(np.sort(dam, axis=1)[:, k], ~mother_typed, NOT_TYPED) for k in (0, 1)]
+
+    for suffix, source in (("", child), ("_otca", father), ("_materi", mother)):
+        for locus in loci:
+            data[f"1_{locus}{suffix}"] = source[locus][0]
+            data[f"2_{locus}{suffix}"] = source[locus][1]
+    return pd.DataFrame(data)
+
+
+def xlsx_value(value):
+    """Numbers go into workbooks as numeric cells, like in the lab's files; empty cells stay empty."""
+    if value == "" or value is None:
+        return None
+    return int(value) if isinstance(value, str) and value.isdigit() else value
+
+
+def write_workbooks(children: pd.DataFrame, folder: str, animals_per_book: int = 2000) -> List[str]:
+    """Lab workbooks (one sheet, 6-row blocks per child) for a generate_children herd."""
+    os.makedirs(folder, exist_ok=True)
+    loci = FIXED_LOCI
+    header = ["№", None, None] + loci + ["AMEL"]
+    paths = []
+    rows = children.to_dict("records")
+    for book, start in enumerate(range(0, len(rows), animals_per_book)):
+        path = os.path.join(folder, f"Хозяйство {book + 1:03d} (1 партия).xlsx")
+        workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        sheet = workbook.add_worksheet("Лист1")
+        sheet.write_row(0, 0, header)
+        r = 1
+        for num, rec in enumerate(rows[start:start + animals_per_book], start=1):
+            blocks = (
+                ([num, "Потомок", xlsx_value(rec["reganimal"])], ""),
+                ([None, "Мать", xlsx_value(rec["regmateri"])], "_materi"),
+                ([None, "Отец", xlsx_value(rec["regotca"])], "_otca"),
+            )
+            for head, suffix in blocks:
+                for k in (1, 2):
+                    values = [xlsx_value(rec[f"{k}_{locus}{suffix}"]) for locus in loci]
+                    row = (head if k == 1 else [None, None, None]) + values
+                    if k == 1 and suffix == "":
+                        row += ["X", STATUS_TEXT[rec["status"]] or None]
+                    sheet.write_row(r, 0, row)
+                    r += 1
+            r += 1  # blank row between children
+        workbook.close()
+        paths.append(path)
+    return paths
+
+
+def profile_strings(bulls: pd.DataFrame, seed: int = 3, messy_rate: float = 0.0) -> List[str]:
+    """Микросателлитный профиль strings as on быки.рф ("TGLA227_89/91, BM2113_135/139, ...").
+
+    With messy_rate a part gets one of the spellings parse_profile_to_dict has to handle.
+    """
+    rng = np.random.default_rng(seed)
+    variants = ["{l}_{a}/{b}", "{l} {a}/{b}", "{l} - {a} / {b}", "{ll}_{a}/{b}", "{l}_{a}/{b}x"]
+    aliases = {"INRA23": "INRA023", "ILST006": "ILSTS006", "SPS115": "SPS113"}
+    texts = []
+    cols = {locus: (bulls[f"1_{locus}"].tolist(), bulls[f"2_{locus}"].tolist()) for locus in ORDERED_LOCI}
+    for i in range(len(bulls)):
+        parts = []
+        for locus in ORDERED_LOCI:
+            a, b = cols[locus][0][i], cols[locus][1][i]
+            if not a:
+                continue
+            name = aliases.get(locus, locus)
+            if messy_rate and rng.random() < messy_rate:
+                fmt = variants[rng.integers(1, len(variants))]
+                parts.append(fmt.format(l=name, ll=name.lower(), a=a, b=b))
+            else:
+                parts.append(f"{name}_{a}/{b}")
+        texts.append(", ".join(parts))
+    return texts
+
+
+def herd_for_registry(n_children: int, n_bulls: Optional[int] = None, seed: int = 1):
+    """(bulls, children) of a consistent synthetic dataset; by default one bull per 10 children."""
+    bulls = generate_bulls(n_bulls or max(100, n_children // 10), seed)
+    return bulls, generate_children(bulls, n_children, seed + 1, n_herds=max(1, n_children // 2000))
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Разбор профилей быков с быки.рф без браузера: локусы, микросателлитный профиль, запись для CSV
+"""
+
+import re
+from array import array
+from html.parser import HTMLParser
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+import numpy as np
+
+from parentage_engine import AlleleCoder
+
+# Маркеры и требуемый порядок колонок
+ORDERED_LOCI = [
+    "TGLA227", "BM2113", "TGLA53", "ETH10", "SPS115", "TGLA122", "INRA23",
+    "TGLA126", "BM1818", "ETH225", "BM1824", "CSRM60", "CSSM43", "ETH3",
+    "ILST006", "HAUT27", "AMEL",
+]
+
+# Нормализация названий локусов
+LOCUS_NORMALIZATION = {
+    "INRA023": "INRA23",
+    "ILSTS006": "ILST006",
+    "SPS113": "SPS115",
+}
+
+# Регулярка для пары locus_allele1/allele2
+PAIR_RE = re.compile(r"^([A-Za-z0-9]+)\s*[_\-]\s*([0-9]+)\s*/\s*([0-9]+)\s*$")
+
+# PAIR_RE и запасной вариант "локус аллель1/аллель2" (пробелы вместо "_") одним проходом:
+# совпадает ровно с теми частями, которые принимает PAIR_RE до или после замены пробелов на "_"
+PART_RE = re.compile(r"([A-Za-z0-9]+)(?:\s*[_\-]\s*([0-9]+)\s*/\s*([0-9]+)|\s+([0-9]+)/([0-9]+))\s*")
+
+# Индекс колонки локуса по названию в верхнем регистре, включая синонимы из LOCUS_NORMALIZATION
+LOCUS_INDEX = {locus: i for i, locus in enumerate(ORDERED_LOCI)}
+LOCUS_INDEX.update({raw: LOCUS_INDEX[name] for raw, name in LOCUS_NORMALIZATION.items() if name in LOCUS_INDEX})
+
+ALLELE_MAX = 9999  # Аллели кодируются своим числом, как в parentage_engine (0 - нет аллели)
+
+# Подпись ячейки с профилем на странице быка
+PROFILE_LABEL = "Микросателлитный профиль"
+
+# Строка списка быков и ссылка на профиль в ней (как ROWS_JS в parser_batch)
+LIST_ROW_REPEAT = "animal in animals"
+BULL_LINK_PART = "/bulls/bull/"
+
+# Колонки bulls_data.csv
+META_KEYS = ['Идентификационный номер', 'Дата рождения', 'Ссылка']
+LOCI_KEYS = [f"{n}_{locus}" for locus in ORDERED_LOCI for n in (1, 2)]
+CSV_KEYS = META_KEYS + LOCI_KEYS
+
+
+def url_key(url: str) -> str:
+    """Ссылка на быка без параметра token (он разный в каждой сессии) - постоянный ключ быка"""
+    parts = urlsplit(url.strip())
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != 'token']
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))
+
+def normalize_locus(raw: str) -> str:
+    """Нормализация названия локуса"""
+    name = raw.strip().upper()
+    name = LOCUS_NORMALIZATION.get(name, name)
+    return name
+
+def parse_profile_to_dict(profile_text: str) -> dict:
+    """Разобрать строку профиля вида "BM1818_266/270, ..." -> {"BM1818": ("266","270"), ...}"""
+    result = {}
+    if not isinstance(profile_text, str) or not profile_text.strip():
+        return result
+
+    for part in profile_text.split(","):
+        m = PART_RE.fullmatch(part.strip())
+        if not m:
+            continue
+        i = LOCUS_INDEX.get(m.group(1).upper())
+        if i is None:
+            continue
+        if m.group(2) is not None:
+            result[ORDERED_LOCI[i]] = (m.group(2), m.group(3))
+        else:
+            result[ORDERED_LOCI[i]] = (m.group(4), m.group(5))
+
+    return result
+
+def canonical_allele(allele: str) -> int:
+    """Строгий encode для parse_profiles_batch: аллель без ведущих нулей до ALLELE_MAX -> ее число,
+    иначе 0 (такая часть профиля отклоняется)"""
+    if allele[0] != "0" and len(allele) <= 4:
+        return int(allele)
+    return 0
+
+def checked_code(code: int) -> int:
+    if code > np.iinfo(np.int16).max:
+        raise ValueError("Код аллели не помещается в int16")
+    return code
+
+class ProfileBatch:
+    """
+    Результат parse_profiles_batch:
+    alleles - int16 (профили x ORDERED_LOCI x 2), 0 - аллели нет;
+    valid - bool (профили x ORDERED_LOCI), локус заполнен;
+    rejected - [(номер профиля, часть строки)] для частей, которые не удалось разобрать;
+    coder - AlleleCoder кодов (None, если передан свой encode).
+    """
+
+    def __init__(self, alleles, valid, rejected, coder=None):
+        self.alleles = alleles
+        self.valid = valid
+        self.rejected = rejected
+        self.coder = coder
+
+    def __len__(self):
+        return self.alleles.shape[0]
+
+    def profile(self, row: int) -> dict:
+        """Профиль row в виде parse_profile_to_dict: {"BM1818": ("266", "270"), ...}"""
+        decode = self.coder.decode
+        return {ORDERED_LOCI[i]: (decode(self.alleles[row, i, 0]), decode(self.alleles[row, i, 1]))
+                for i in np.flatnonzero(self.valid[row])}
+
+def parse_profiles_batch(profile_texts, encode=None) -> ProfileBatch:
+    """
+    Разобрать много строк профиля за один проход в колоночный вид.
+    По умолчанию аллели кодируются AlleleCoder (коды как в parentage_engine), и результат
+    совпадает с parse_profile_to_dict: те же части, последняя пара по локусу побеждает.
+    В rejected попадают части, которые parse_profile_to_dict молча пропускает (не пара аллелей,
+    неизвестный локус), и части, для аллели которых encode вернул 0. Например, с
+    encode=canonical_allele отклоняются аллели с ведущими нулями и длиннее 4 цифр.
+    """
+    coder = None
+    if encode is None:
+        coder = AlleleCoder()
+        encode = coder.encode
+    texts = profile_texts if isinstance(profile_texts, list) else list(profile_texts)
+    n_loci = len(ORDERED_LOCI)
+    fullmatch = PART_RE.fullmatch
+    locus_index = LOCUS_INDEX.get
+
+    # ячейки (профиль * n_loci + локус) и пары кодов всех принятых частей подряд, в компактных
+    # массивах; код каждой различной строки аллели считается один раз
+    cells = array("q")
+    codes = array("h")
+    memo = {}
+    rejected = []
+    for row, text in enumerate(texts):
+        if not isinstance(text, str):
+            continue
+        base = row * n_loci
+        for part in text.split(","):
+            part = part.strip()
+            if not part:
+                continue
+            m = fullmatch(part)
+            i = locus_index(m.group(1).upper()) if m else None
+            if i is None:
+                rejected.append((row, part))
+                continue
+            g = m.groups()
+            a1, a2 = (g[3], g[4]) if g[1] is None else (g[1], g[2])
+            c1 = memo.get(a1)
+            if c1 is None:
+                c1 = memo[a1] = checked_code(encode(a1))
+            c2 = memo.get(a2)
+            if c2 is None:
+                c2 = memo[a2] = checked_code(encode(a2))
+            if not (c1 and c2):
+                rejected.append((row, part))
+                continue
+            cells.append(base + i)
+            codes.append(c1)
+            codes.append(c2)
+
+    # при повторе локуса в строке побеждает последняя часть: части идут по порядку,
+    # а присваивание с повторяющимися индексами оставляет последнее значение
+    alleles = np.zeros((len(texts) * n_loci, 2), dtype=np.int16)
+    valid = np.zeros(len(texts) * n_loci, dtype=bool)
+    cells = np.frombuffer(cells, dtype=np.int64)
+    alleles[cells] = np.frombuffer(codes, dtype=np.int16).reshape(-1, 2)
+    valid[cells] = True
+    return ProfileBatch(alleles.reshape(len(texts), n_loci, 2), valid.reshape(len(texts), n_loci), rejected, coder)
+
+def pick_id_number(texts) -> str:
+    """ID быка среди текстов ячеек строки списка: 2-3 буквы + много цифр (US0018553781)"""
+    for text in texts:
+        if text and len(text) > 8 and any(c.isalpha() for c in text[:3]) and any(c.isdigit() for c in text[3:]):
+            return text
+    return 'Не найдено'
+
+def pick_birth_date(texts) -> str:
+    """Дата рождения в формате DD.MM.YYYY среди текстов ячеек строки списка"""
+    for text in texts:
+        if text and '.' in text and len(text) == 10 and text.count('.') == 2:
+            parts = text.split('.')
+            if len(parts) == 3 and all(part.isdigit() for part in parts):
+                return text
+    return 'Не найдено'
+
+def build_record(profile_info: dict, parsed_profile: dict) -> dict:
+    """Строка bulls_data.csv из ссылки (bulls_links.json) и разобранного профиля"""
+    record = {
+        'Идентификационный номер': profile_info['id_number'],
+        'Дата рождения': profile_info['birth_date'],
+        'Ссылка': profile_info['url']
+    }
+
+    # Добавляем колонки для каждого локуса
+    for locus in ORDERED_LOCI:
+        if locus in parsed_profile:
+            record[f"1_{locus}"] = parsed_profile[locus][0]
+            record[f"2_{locus}"] = parsed_profile[locus][1]
+        else:
+            record[f"1_{locus}"] = ""
+            record[f"2_{locus}"] = ""
+    return record
+
+
+class _ProfileCellParser(HTMLParser):
+    """Текст ячейки <td>, следующей за ячейкой с подписью PROFILE_LABEL"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.td_depth = 0
+        self.cell_text = []
+        self.label_seen = False
+        self.capturing = False
+        self.profile = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "td":
+            self.td_depth += 1
+            self.cell_text = []
+            self.capturing = self.label_seen and self.profile is None
+        elif tag == "tr":
+            # профиль ищем только в той же строке таблицы, что и подпись
+            self.label_seen = False
+
+    def handle_endtag(self, tag):
+        if tag != "td" or self.td_depth == 0:
+            return
+        self.td_depth -= 1
+        text = " ".join("".join(self.cell_text).split())
+        if self.capturing:
+            self.profile = text
+            self.capturing = False
+        elif PROFILE_LABEL in text:
+            self.label_seen = True
+
+    def handle_data(self, data):
+        if self.td_depth:
+            self.cell_text.append(data)
+
+
+def extract_micro_profile(html: str):
+    """Микросателлитный профиль из HTML страницы быка или None, если ячейки нет"""
+    parser = _ProfileCellParser()
+    parser.feed(html)
+    parser.close()
+    return parser.profile
+
+
+class _ListRowsParser(HTMLParser):
+    """Строки списка быков из HTML страницы списка, в том же виде, что возвращает ROWS_JS"""
+
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.rows = []
+        self.row = None
+        self.depth = 0  # вложенность div
+        self.row_depth = 0
+        self.open_divs = []  # (номер в row['divs'], куски текста) открытых div строки
+        self.in_link = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a" and self.row is not None and self.row['url'] is None:
+            attrs = dict(attrs)
+            if BULL_LINK_PART in (attrs.get("ng-href") or ""):
+                self.row['url'] = urljoin(self.base_url, attrs.get("href") or attrs["ng-href"])
+                self.in_link = True
+            return
+        if tag != "div":
+            return
+        self.depth += 1
+        if self.row is None:
+            if dict(attrs).get("ng-repeat") == LIST_ROW_REPEAT:
+                self.row = {'url': None, 'inv': [], 'divs': [], 'text': []}
+                self.row_depth = self.depth
+        else:
+            self.row['divs'].append("")
+            self.open_divs.append((len(self.row['divs']) - 1, []))
+
+    def handle_endtag(self, tag):
+        if tag == "a":
+            self.in_link = False
+            return
+        if tag != "div" or self.depth == 0:
+            return
+        if self.row is not None:
+            if self.depth == self.row_depth:
+                row = self.row
+                row['inv'] = " ".join("".join(row['inv']).split())
+                row['text'] = " ".join("".join(row['text']).split())
+                self.rows.append(row)
+                self.row = None
+                self.open_divs = []
+            elif self.open_divs:
+                i, chunks = self.open_divs.pop()
+                self.row['divs'][i] = " ".join("".join(chunks).split())
+        self.depth -= 1
+
+    def handle_data(self, data):
+        if self.row is None:
+            return
+        self.row['text'].append(data)
+        if self.in_link:
+            self.row['inv'].append(data)
+        for _, chunks in self.open_divs:
+            chunks.append(data)
+
+
+def extract_list_rows(html: str, base_url: str):
+    """Строки страницы списка быков: [{'url', 'inv', 'divs', 'text'}], ссылки относительно base_url"""
+    parser = _ListRowsParser(base_url)
+    parser.feed(html)
+    parser.close()
+    return parser.rows
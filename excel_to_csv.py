@@ -1,13 +1,23 @@
+import hashlib
+import json
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 
+import genotype_db
+from genotype_store import save_table
+
 # -------------------------
 # Настройки
 # -------------------------
 raw_folder = r"C:\Users\user\Desktop\genetic\zrya_raw"
 output_folder = r"C:\Users\user\Desktop\genetic\zrya_processed"
-os.makedirs(output_folder, exist_ok=True)
+n_workers = os.cpu_count() or 1  # процессов для параллельного чтения книг
+incremental = True  # разбирать только новые/изменённые книги, остальные брать из кэша
+write_db = True  # обновлять базу генотипов genotypes.sqlite в папке с результатами (см. genotype_db)
 
 # -------------------------
 # Вспомогательные функции
@@ -24,6 +34,11 @@ def cell_text(v):
         return ""
     return str(v).strip()
 
+def sheet_text(df: pd.DataFrame) -> np.ndarray:
+    """Весь лист -> 2-D массив строк за один проход (то же, что cell_text для каждой ячейки)"""
+    values = df.to_numpy(dtype=object)
+    return np.char.strip(np.where(pd.isna(values), "", values).astype(str))
+
 def split_ids(raw_id: str) -> list:
     """Разбить строку идентификатора на отдельные ID только по явным разделителям '/', ',', ';' или '\\'.
     Пробелы считаем частью идентификатора (например: '9061 Маяк Рр' — один ID)."""
@@ -45,167 +60,339 @@ CANONICAL_LOCI_ORDER = [
 ]
 FIXED_LOCI = CANONICAL_LOCI_ORDER[:16]
 
+# Версия разбора книги (parse_workbook): увеличить при изменении разбора, чтобы инкрементальный
+# режим не брал из кэша результаты старого разбора. FIXED_LOCI входит в ключ кэша отдельно
+PARSE_VERSION = 1
+
 # -------------------------
-# Основной проход по файлам
+# Разбор одного файла (выполняется в отдельном процессе)
 # -------------------------
-all_data = []
-hoz_mapping = {}
-hoz_counter = 1
-errors = []
-father_registry = {}
-registry_loci_set = set()
-
-for fname in sorted(os.listdir(raw_folder)):
-    if not (fname.lower().endswith(".xlsx") or fname.lower().endswith(".xls")):
-        continue
-
-    path = os.path.join(raw_folder, fname)
-    hoz_name = clean_hoz_name(fname)
-    if hoz_name not in hoz_mapping:
-        hoz_mapping[hoz_name] = hoz_counter
-        hoz_counter += 1
-    nomhoz = hoz_mapping[hoz_name]
-
-    print(f"Обрабатываю файл: {fname} (хоз: {hoz_name} → {nomhoz})")
+def parse_workbook(path: str, fname: str) -> dict:
+    """Разобрать все листы одной книги.
+
+    Возвращает записи животных (nomanimal/nomhoz проставляются при слиянии),
+    ошибки и строки журнала, чтобы вывод не перемешивался между процессами."""
+    result = {"records": [], "errors": [], "log": [], "read_ok": False}
+    errors = result["errors"]
+    log = result["log"]
 
     try:
         # Читаем все листы для устойчивости к разметке
         sheets = pd.read_excel(path, header=None, dtype=object, sheet_name=None)
     except Exception as e:
         errors.append(f"Ошибка чтения {fname}: {e}")
-        print(errors[-1])
-        continue
-
-    file_animals = 0
+        log.append(errors[-1])
+        return result
+    result["read_ok"] = True
 
     for sheet_name, df in sheets.items():
         if df is None or df.empty:
-            print(f"  Лист '{sheet_name}': пустой")
+            log.append(f"  Лист '{sheet_name}': пустой")
             continue
 
         # Используем фиксированный порядок локусов (без AMEL): ровно 16
         loci = FIXED_LOCI
-        print(f"  Лист '{sheet_name}': используем фиксированные локусы = {len(loci)}")
+        log.append(f"  Лист '{sheet_name}': используем фиксированные локусы = {len(loci)}")
 
         nrows = df.shape[0]
-        i = 0
-        while i < nrows:
-            # Ищем слово 'потомок' в строке (не только в столбце B)
-            row_text_joined = " ".join([cell_text(x).lower() for x in df.iloc[i, :].tolist()])
-            if "потомок" in row_text_joined:
-                # Проверка на границы для блока из 6 строк
-                if i + 5 >= nrows:
-                    errors.append(f"{fname} / лист '{sheet_name}': неполный блок потомка начиная со строки {i+1}")
-                    print(f"  Лист '{sheet_name}': неполный блок потомка (i={i})")
-                    i += 1
-                    continue
-
-                reganimal = cell_text(df.iloc[i, 2])
-
-                # потомок
-                values_child_1 = df.iloc[i, 3:3+len(loci)].tolist()
-                values_child_2 = df.iloc[i+1, 3:3+len(loci)].tolist()
-
-                # мать (идёт перед отцом)
-                regmateri = cell_text(df.iloc[i+2, 2])
-                values_mother_1 = df.iloc[i+2, 3:3+len(loci)].tolist()
-                values_mother_2 = df.iloc[i+3, 3:3+len(loci)].tolist()
-
-                # отец
-                regotca = cell_text(df.iloc[i+4, 2])
-                values_father_1 = df.iloc[i+4, 3:3+len(loci)].tolist()
-                values_father_2 = df.iloc[i+5, 3:3+len(loci)].tolist()
-
-                # статус: ищем по всей строке потомка
-                status_row_text = row_text_joined
-                if "по отцу и по матери" in status_row_text:
-                    status = 1
-                elif "по отцу" in status_row_text:
-                    status = 2
-                elif "по матери" in status_row_text:
-                    status = 3
-                else:
-                    status = 0  # не указан
-
-                rec = {
-                    "nomanimal": len(all_data) + 1,
-                    "reganimal": reganimal,
-                    "nomhoz": nomhoz,
-                    "regotca": regotca,
-                    "regmateri": regmateri,
-                    "status": status
-                }
-
-                # потомок
-                for j, locus in enumerate(loci):
-                    rec[f"1_{locus}"] = cell_text(values_child_1[j]) if j < len(values_child_1) else ""
-                    rec[f"2_{locus}"] = cell_text(values_child_2[j]) if j < len(values_child_2) else ""
+        text = sheet_text(df)
+        text_lower = np.char.lower(text)
 
-                # отец
-                for j, locus in enumerate(loci):
-                    rec[f"1_{locus}_otca"] = cell_text(values_father_1[j]) if j < len(values_father_1) else ""
-                    rec[f"2_{locus}_otca"] = cell_text(values_father_2[j]) if j < len(values_father_2) else ""
+        # Все строки со словом 'потомок' (не только в столбце B) одним проходом
+        hit_rows = np.flatnonzero((np.char.find(text_lower, "потомок") >= 0).any(axis=1))
+        next_row = 0  # строки внутри уже разобранного блока пропускаем
+        for i in hit_rows.tolist():
+            if i < next_row:
+                continue
+            # Проверка на границы для блока из 6 строк
+            if i + 5 >= nrows:
+                errors.append(f"{fname} / лист '{sheet_name}': неполный блок потомка начиная со строки {i+1}")
+                log.append(f"  Лист '{sheet_name}': неполный блок потомка (i={i})")
+                next_row = i + 1
+                continue
+
+            # блок из 6 строк: потомок, мать (идёт перед отцом), отец — по две строки аллелей
+            block = text[i:i+6]
+            alleles = block[:, 3:3+len(loci)].tolist()
+            n_alleles = len(alleles[0])
+            reganimal = block[0, 2]
+            regmateri = block[2, 2]
+            regotca = block[4, 2]
+
+            # статус: ищем по всей строке потомка
+            status_row_text = " ".join(text_lower[i].tolist())
+            if "по отцу и по матери" in status_row_text:
+                status = 1
+            elif "по отцу" in status_row_text:
+                status = 2
+            elif "по матери" in status_row_text:
+                status = 3
+            else:
+                status = 0  # не указан
 
-                # мать
+            rec = {
+                "nomanimal": None,  # проставляется при слиянии
+                "reganimal": reganimal,
+                "nomhoz": None,  # проставляется при слиянии
+                "regotca": regotca,
+                "regmateri": regmateri,
+                "status": status
+            }
+
+            # потомок, отец, мать: (суффикс, строка первого аллеля в блоке)
+            for suffix, first in (("", 0), ("_otca", 4), ("_materi", 2)):
+                values_1 = alleles[first]
+                values_2 = alleles[first + 1]
                 for j, locus in enumerate(loci):
-                    rec[f"1_{locus}_materi"] = cell_text(values_mother_1[j]) if j < len(values_mother_1) else ""
-                    rec[f"2_{locus}_materi"] = cell_text(values_mother_2[j]) if j < len(values_mother_2) else ""
-
-                all_data.append(rec)
-                # accumulate father registry (возможны множественные ID через '/', ',', пробел)
-                for fid in split_ids(regotca):
-                    entry = father_registry.setdefault(fid, {})
-                    for j, locus in enumerate(loci):
-                        f1 = cell_text(values_father_1[j]) if j < len(values_father_1) else ""
-                        f2 = cell_text(values_father_2[j]) if j < len(values_father_2) else ""
-                        if f1 or f2:
-                            registry_loci_set.add(locus)
-                            if f"1_{locus}" not in entry or not entry[f"1_{locus}"]:
-                                entry[f"1_{locus}"] = f1
-                            if f"2_{locus}" not in entry or not entry[f"2_{locus}"]:
-                                entry[f"2_{locus}"] = f2
-                file_animals += 1
-                i += 6
-                continue
+                    rec[f"1_{locus}{suffix}"] = values_1[j] if j < n_alleles else ""
+                    rec[f"2_{locus}{suffix}"] = values_2[j] if j < n_alleles else ""
+
+            result["records"].append(rec)
+            next_row = i + 6
+
+    return result
+
+def parse_workbook_task(task):
+    return parse_workbook(*task)
+
+# -------------------------
+# Манифест и кэш разобранных книг (инкрементальный режим)
+# -------------------------
+def manifest_path() -> str:
+    return os.path.join(output_folder, "ingest_manifest.json")
+
+def parse_cache_dir() -> str:
+    return os.path.join(output_folder, "ingest_cache")
+
+def db_path() -> str:
+    return os.path.join(output_folder, genotype_db.DB_NAME)
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def write_json_atomic(path: str, data) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def load_manifest() -> dict:
+    """Манифест прошлого запуска: файлы (размер, mtime, sha256, номера животных),
+    сопоставление хозяйств и следующий свободный nomanimal"""
+    empty = {"files": {}, "hoz_mapping": {}, "next_nomanimal": 1}
+    if not incremental or not os.path.exists(manifest_path()):
+        return empty
+    try:
+        with open(manifest_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Манифест не прочитан ({e}), выполняем полный разбор")
+        return empty
+
+def parse_cache_name(sha256: str, fname: str) -> str:
+    # имя файла входит в тексты ошибок, поэтому ключ кэша — содержимое вместе с именем,
+    # а также версия разбора и список локусов
+    key = f"{PARSE_VERSION}\0{','.join(FIXED_LOCI)}\0{fname}\0{sha256}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json"
 
-            i += 1
+def load_cached_parse(sha256: str, fname: str):
+    """Результат parse_workbook из кэша или None"""
+    path = os.path.join(parse_cache_dir(), parse_cache_name(sha256, fname))
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("fname") != fname:
+        return None
+    return cached["parsed"]
 
-    print(f"  Найдено животных в файле: {file_animals}")
+def save_cached_parse(sha256: str, fname: str, parsed: dict) -> None:
+    os.makedirs(parse_cache_dir(), exist_ok=True)
+    write_json_atomic(os.path.join(parse_cache_dir(), parse_cache_name(sha256, fname)), {"fname": fname, "parsed": parsed})
 
 # -------------------------
-# Сохранение
+# Основной проход по файлам
 # -------------------------
-df_all = pd.DataFrame(all_data)
-out_csv = os.path.join(output_folder, "genotypes_unified.csv")
-df_all.to_csv(out_csv, index=False, sep=";", encoding="utf-8-sig")
-
-hoz_list = pd.DataFrame([{"nomhoz": v, "name_hoz": k} for k, v in hoz_mapping.items()])
-hoz_csv = os.path.join(output_folder, "hoz_list.csv")
-hoz_list.to_csv(hoz_csv, index=False, sep=";", encoding="utf-8-sig")
-
-# fathers registry CSV (строго по фиксированным локусам)
-if father_registry:
-    loci_order = FIXED_LOCI
-    cols = ["Идентификационный номер"]
-    for l in loci_order:
-        cols.append(f"1_{l}")
-        cols.append(f"2_{l}")
-    rows = []
-    for fid, data in father_registry.items():
-        row = {c: "" for c in cols}
-        row["Идентификационный номер"] = fid
+def main():
+    os.makedirs(output_folder, exist_ok=True)
+
+    fnames = [fname for fname in sorted(os.listdir(raw_folder))
+              if fname.lower().endswith(".xlsx") or fname.lower().endswith(".xls")]
+    manifest = load_manifest()
+    old_files = manifest["files"]
+
+    # Что изменилось с прошлого запуска: размер/mtime, при расхождении — хэш содержимого
+    file_info = {}
+    parsed_by_name = {}
+    to_parse = []
+    for fname in fnames:
+        path = os.path.join(raw_folder, fname)
+        st = os.stat(path)
+        old = old_files.get(fname)
+        if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime:
+            sha256 = old["sha256"]
+        else:
+            sha256 = file_sha256(path)
+        file_info[fname] = {"path": path, "size": st.st_size, "mtime": st.st_mtime, "sha256": sha256}
+        cached = load_cached_parse(sha256, fname) if incremental else None
+        if cached is None:
+            to_parse.append(fname)
+        else:
+            parsed_by_name[fname] = cached
+
+    tasks = [(file_info[fname]["path"], fname) for fname in to_parse]
+
+    # Книги разбираются параллельно, результаты приходят в порядке имён файлов
+    if n_workers > 1 and len(tasks) > 1:
+        executor = ProcessPoolExecutor(max_workers=min(n_workers, len(tasks)))
+        results = executor.map(parse_workbook_task, tasks)
+    else:
+        executor = None
+        results = map(parse_workbook_task, tasks)
+    try:
+        for fname, parsed in zip(to_parse, results):
+            parsed_by_name[fname] = parsed
+            # неудачное чтение (нет xlrd/openpyxl, файл открыт в Excel, недокопирован) не кэшируется,
+            # чтобы при следующем запуске книга читалась заново
+            if parsed["read_ok"]:
+                save_cached_parse(file_info[fname]["sha256"], fname, parsed)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    all_data = []
+    # номера хозяйств и животных сохраняются между запусками, новые получают следующие свободные
+    hoz_mapping = dict(manifest["hoz_mapping"])
+    hoz_counter = max(hoz_mapping.values(), default=0) + 1
+    hoz_seen = []
+    next_nomanimal = manifest["next_nomanimal"]
+    errors = []
+    father_registry = {}
+    registry_loci_set = set()
+
+    for fname in fnames:
+        parsed = parsed_by_name[fname]
+        hoz_name = clean_hoz_name(fname)
+        if hoz_name not in hoz_mapping:
+            hoz_mapping[hoz_name] = hoz_counter
+            hoz_counter += 1
+        if hoz_name not in hoz_seen:
+            hoz_seen.append(hoz_name)
+        nomhoz = hoz_mapping[hoz_name]
+
+        print(f"Обрабатываю файл: {fname} (хоз: {hoz_name} → {nomhoz})")
+        if fname in to_parse:
+            for line in parsed["log"]:
+                print(line)
+        else:
+            print("  Файл не изменился, результат взят из кэша")
+        errors.extend(parsed["errors"])
+
+        # nomanimal животного: по (reganimal, номер вхождения в файле), как в прошлом запуске
+        old_numbers = {(reg, k): num for reg, k, num in old_files.get(fname, {}).get("animals", [])}
+        occurrences = {}
+        file_animals = []
+
+        loci = FIXED_LOCI
+        for rec in parsed["records"]:
+            k = occurrences.get(rec["reganimal"], 0)
+            occurrences[rec["reganimal"]] = k + 1
+            nomanimal = old_numbers.get((rec["reganimal"], k))
+            if nomanimal is None:
+                nomanimal = next_nomanimal
+                next_nomanimal += 1
+            file_animals.append([rec["reganimal"], k, nomanimal])
+            rec["nomanimal"] = nomanimal
+            rec["nomhoz"] = nomhoz
+            all_data.append(rec)
+            # accumulate father registry (возможны множественные ID через '/', ',', пробел)
+            for fid in split_ids(rec["regotca"]):
+                entry = father_registry.setdefault(fid, {})
+                for locus in loci:
+                    f1 = rec[f"1_{locus}_otca"]
+                    f2 = rec[f"2_{locus}_otca"]
+                    if f1 or f2:
+                        registry_loci_set.add(locus)
+                        if f"1_{locus}" not in entry or not entry[f"1_{locus}"]:
+                            entry[f"1_{locus}"] = f1
+                        if f"2_{locus}" not in entry or not entry[f"2_{locus}"]:
+                            entry[f"2_{locus}"] = f2
+        file_info[fname]["animals"] = file_animals
+
+        if not parsed["read_ok"]:
+            continue
+        print(f"  Найдено животных в файле: {len(parsed['records'])}")
+
+    # -------------------------
+    # Сохранение
+    # -------------------------
+    # рядом с каждым CSV с генотипами пишется его колоночная копия (.npz, см. genotype_store)
+    df_all = pd.DataFrame(all_data)
+    out_csv = os.path.join(output_folder, "genotypes_unified.csv")
+    save_table(df_all, out_csv)
+
+    hoz_list = pd.DataFrame([{"nomhoz": hoz_mapping[k], "name_hoz": k} for k in sorted(hoz_seen, key=hoz_mapping.get)])
+    hoz_csv = os.path.join(output_folder, "hoz_list.csv")
+    hoz_list.to_csv(hoz_csv, index=False, sep=";", encoding="utf-8-sig")
+
+    # fathers registry CSV (строго по фиксированным локусам)
+    df_fathers = None
+    if father_registry:
+        loci_order = FIXED_LOCI
+        cols = ["Идентификационный номер"]
         for l in loci_order:
-            row[f"1_{l}"] = data.get(f"1_{l}", "")
-            row[f"2_{l}"] = data.get(f"2_{l}", "")
-        rows.append(row)
-    fathers_csv = os.path.join(output_folder, "fathers_registry.csv")
-    pd.DataFrame(rows, columns=cols).to_csv(fathers_csv, index=False, sep=";", encoding="utf-8-sig")
-
-err_log = os.path.join(output_folder, "processing_errors.txt")
-with open(err_log, "w", encoding="utf-8") as f:
-    f.write("\n".join(errors))
-
-print(f"\nГотово! Записано {len(df_all)} животных.")
-print(f"Файлы: {out_csv}, {hoz_csv}")
-if father_registry:
-    print("Сформирован реестр отцов: fathers_registry.csv")
+            cols.append(f"1_{l}")
+            cols.append(f"2_{l}")
+        rows = []
+        for fid, data in father_registry.items():
+            row = {c: "" for c in cols}
+            row["Идентификационный номер"] = fid
+            for l in loci_order:
+                row[f"1_{l}"] = data.get(f"1_{l}", "")
+                row[f"2_{l}"] = data.get(f"2_{l}", "")
+            rows.append(row)
+        fathers_csv = os.path.join(output_folder, "fathers_registry.csv")
+        df_fathers = pd.DataFrame(rows, columns=cols)
+        save_table(df_fathers, fathers_csv)
+
+    # база генотипов: животные и отцы из экселей заменяются целиком, каждая таблица одной транзакцией
+    if write_db:
+        conn = genotype_db.connect(db_path())
+        try:
+            genotype_db.load_herd(conn, df_all, {hoz_mapping[k]: k for k in hoz_seen})
+            if df_fathers is not None:
+                genotype_db.load_bulls(conn, df_fathers, genotype_db.SOURCE_LAB)
+        finally:
+            conn.close()
+
+    err_log = os.path.join(output_folder, "processing_errors.txt")
+    with open(err_log, "w", encoding="utf-8") as f:
+        f.write("\n".join(errors))
+
+    # Манифест для следующего инкрементального запуска; кэш удалённых/изменённых книг чистим
+    write_json_atomic(manifest_path(), {
+        "files": file_info,
+        "hoz_mapping": hoz_mapping,
+        "next_nomanimal": next_nomanimal,
+    })
+    live_cache = {parse_cache_name(info["sha256"], fname) for fname, info in file_info.items()}
+    if os.path.isdir(parse_cache_dir()):
+        for name in os.listdir(parse_cache_dir()):
+            if name not in live_cache:
+                os.remove(os.path.join(parse_cache_dir(), name))
+
+    print(f"\nГотово! Записано {len(df_all)} животных.")
+    print(f"Файлы: {out_csv}, {hoz_csv}")
+    if father_registry:
+        print("Сформирован реестр отцов: fathers_registry.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+import argparse
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from allele_frequencies import mix64
+import genotype_db
+from genotype_store import CSV_ENCODING, CSV_SEP, GenotypeTable, read_table
+from parentage_engine import MISSING, AlleleCoder
+from registry_cache import get_father_id_column
+
+
+# Configuration: (source name, CSV path) of the genotype tables to check against each other;
+# a newer .npz genotype store next to a CSV is read instead of it
+SOURCES = [
+    ("registry", "bulls_data_converted.csv"),  # parser_batch
+    ("lab", r"C:\Users\user\Desktop\genetic\zrya_processed\fathers_registry.csv"),  # excel_to_csv
+    ("herd", r"C:\Users\user\Desktop\genetic\zrya_processed\genotypes_unified.csv"),
+]
+REPORT_PATH = r"C:\Users\user\Desktop\genetic\zrya_processed\duplicates_report.csv"
+
+# Two records are the same genotype when they are compared on at least MIN_COMPARED_LOCI loci
+# (typed in both) and differ on at most MAX_DIFFERENT_LOCI of them (typing errors, mutations)
+MIN_COMPARED_LOCI = 11
+MAX_DIFFERENT_LOCI = 1
+
+# Loci per partial-panel key. Records sharing a fully typed band of loci become candidate pairs,
+# so near-duplicates and records typed on different panels are found without an all-pairs scan
+BAND_LOCI = 4
+
+# Keys shared by more records than this are too common to tell animals apart and are skipped
+MAX_BUCKET = 500
+
+# Candidate pairs verified in one batched comparison (bounds temporary memory)
+PAIR_BLOCK = 1 << 20
+
+# IDs that mean "unknown" and never identify an animal
+PLACEHOLDER_IDS = {"", "НЕ НАЙДЕНО", "НЕТ ДАННЫХ", "NAN"}
+
+
+def canonical_id(raw: str) -> str:
+    """'US003213323985' -> 'US3213323985': upper case, no separators, no zero padding of the number."""
+    s = str(raw).strip().upper()
+    if s in PLACEHOLDER_IDS:
+        return ""
+    s = re.sub(r"[\s\-_./]", "", s)
+    m = re.fullmatch(r"([A-ZА-ЯЁ]*)0*(\d+)", s)
+    return m.group(1) + m.group(2) if m else s
+
+
+def canonical_genotypes(genotypes: np.ndarray) -> np.ndarray:
+    """(animals, loci, 2) with each allele pair sorted, so 266/270 and 270/266 are the same genotype."""
+    return np.sort(genotypes, axis=2)
+
+
+def locus_codes(genotypes: np.ndarray) -> np.ndarray:
+    """(animals, loci) int32: a canonical allele pair packed as a1 << 16 | a2; 0 = untyped, < 1 << 16 = one allele."""
+    return genotypes[..., 0].astype(np.int32) << 16 | genotypes[..., 1].astype(np.int32)
+
+
+def row_hashes(codes: np.ndarray, seed: int) -> np.ndarray:
+    """uint64 hash of every row of an integer array."""
+    h = np.full(codes.shape[0], seed, dtype=np.uint64)
+    for j in range(codes.shape[1]):
+        h = mix64(h ^ (codes[:, j].astype(np.uint64) + np.uint64(j + 1)))
+    return h
+
+
+def fingerprint_keys(genotypes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(keys, rows): the full-genotype fingerprint of every typed record, then one partial-panel key
+    per fully typed band of BAND_LOCI loci. Equal keys mark candidate duplicates."""
+    n, n_loci, _ = genotypes.shape
+    typed = (genotypes != MISSING).any(axis=(1, 2))
+    keys = [row_hashes(genotypes.reshape(n, -1)[typed], seed=0)]
+    rows = [np.flatnonzero(typed)]
+    # bands follow the loci from the most to the least often typed, so the panel most records
+    # share is covered by whole bands
+    complete = (genotypes != MISSING).all(axis=2)
+    by_typing = np.argsort(-complete.sum(axis=0), kind="stable")
+    complete = complete[:, by_typing]
+    flat = genotypes[:, by_typing].reshape(n, -1)
+    # a short last band joins the one before it (alone, a rarely typed locus gives few keys)
+    edges = list(range(0, n_loci, BAND_LOCI))
+    if len(edges) > 1 and n_loci - edges[-1] < BAND_LOCI:
+        edges.pop()
+    for band, (start, stop) in enumerate(zip(edges, edges[1:] + [n_loci])):
+        full = complete[:, start:stop].all(axis=1)
+        keys.append(row_hashes(flat[full, 2 * start:2 * stop], seed=band + 1))
+        rows.append(np.flatnonzero(full))
+    return np.concatenate(keys), np.concatenate(rows)
+
+
+def candidate_pairs(keys: np.ndarray, rows: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Distinct (i, j), i < j, of rows sharing a key; also the number of keys skipped as too common."""
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    rows = rows[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    sizes = np.diff(np.r_[starts, len(keys)])
+    skipped = int((sizes > MAX_BUCKET).sum())
+    pairs = []
+    # all buckets of one size at once: (buckets, size) rows, then every i < j column pair
+    for size in np.unique(sizes[(sizes > 1) & (sizes <= MAX_BUCKET)]).tolist():
+        bucket = rows[starts[sizes == size][:, None] + np.arange(size)]
+        a, b = np.triu_indices(size, k=1)
+        pairs.append((np.minimum(bucket[:, a], bucket[:, b]) * (n + 1) + np.maximum(bucket[:, a], bucket[:, b])).ravel())
+    if not pairs:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), skipped
+    # a pair sharing several keys is listed once
+    codes = np.concatenate(pairs)
+    codes.sort()
+    i, j = np.divmod(codes[np.r_[True, codes[1:] != codes[:-1]]], n + 1)
+    return i, j, skipped
+
+
+def compare_pairs(codes: np.ndarray, i: np.ndarray, j: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(compared, different) loci for aligned record pairs of locus_codes, PAIR_BLOCK pairs at a time.
+
+    A locus typed in both differs when the allele pairs differ; where one record has a single
+    allele (the other lost) it differs only if that allele is not in the other pair.
+    """
+    compared = np.zeros(len(i), dtype=np.int16)
+    different = np.zeros(len(i), dtype=np.int16)
+    for start in range(0, len(i), PAIR_BLOCK):
+        block = slice(start, start + PAIR_BLOCK)
+        compared[block], different[block] = _compare_block(codes[i[block]], codes[j[block]])
+    return compared, different
+
+
+def _compare_block(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """compare_pairs for one block of aligned locus codes."""
+    both = (a != MISSING) & (b != MISSING)
+    a_high, a_low = a >> 16, a & 0xFFFF
+    b_high, b_low = b >> 16, b & 0xFFFF
+    # a single allele (in the low half) is matched against both alleles of the other record
+    a_single = a_high == MISSING
+    single_shared = np.where(a_single, (a_low == b_low) | (a_low == b_high), (b_low == a_low) | (b_low == a_high))
+    different = both & np.where(a_single | (b_high == MISSING), ~single_shared, a != b)
+    return both.sum(axis=1), different.sum(axis=1)
+
+
+def connected_groups(n: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Group label per record (union-find over the pairs); records without pairs get -1."""
+    parent = list(range(n))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in zip(i.tolist(), j.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    paired = np.union1d(i, j)
+    roots = np.array([find(x) for x in paired.tolist()], dtype=np.int64)
+    labels = np.full(n, -1)
+    _, labels[paired] = np.unique(roots, return_inverse=True)
+    return labels
+
+
+class Records:
+    """All checked records of all sources: source, row within the source, ID and genotype in one coder."""
+
+    def __init__(self):
+        self.sources: List[str] = []
+        self.rows: List[int] = []
+        self.ids: List[str] = []
+        self.loci: List[str] = []
+        self.tables: List[Tuple[str, GenotypeTable]] = []
+
+    def add(self, source: str, table: GenotypeTable) -> None:
+        id_col = get_father_id_column(table.column_names)
+        self.sources.extend([source] * len(table))
+        self.rows.extend(range(1, len(table) + 1))
+        self.ids.extend(str(v).strip() for v in table.column(id_col).tolist())
+        self.loci.extend(locus for locus in table.loci if locus not in self.loci)
+        self.tables.append((source, table))
+
+    def genotypes(self) -> np.ndarray:
+        coder = AlleleCoder()
+        return np.concatenate([table.genotypes(self.loci, coder) for _, table in self.tables])
+
+
+def find_duplicates(records: Records) -> pd.DataFrame:
+    """Report rows: genotype duplicates (one group per animal) and IDs that carry different genotypes."""
+    genotypes = canonical_genotypes(records.genotypes())
+    codes = locus_codes(genotypes)
+    id_codes, id_values = pd.factorize(pd.Series(records.ids, dtype=object))
+    canonical = [canonical_id(v) for v in id_values]
+    ids = [canonical[c] for c in id_codes.tolist()]
+
+    keys, key_rows = fingerprint_keys(genotypes)
+    i, j, skipped = candidate_pairs(keys, key_rows, len(ids))
+    compared, different = compare_pairs(codes, i, j)
+    same = (compared >= MIN_COMPARED_LOCI) & (different <= MAX_DIFFERENT_LOCI)
+    print(f"Записей: {len(ids)}, пар-кандидатов: {len(i)}, совпадающих генотипов: {int(same.sum())}")
+    if skipped:
+        print(f"Пропущено слишком частых ключей: {skipped} (MAX_BUCKET = {MAX_BUCKET})")
+
+    report: List[Dict] = []
+    labels = connected_groups(len(ids), i[same], j[same])
+    members: Dict[int, List[int]] = {}
+    for r in np.flatnonzero(labels >= 0).tolist():
+        members.setdefault(int(labels[r]), []).append(r)
+    group_no = 0
+    for rows in members.values():
+        group_no += 1
+        known = {ids[r] for r in rows if ids[r]}
+        spellings = {records.ids[r].upper() for r in rows if ids[r]}
+        if len(known) > 1:
+            kind = "same_genotype_other_id"
+        elif len(spellings) > 1:
+            kind = "id_format"  # one animal, its ID written differently (zero padding, separators)
+        else:
+            kind = "duplicate"
+        c, d = compare_pairs(codes, np.full(len(rows), rows[0]), np.array(rows))
+        for r, rc, rd in zip(rows, c.tolist(), d.tolist()):
+            report.append({"group": group_no, "kind": kind, "source": records.sources[r], "row": records.rows[r],
+                           "id": records.ids[r], "canonical_id": ids[r], "compared": rc, "different": rd})
+
+    # One ID, genotypes that are not the same animal: a mislabeled record or a wrong profile.
+    # Every record of an ID is compared with the first record of that ID
+    id_groups, _ = pd.factorize(pd.Series([v or None for v in ids], dtype=object))
+    order = np.argsort(id_groups, kind="stable")
+    order = order[id_groups[order] >= 0]
+    if len(order):
+        grouped = id_groups[order]
+        starts = np.flatnonzero(np.r_[True, grouped[1:] != grouped[:-1]])
+        first = order[np.repeat(starts, np.diff(np.r_[starts, len(order)]))]
+        c, d = compare_pairs(codes, first, order)
+        for group in np.unique(grouped[(c > 0) & (d > MAX_DIFFERENT_LOCI)]).tolist():
+            group_no += 1
+            for k in np.flatnonzero(grouped == group).tolist():
+                r = int(order[k])
+                report.append({"group": group_no, "kind": "id_conflict", "source": records.sources[r], "row": records.rows[r],
+                               "id": records.ids[r], "canonical_id": ids[r], "compared": int(c[k]), "different": int(d[k])})
+
+    columns = ["group", "kind", "source", "row", "id", "canonical_id", "compared", "different"]
+    return pd.DataFrame(report, columns=columns)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Поиск дублей и перепутанных номеров по генотипам")
+    parser.add_argument("--source", nargs=2, action="append", metavar=("NAME", "CSV"),
+                        help="таблица генотипов для проверки (можно несколько), вместо SOURCES")
+    parser.add_argument("--db", help="брать реестр, быков лаборатории и стадо из базы генотипов (genotype_db)")
+    parser.add_argument("--report", default=REPORT_PATH, help="куда записать отчет (CSV)")
+    args = parser.parse_args(argv)
+
+    records = Records()
+    if args.db:
+        conn = genotype_db.connect(args.db)
+        try:
+            for source in (genotype_db.SOURCE_REGISTRY, genotype_db.SOURCE_LAB):
+                records.add(source, GenotypeTable.from_frame(genotype_db.bulls_frame(conn, [source])))
+            records.add("herd", GenotypeTable.from_frame(genotype_db.herd_frame(conn)))
+        finally:
+            conn.close()
+    else:
+        for name, path in args.source or SOURCES:
+            if not os.path.exists(path):
+                print(f"Нет файла {path}, источник {name} пропущен")
+                continue
+            records.add(name, read_table(path))
+    if not records.ids:
+        raise RuntimeError("Нет ни одной таблицы с генотипами для проверки")
+
+    report = find_duplicates(records)
+    os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+    report.to_csv(args.report, sep=CSV_SEP, index=False, encoding=CSV_ENCODING)
+
+    groups = report.drop_duplicates("group")["kind"].value_counts()
+    print(f"Один генотип в нескольких записях: {int(groups.get('duplicate', 0))}")
+    print(f"Один генотип, номер записан по-разному: {int(groups.get('id_format', 0))}")
+    print(f"Один генотип под разными номерами: {int(groups.get('same_genotype_other_id', 0))}")
+    print(f"Разные генотипы под одним номером: {int(groups.get('id_conflict', 0))}")
+    print(f"Отчет: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
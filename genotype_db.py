@@ -0,0 +1,337 @@
+import argparse
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from genotype_store import split_allele_column
+from parentage_engine import normalize_allele
+
+
+# Default database file (next to the processed CSVs)
+DB_NAME = "genotypes.sqlite"
+DB_FILE = os.path.join(r"C:\Users\user\Desktop\genetic\zrya_processed", DB_NAME)
+
+# Bull sources: the быки.рф registry (parser_batch) and fathers collected from lab workbooks (excel_to_csv)
+SOURCE_REGISTRY = "registry"
+SOURCE_LAB = "lab"
+
+# Herd meta columns in genotypes_unified.csv order; registry meta columns as in bulls_data.csv
+HERD_COLUMNS = ["nomanimal", "reganimal", "nomhoz", "regotca", "regmateri", "status"]
+BULL_ID, BULL_BIRTH, BULL_URL = "Идентификационный номер", "Дата рождения", "Ссылка"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS farms (nomhoz INTEGER PRIMARY KEY, name_hoz TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS animals (
+    nomanimal INTEGER PRIMARY KEY,
+    reganimal TEXT NOT NULL,
+    nomhoz INTEGER,
+    regotca TEXT NOT NULL DEFAULT '',
+    regmateri TEXT NOT NULL DEFAULT '',
+    status INTEGER
+);
+-- role: '' the animal itself, '_otca' / '_materi' the parents as typed by the lab
+CREATE TABLE IF NOT EXISTS animal_alleles (
+    nomanimal INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    locus TEXT NOT NULL,
+    a1 TEXT NOT NULL,
+    a2 TEXT NOT NULL,
+    PRIMARY KEY (nomanimal, role, locus)
+) WITHOUT ROWID;
+-- bulls are keyed by their row in the source file, like the CSV readers do: IDs repeat
+-- (a bull listed twice, "Не найдено" for several bulls) and may occur in both sources;
+-- each source is replaced as a whole
+CREATE TABLE IF NOT EXISTS bulls (
+    source TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    bull_id TEXT NOT NULL,
+    birth_date TEXT NOT NULL DEFAULT '',
+    url TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (source, row)
+);
+CREATE TABLE IF NOT EXISTS bull_alleles (
+    source TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    locus TEXT NOT NULL,
+    a1 TEXT NOT NULL,
+    a2 TEXT NOT NULL,
+    PRIMARY KEY (source, row, locus)
+) WITHOUT ROWID;
+"""
+
+# Secondary indexes, dropped during bulk loads and rebuilt afterwards
+INDEXES = {
+    "animals_reganimal": "animals (reganimal)",
+    "animals_regotca": "animals (regotca)",
+    "animals_regmateri": "animals (regmateri)",
+    "animals_nomhoz": "animals (nomhoz)",
+    "bulls_bull_id": "bulls (bull_id)",
+    "animal_alleles_a1": "animal_alleles (locus, a1)",
+    "animal_alleles_a2": "animal_alleles (locus, a2)",
+    "bull_alleles_a1": "bull_alleles (locus, a1)",
+    "bull_alleles_a2": "bull_alleles (locus, a2)",
+}
+
+
+def connect(path: str = DB_FILE) -> sqlite3.Connection:
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    create_indexes(conn)
+    return conn
+
+
+def create_indexes(conn: sqlite3.Connection, tables: Optional[Sequence[str]] = None) -> None:
+    for name, target in INDEXES.items():
+        if tables is None or target.split()[0] in tables:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def drop_indexes(conn: sqlite3.Connection, tables: Sequence[str]) -> None:
+    for name, target in INDEXES.items():
+        if target.split()[0] in tables:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    """Explicit BEGIN ... COMMIT: sqlite3 only opens a transaction implicitly before DML,
+    so DDL such as DROP INDEX would otherwise be committed on its own."""
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def set_meta(conn: sqlite3.Connection, key: str, value) -> None:
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value, ensure_ascii=False)))
+
+
+def get_meta(conn: sqlite3.Connection, key: str, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else default
+
+
+def text(value) -> str:
+    if value is None or pd.isna(value):
+        return ""
+    return str(value).strip()
+
+
+def allele_columns(columns: Iterable[str]) -> List[Tuple[str, str, str, str]]:
+    """(role, locus, col1, col2) for every 1_/2_ column pair, in column order."""
+    columns = list(columns)
+    present = set(columns)
+    pairs = []
+    for col in columns:
+        parsed = split_allele_column(col)
+        if parsed is None or parsed[0] != 0:
+            continue
+        _k, locus, role = parsed
+        col2 = f"2_{locus}{role}"
+        if col2 in present:
+            pairs.append((role, locus, col, col2))
+    return pairs
+
+
+def allele_rows(keys: List, df: pd.DataFrame, pairs: List[Tuple[str, str, str, str]], prefix: Tuple = ()):
+    """Rows for *_alleles: prefix + (key, role, locus, a1, a2) with normalized alleles;
+    loci with no allele at all are not stored."""
+    for role, locus, col1, col2 in pairs:
+        for key, v1, v2 in zip(keys, df[col1].tolist(), df[col2].tolist()):
+            a1, a2 = normalize_allele(v1), normalize_allele(v2)
+            if a1 or a2:
+                yield prefix + (key, role, locus, a1, a2)
+
+
+def load_herd(conn: sqlite3.Connection, df: pd.DataFrame, farms: Optional[Dict[int, str]] = None) -> None:
+    """Replace all animals with df (genotypes_unified.csv layout) in one transaction."""
+    pairs = allele_columns(df.columns)
+    columns = [df[c].tolist() if c in df.columns else [None] * len(df) for c in HERD_COLUMNS]
+    animals = [
+        (int(nomanimal), text(reganimal), int(nomhoz) if text(nomhoz) else None, text(regotca), text(regmateri),
+         int(status) if text(status) else None)
+        for nomanimal, reganimal, nomhoz, regotca, regmateri, status in zip(*columns)
+    ]
+    with transaction(conn):
+        drop_indexes(conn, ["animals", "animal_alleles"])
+        conn.execute("DELETE FROM animal_alleles")
+        conn.execute("DELETE FROM animals")
+        conn.executemany("INSERT INTO animals VALUES (?, ?, ?, ?, ?, ?)", animals)
+        conn.executemany("INSERT INTO animal_alleles VALUES (?, ?, ?, ?, ?)",
+                         allele_rows([a[0] for a in animals], df, pairs))
+        if farms is not None:
+            conn.execute("DELETE FROM farms")
+            conn.executemany("INSERT INTO farms VALUES (?, ?)", sorted(farms.items()))
+        set_meta(conn, "herd_loci", list(dict.fromkeys(locus for _role, locus, _c1, _c2 in pairs)))
+        set_meta(conn, "herd_roles", list(dict.fromkeys(role for role, _locus, _c1, _c2 in pairs)))
+        create_indexes(conn, ["animals", "animal_alleles"])
+
+
+def load_bulls(conn: sqlite3.Connection, df: pd.DataFrame, source: str) -> None:
+    """Replace the bulls of one source with df (bulls_data.csv / fathers_registry.csv layout) in one transaction."""
+    pairs = [p for p in allele_columns(df.columns) if p[0] == ""]
+    n = len(df)
+    ids = [text(v) for v in df[BULL_ID].tolist()]
+    births = [text(v) for v in df[BULL_BIRTH].tolist()] if BULL_BIRTH in df.columns else [""] * n
+    urls = [text(v) for v in df[BULL_URL].tolist()] if BULL_URL in df.columns else [""] * n
+    with transaction(conn):
+        drop_indexes(conn, ["bulls", "bull_alleles"])
+        conn.execute("DELETE FROM bull_alleles WHERE source = ?", (source,))
+        conn.execute("DELETE FROM bulls WHERE source = ?", (source,))
+        conn.executemany("INSERT INTO bulls VALUES (?, ?, ?, ?, ?)", zip([source] * n, range(n), ids, births, urls))
+        conn.executemany("INSERT INTO bull_alleles VALUES (?, ?, ?, ?, ?)",
+                         ((src, row, locus, a1, a2) for src, row, _role, locus, a1, a2
+                          in allele_rows(list(range(n)), df, pairs, (source,))))
+        set_meta(conn, f"bull_loci_{source}", [locus for _role, locus, _c1, _c2 in pairs])
+        create_indexes(conn, ["bulls", "bull_alleles"])
+
+
+# -------------------------
+# Queries
+# -------------------------
+def calves_of(conn: sqlite3.Connection, bull_id: str) -> List[Tuple]:
+    return conn.execute("SELECT * FROM animals WHERE regotca = ? ORDER BY nomanimal", (bull_id,)).fetchall()
+
+
+def offspring_of_dam(conn: sqlite3.Connection, cow_id: str) -> List[Tuple]:
+    return conn.execute("SELECT * FROM animals WHERE regmateri = ? ORDER BY nomanimal", (cow_id,)).fetchall()
+
+
+def animals_of_farm(conn: sqlite3.Connection, nomhoz: int) -> List[Tuple]:
+    return conn.execute("SELECT * FROM animals WHERE nomhoz = ? ORDER BY nomanimal", (nomhoz,)).fetchall()
+
+
+def find_animal(conn: sqlite3.Connection, reganimal: str) -> List[Tuple]:
+    return conn.execute("SELECT * FROM animals WHERE reganimal = ?", (reganimal,)).fetchall()
+
+
+def bulls_with_allele(conn: sqlite3.Connection, locus: str, allele: str) -> List[str]:
+    """IDs of bulls carrying allele at locus (either copy); answered from the (locus, allele) indexes."""
+    allele = normalize_allele(allele)
+    rows = conn.execute(
+        "SELECT b.bull_id FROM bulls b JOIN ("
+        "SELECT source, row FROM bull_alleles WHERE locus = ? AND a1 = ? "
+        "UNION SELECT source, row FROM bull_alleles WHERE locus = ? AND a2 = ?"
+        ") a ON a.source = b.source AND a.row = b.row GROUP BY b.bull_id ORDER BY b.bull_id",
+        (locus, allele, locus, allele)).fetchall()
+    return [r[0] for r in rows]
+
+
+def animals_with_allele(conn: sqlite3.Connection, locus: str, allele: str, role: str = "") -> List[int]:
+    allele = normalize_allele(allele)
+    rows = conn.execute(
+        "SELECT nomanimal FROM animal_alleles WHERE locus = ? AND a1 = ? AND role = ? "
+        "UNION SELECT nomanimal FROM animal_alleles WHERE locus = ? AND a2 = ? AND role = ? ORDER BY nomanimal",
+        (locus, allele, role, locus, allele, role)).fetchall()
+    return [r[0] for r in rows]
+
+
+# -------------------------
+# Frames for the matching code (same layouts as the CSVs)
+# -------------------------
+def wide_alleles(rows: List[Tuple], keys: List, columns: List[Tuple[str, str]]) -> Dict[str, List[str]]:
+    """(key, role, locus, a1, a2) rows -> {"1_<locus><role>": [...], "2_...": [...]} aligned with keys."""
+    position = {key: i for i, key in enumerate(keys)}
+    out: Dict[str, List[str]] = {}
+    for role, locus in columns:
+        out[f"1_{locus}{role}"] = [""] * len(keys)
+        out[f"2_{locus}{role}"] = [""] * len(keys)
+    for key, role, locus, a1, a2 in rows:
+        i = position.get(key)
+        if i is not None and f"1_{locus}{role}" in out:
+            out[f"1_{locus}{role}"][i] = a1
+            out[f"2_{locus}{role}"][i] = a2
+    return out
+
+
+def herd_frame(conn: sqlite3.Connection, where: str = "", params: Sequence = ()) -> pd.DataFrame:
+    """Animals (optionally filtered, e.g. "nomhoz = ?") as a genotypes_unified.csv-like string frame."""
+    animals = conn.execute(f"SELECT * FROM animals {'WHERE ' + where if where else ''} ORDER BY nomanimal",
+                           params).fetchall()
+    keys = [a[0] for a in animals]
+    loci, roles = get_meta(conn, "herd_loci", []), get_meta(conn, "herd_roles", [""])
+    if where:
+        rows = conn.execute(f"SELECT * FROM animal_alleles WHERE nomanimal IN "
+                            f"(SELECT nomanimal FROM animals WHERE {where})", params).fetchall()
+    else:
+        rows = conn.execute("SELECT * FROM animal_alleles").fetchall()
+    data: Dict[str, List[str]] = {}
+    for i, col in enumerate(HERD_COLUMNS):
+        data[col] = ["" if a[i] is None else str(a[i]) for a in animals]
+    data.update(wide_alleles(rows, keys, [(role, locus) for role in roles for locus in loci]))
+    return pd.DataFrame(data)
+
+
+def bulls_frame(conn: sqlite3.Connection, sources: Sequence[str] = (SOURCE_REGISTRY, SOURCE_LAB)) -> pd.DataFrame:
+    """Bulls of the given sources as a bulls_data.csv-like string frame."""
+    bulls = []
+    rows = []
+    for source in sources:
+        # (source, row) keys, in the order of the sources and of the rows in their files
+        bulls += conn.execute("SELECT source, row, bull_id, birth_date, url FROM bulls WHERE source = ? ORDER BY row",
+                              (source,)).fetchall()
+        rows += conn.execute("SELECT source, row, locus, a1, a2 FROM bull_alleles WHERE source = ?", (source,)).fetchall()
+    loci: List[str] = []
+    for source in sources:
+        for locus in get_meta(conn, f"bull_loci_{source}", []):
+            if locus not in loci:
+                loci.append(locus)
+    keys = [(b[0], b[1]) for b in bulls]
+    data: Dict[str, List[str]] = {
+        BULL_ID: [b[2] for b in bulls],
+        BULL_BIRTH: [b[3] for b in bulls],
+        BULL_URL: [b[4] for b in bulls],
+    }
+    data.update(wide_alleles([((src, row), "", locus, a1, a2) for src, row, locus, a1, a2 in rows],
+                             keys, [("", locus) for locus in loci]))
+    return pd.DataFrame(data)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Запросы к базе генотипов")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--calves", metavar="BULL_ID", help="потомки быка")
+    parser.add_argument("--dam", metavar="COW_ID", help="потомки коровы")
+    parser.add_argument("--farm", type=int, metavar="NOMHOZ", help="животные хозяйства")
+    parser.add_argument("--animal", metavar="REGANIMAL", help="животное по номеру")
+    parser.add_argument("--allele", nargs=2, metavar=("LOCUS", "ALLELE"), help="быки с аллелью в локусе")
+    args = parser.parse_args(argv)
+
+    conn = connect(args.db)
+    try:
+        if args.calves:
+            rows = calves_of(conn, args.calves)
+        elif args.dam:
+            rows = offspring_of_dam(conn, args.dam)
+        elif args.farm is not None:
+            rows = animals_of_farm(conn, args.farm)
+        elif args.animal:
+            rows = find_animal(conn, args.animal)
+        elif args.allele:
+            rows = [(bull_id,) for bull_id in bulls_with_allele(conn, *args.allele)]
+        else:
+            for table in ("farms", "animals", "animal_alleles", "bulls", "bull_alleles"):
+                print(f"{table}: {conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]}")
+            return
+        for row in rows:
+            print(";".join("" if v is None else str(v) for v in row))
+        print(f"Найдено: {len(rows)}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
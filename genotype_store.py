@@ -0,0 +1,295 @@
+import json
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from parentage_engine import MISSING, VOCAB_BASE, AlleleCoder, normalize_allele
+
+
+# Columnar genotype file (.npz, uncompressed so it loads without decoding):
+#   meta                 - JSON header (uint8): column order and kinds, loci, allele groups, allele vocab
+#   alleles              - int16 (animals, groups, loci, 2), AlleleCoder codes, 0 = missing
+#   c<i>_codes           - int32 per-row codes of dictionary column i into its values
+#   c<i>_blob/c<i>_offsets - the column's distinct values as one UTF-8 string + character offsets
+#   c<i>_int             - int64 values of a column that holds plain integers only (nomanimal, status)
+# An allele column whose cells are not all written in normalized form ("266,4", "-", " 266") also keeps
+# its raw text as a dictionary column (c<i>_codes/blob/offsets, spec "raw": true)
+FORMAT_VERSION = 4
+STORE_EXT = ".npz"
+
+# Allele column groups: "1_<locus><suffix>" / "2_<locus><suffix>"; "" is the animal itself
+GROUP_SUFFIXES = ("_otca", "_materi")
+
+# Always dictionary-encoded, even when every value looks like a number: animal/bull IDs and farm numbers
+DICTIONARY_COLUMNS = {"reganimal", "regotca", "regmateri", "nomhoz", "Идентификационный номер"}
+
+# CSV dialect shared by all scripts
+CSV_SEP = ";"
+CSV_ENCODING = "utf-8-sig"
+
+
+def store_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + STORE_EXT
+
+
+def split_allele_column(col: str) -> Optional[Tuple[int, str, str]]:
+    """'2_TGLA227_otca' -> (1, 'TGLA227', '_otca'); None for non-allele columns."""
+    if len(col) < 3 or col[:2] not in ("1_", "2_"):
+        return None
+    rest = col[2:]
+    for suffix in GROUP_SUFFIXES:
+        if rest.endswith(suffix) and len(rest) > len(suffix):
+            return int(col[0]) - 1, rest[:-len(suffix)], suffix
+    return int(col[0]) - 1, rest, ""
+
+
+def is_int_column(values: np.ndarray) -> bool:
+    """True if every value is a canonical integer string, so int64 storage round-trips exactly."""
+    if len(values) == 0:
+        return False
+    for v in pd.unique(values):
+        if not (v.isascii() and v.isdigit()) or (len(v) > 1 and v[0] == "0") or len(v) > 18:
+            return False
+    return True
+
+
+def pack_strings(values: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    text = "".join(values)
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(v) for v in values])
+    return np.frombuffer(text.encode("utf-8"), dtype=np.uint8), offsets
+
+
+def unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    text = blob.tobytes().decode("utf-8")
+    bounds = offsets.tolist()
+    return [text[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def recode_table(src: AlleleCoder, dst: AlleleCoder) -> Optional[np.ndarray]:
+    """Lookup array src code -> dst code, or None when both coders agree on every src code."""
+    if not src.vocab:
+        return None
+    lut = np.arange(VOCAB_BASE + len(src.vocab), dtype=np.int16)
+    for i, allele in enumerate(src.vocab):
+        lut[VOCAB_BASE + i] = dst.encode(allele)
+    if np.array_equal(lut, np.arange(len(lut))):
+        return None
+    return lut
+
+
+class GenotypeTable:
+    """Animals with typed columns: int16 allele groups, dictionary-encoded text, integer columns.
+
+    Alleles are encoded normalized (parentage_engine.normalize_allele), so readers get
+    comparable codes without re-normalizing; column() / to_frame() / the CSV export give the
+    cells as they were written, so passed-through columns are not rewritten.
+    """
+
+    def __init__(self, columns: List[Dict], loci: List[str], groups: List[str], alleles: np.ndarray,
+                 coder: AlleleCoder, data: Dict[str, np.ndarray]):
+        self.columns = columns  # [{"name", "kind": "allele"|"dict"|"int", ...}] in CSV order
+        self.loci = loci
+        self.groups = groups
+        self.alleles = alleles
+        self.coder = coder
+        self.data = data  # npz arrays of the non-allele columns
+        self._decoded: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return self.alleles.shape[0]
+
+    @property
+    def column_names(self) -> List[str]:
+        return [c["name"] for c in self.columns]
+
+    def _spec(self, name: str) -> Tuple[int, Dict]:
+        for i, spec in enumerate(self.columns):
+            if spec["name"] == name:
+                return i, spec
+        raise KeyError(name)
+
+    def column(self, name: str) -> np.ndarray:
+        """One column as an object array of strings, the same values pd.read_csv(dtype=str) gives."""
+        i, spec = self._spec(name)
+        if spec["kind"] == "allele" and not spec.get("raw"):
+            codes = self.alleles[:, spec["group"], spec["locus"], spec["allele"]]
+            return self.decode_codes(codes)
+        if spec["kind"] == "int":
+            return self.data[f"c{i}_int"].astype(str).astype(object)
+        return self.dictionary(name)[1][self.data[f"c{i}_codes"]]
+
+    def dictionary(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(codes, values) of a dictionary column, e.g. nomhoz or regotca, without expanding it."""
+        i, spec = self._spec(name)
+        if spec["kind"] != "dict" and not spec.get("raw"):
+            raise ValueError(f"{name} is not a dictionary column")
+        values = np.array(unpack_strings(self.data[f"c{i}_blob"], self.data[f"c{i}_offsets"]), dtype=object)
+        return self.data[f"c{i}_codes"], values
+
+    def decode_codes(self, codes: np.ndarray) -> np.ndarray:
+        if self._decoded is None:
+            # every possible code -> its allele string, built once per table
+            self._decoded = np.array([""] + [str(c) for c in range(1, VOCAB_BASE)] + list(self.coder.vocab), dtype=object)
+        return self._decoded[codes]
+
+    def genotypes(self, loci: Optional[Sequence[str]] = None, coder: Optional[AlleleCoder] = None,
+                  suffix: str = "") -> np.ndarray:
+        """(animals, loci, 2) int16 codes of one allele group, in the given loci order and coder.
+
+        Loci the table does not have come back as missing; with another coder (e.g. the bull
+        registry's) vocabulary alleles are recoded so both arrays compare like strings.
+        """
+        n = len(self)
+        loci = list(self.loci) if loci is None else list(loci)
+        out = np.zeros((n, len(loci), 2), dtype=np.int16)
+        if suffix not in self.groups:
+            return out
+        g = self.groups.index(suffix)
+        pos = {locus: j for j, locus in enumerate(self.loci)}
+        for j, locus in enumerate(loci):
+            if locus in pos:
+                out[:, j] = self.alleles[:, g, pos[locus]]
+        if coder is not None and coder is not self.coder:
+            lut = recode_table(self.coder, coder)
+            if lut is not None:
+                out = lut[out]
+        return out
+
+    def map_alleles(self, fn: Callable[[str, str, str], str]) -> int:
+        """Rewrite alleles in place through fn(suffix, locus, allele), each distinct code once.
+
+        Returns the number of allele cells that changed (e.g. raw sizes moved into their bins).
+        """
+        changed = 0
+        for g, suffix in enumerate(self.groups):
+            for j, locus in enumerate(self.loci):
+                cells = self.alleles[:, g, j]
+                codes = np.unique(cells)
+                mapped = np.array([self.coder.encode(fn(suffix, locus, self.coder.decode(c))) if c != MISSING
+                                   else MISSING for c in codes.tolist()], dtype=np.int16)
+                moved = mapped != codes
+                if moved.any():
+                    new = mapped[np.searchsorted(codes, cells)]
+                    changed += int((new != cells).sum())
+                    self.alleles[:, g, j] = new
+        # new vocabulary alleles invalidate the decoding table
+        self._decoded = None
+        return changed
+
+    def to_frame(self) -> pd.DataFrame:
+        """All columns as strings in CSV order - a drop-in for pd.read_csv(..., dtype=str).fillna("")."""
+        return pd.DataFrame({name: self.column(name) for name in self.column_names}, columns=self.column_names)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "GenotypeTable":
+        """Build from a DataFrame in any of the scripts' CSV layouts (values may be str, int or NaN)."""
+        names = [str(c) for c in df.columns]
+        columns: List[Dict] = []
+        loci: List[str] = []
+        groups: List[str] = []
+        parsed = {name: split_allele_column(name) for name in names}
+        for name in names:
+            p = parsed[name]
+            # an allele column needs its pair, otherwise it is kept as plain text
+            if p is not None and f"{2 - p[0]}_{p[1]}{p[2]}" in parsed:
+                if p[1] not in loci:
+                    loci.append(p[1])
+                if p[2] not in groups:
+                    groups.append(p[2])
+            else:
+                parsed[name] = None
+
+        coder = AlleleCoder()
+        alleles = np.zeros((len(df), len(groups), len(loci), 2), dtype=np.int16)
+        data: Dict[str, np.ndarray] = {}
+        for i, name in enumerate(names):
+            series = df.iloc[:, i]
+            p = parsed[name]
+            if p is not None:
+                k, locus, suffix = p
+                g, j = groups.index(suffix), loci.index(locus)
+                codes, uniques = pd.factorize(series)
+                normalized = [normalize_allele(u) for u in uniques]
+                mapped = [coder.encode(a) for a in normalized]
+                mapped.append(MISSING)  # factorize marks NaN as -1
+                alleles[:, g, j, k] = np.asarray(mapped, dtype=np.int16)[codes]
+                spec = {"name": name, "kind": "allele", "group": g, "locus": j, "allele": k}
+                raw = [str(u) for u in uniques]
+                if raw != normalized:
+                    # keep the cells as written; -1 (NaN) becomes the extra "" value
+                    raw.append("")
+                    data[f"c{i}_codes"] = np.where(codes < 0, len(raw) - 1, codes).astype(np.int32)
+                    data[f"c{i}_blob"], data[f"c{i}_offsets"] = pack_strings(raw)
+                    spec["raw"] = True
+                columns.append(spec)
+                continue
+            values = series.fillna("").astype(str).to_numpy(dtype=object)
+            if name not in DICTIONARY_COLUMNS and is_int_column(values):
+                data[f"c{i}_int"] = values.astype(np.int64)
+                columns.append({"name": name, "kind": "int"})
+                continue
+            codes, uniques = pd.factorize(values)
+            data[f"c{i}_codes"] = codes.astype(np.int32)
+            data[f"c{i}_blob"], data[f"c{i}_offsets"] = pack_strings(list(uniques))
+            columns.append({"name": name, "kind": "dict"})
+        return cls(columns, loci, groups, alleles, coder, data)
+
+
+def write_store(path: str, table: GenotypeTable) -> None:
+    meta = json.dumps({
+        "version": FORMAT_VERSION,
+        "columns": table.columns,
+        "loci": table.loci,
+        "groups": table.groups,
+        "vocab": table.coder.vocab,
+    }, ensure_ascii=False).encode("utf-8")
+    arrays = dict(table.data)
+    arrays["meta"] = np.frombuffer(meta, dtype=np.uint8)
+    arrays["alleles"] = np.ascontiguousarray(table.alleles, dtype=np.int16)
+    # write next to the target and swap in, so readers never see a partial file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def read_store(path: str) -> GenotypeTable:
+    with np.load(path, allow_pickle=False) as npz:
+        arrays = {name: npz[name] for name in npz.files}
+    meta = json.loads(arrays.pop("meta").tobytes().decode("utf-8"))
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported genotype store version {meta.get('version')}")
+    alleles = arrays.pop("alleles")
+    return GenotypeTable(meta["columns"], meta["loci"], meta["groups"], alleles, AlleleCoder(meta["vocab"]), arrays)
+
+
+def read_csv_table(csv_path: str) -> GenotypeTable:
+    return GenotypeTable.from_frame(pd.read_csv(csv_path, sep=CSV_SEP, dtype=str, encoding=CSV_ENCODING))
+
+
+def read_table(path: str) -> GenotypeTable:
+    """Read a .npz store, or a CSV - through its store when that is at least as new as the CSV."""
+    if path.endswith(STORE_EXT):
+        return read_store(path)
+    npz_path = store_path(path)
+    if os.path.exists(npz_path) and os.path.getmtime(npz_path) >= os.path.getmtime(path):
+        try:
+            return read_store(npz_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Не удалось прочитать {npz_path} ({e}), читаем {path}")
+    return read_csv_table(path)
+
+
+def export_csv(table: GenotypeTable, csv_path: str) -> None:
+    table.to_frame().to_csv(csv_path, sep=CSV_SEP, index=False, encoding=CSV_ENCODING)
+
+
+def save_table(df: pd.DataFrame, csv_path: str) -> GenotypeTable:
+    """Write df as CSV plus its columnar store next to it; the store is written last so it stays newer."""
+    df.to_csv(csv_path, sep=CSV_SEP, index=False, encoding=CSV_ENCODING)
+    table = GenotypeTable.from_frame(df)
+    write_store(store_path(csv_path), table)
+    return table
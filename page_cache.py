@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальный кэш HTML страниц быков: повторный разбор профилей без обращения к сайту
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from bull_profiles import url_key
+
+
+class HtmlCache:
+    """
+    Кэш по содержимому: HTML хранится сжатым в objects/<sha256>.html.gz, а индекс
+    index.jsonl (только дозапись) связывает ключ ссылки (url_key, без token) с
+    последней загруженной версией страницы. Одинаковые страницы хранятся один раз.
+    """
+
+    def __init__(self, root, max_bytes=None, max_age_days=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.index_path = os.path.join(root, "index.jsonl")
+        self.entries = {}
+        self.written = 0  # страниц записано за этот запуск
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self.load()
+        self.index = open(self.index_path, 'a', encoding='utf-8')
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'rb') as f:
+            data = f.read()
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # недописанная строка после аварийного завершения
+            self.entries[entry['key']] = entry
+        if data and not data.endswith(b"\n"):
+            with open(self.index_path, 'ab') as f:
+                f.write(b"\n")
+
+    def object_path(self, sha):
+        return os.path.join(self.root, "objects", sha[:2], sha + ".html.gz")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, url):
+        return url_key(url) in self.entries
+
+    def keys(self):
+        """Ключи (url_key) всех сохраненных страниц"""
+        return list(self.entries)
+
+    def total_bytes(self):
+        """Размер сохраненных страниц на диске (одинаковые страницы считаются один раз)"""
+        return sum({e['sha']: e['size'] for e in self.entries.values()}.values())
+
+    def get(self, url):
+        """HTML последней сохраненной версии страницы или None"""
+        entry = self.entries.get(url_key(url))
+        if entry is None:
+            return None
+        try:
+            with gzip.open(self.object_path(entry['sha']), 'rb') as f:
+                return f.read().decode('utf-8')
+        except OSError:
+            return None
+
+    def put(self, url, html):
+        data = html.encode('utf-8')
+        sha = hashlib.sha256(data).hexdigest()
+        path = self.object_path(sha)
+        with self.lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with gzip.open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            entry = {'key': url_key(url), 'sha': sha, 'size': os.path.getsize(path), 'time': time.time()}
+            self.entries[entry['key']] = entry
+            self.written += 1
+            self.index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.index.flush()
+
+    def evict(self):
+        """
+        Удалить записи старше max_age и самые старые сверх max_bytes, сжать индекс
+        и удалить страницы, на которые больше нет ссылок. Возвращает число удаленных записей.
+        """
+        with self.lock:
+            now = time.time()
+            entries = sorted(self.entries.values(), key=lambda e: e['time'], reverse=True)
+            if self.max_age:
+                entries = [e for e in entries if now - e['time'] <= self.max_age]
+            if self.max_bytes:
+                kept, total, counted = [], 0, set()
+                for e in entries:
+                    size = 0 if e['sha'] in counted else e['size']
+                    if total + size > self.max_bytes:
+                        break
+                    kept.append(e)
+                    total += size
+                    counted.add(e['sha'])
+                entries = kept
+            removed = len(self.entries) - len(entries)
+            self.entries = {e['key']: e for e in entries}
+
+            # индекс переписывается целиком: в нем остаются только живые записи
+            self.index.close()
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for e in sorted(self.entries.values(), key=lambda e: e['time']):
+                    f.write(json.dumps(e, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.index_path)
+            self.index = open(self.index_path, 'a', encoding='utf-8')
+
+            alive = {e['sha'] for e in self.entries.values()}
+            objects_dir = os.path.join(self.root, "objects")
+            for sub in os.listdir(objects_dir):
+                for name in os.listdir(os.path.join(objects_dir, sub)):
+                    if name.split('.')[0] not in alive:
+                        os.remove(os.path.join(objects_dir, sub, name))
+            return removed
+
+    def close(self):
+        # запуск только на чтение (--reparse-from-cache) не переписывает индекс и не обходит objects/,
+        # пока кэш не вышел за max_bytes
+        if self.written or (self.max_bytes and self.total_bytes() > self.max_bytes):
+            self.evict()
+        self.index.close()
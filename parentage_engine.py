@@ -0,0 +1,479 @@
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Encoding: 0 is a missing allele, canonical fragment sizes ("266") are stored as
+# the integer itself, every other spelling ("266.4", "X", ...) gets a vocabulary code.
+MISSING = 0
+VOCAB_BASE = 10000
+
+# Child x bull x locus cells compared in one batched operation (bounds temporary memory)
+BLOCK_CELLS = 1 << 24
+
+# Allele index key = locus * KEY_STRIDE + allele code (codes are positive int16)
+KEY_STRIDE = 1 << 16
+
+# Loci that fit a mismatch bitmask (int64, bit j = locus j, sign bit unused)
+MAX_MASK_LOCI = 63
+
+# Chance that a typed allele is wrong (typing error or mutation) in the likelihood scores
+GENOTYPE_ERROR = 0.01
+
+# Placeholders the lab writes for an untyped parent ("─", "0"). Pairwise matching compares them as
+# text, exactly like evaluate_match; the trio check and allele statistics treat them as missing
+PLACEHOLDER_ALLELES = frozenset({"─", "0"})
+
+Score = Tuple[int, int, int]
+Candidate = Tuple[int, Score]
+
+
+def normalize_allele(value: Any) -> str:
+    if pd.isna(value):
+        return ""
+    s = str(value).strip()
+    if s == "-" or s == ".":
+        return ""
+    # unify comma/dot separators, spaces
+    s = s.replace(",", ".").replace(" ", "")
+    return s
+
+
+class AlleleCoder:
+    """Bijective mapping between normalized allele strings and int16 codes.
+
+    Two alleles get the same code only if their normalized strings are equal, so
+    integer comparisons give exactly the same answers as string comparisons.
+    """
+
+    def __init__(self, vocab: Optional[Sequence[str]] = None):
+        self.vocab: List[str] = list(vocab or [])
+        self._codes: Dict[str, int] = {s: VOCAB_BASE + i for i, s in enumerate(self.vocab)}
+
+    def encode(self, allele: str) -> int:
+        if not allele:
+            return MISSING
+        if allele.isascii() and allele.isdigit() and allele[0] != "0" and int(allele) < VOCAB_BASE:
+            return int(allele)
+        code = self._codes.get(allele)
+        if code is None:
+            code = VOCAB_BASE + len(self.vocab)
+            if code > np.iinfo(np.int16).max:
+                raise ValueError("Слишком много нестандартных аллелей для int16-кодирования")
+            self.vocab.append(allele)
+            self._codes[allele] = code
+        return code
+
+    def decode(self, code: int) -> str:
+        code = int(code)
+        if code == MISSING:
+            return ""
+        if code < VOCAB_BASE:
+            return str(code)
+        return self.vocab[code - VOCAB_BASE]
+
+
+def encode_genotypes(df: pd.DataFrame, loci_pairs: List[Tuple[str, str, str]], coder: AlleleCoder) -> np.ndarray:
+    """Encode (locus, col1, col2) allele columns of df into an (animals, loci, 2) int16 array."""
+    out = np.zeros((len(df), len(loci_pairs), 2), dtype=np.int16)
+    for j, (_locus, c1, c2) in enumerate(loci_pairs):
+        for k, col in enumerate((c1, c2)):
+            if col not in df.columns:
+                continue
+            # normalize each distinct cell value once
+            codes, uniques = pd.factorize(df[col])
+            mapped = [coder.encode(normalize_allele(u)) for u in uniques]
+            mapped.append(MISSING)  # factorize marks NaN as -1
+            out[:, j, k] = np.asarray(mapped, dtype=np.int16)[codes]
+    return out
+
+
+def decode_genotype(genotype: np.ndarray, loci: List[str], coder: AlleleCoder) -> Dict[str, Tuple[str, str]]:
+    """Inverse of encode_genotypes for one animal: locus -> (a1, a2) normalized strings."""
+    return {locus: (coder.decode(genotype[j, 0]), coder.decode(genotype[j, 1])) for j, locus in enumerate(loci)}
+
+
+def mask_placeholders(genotypes: np.ndarray, coder: AlleleCoder) -> np.ndarray:
+    """genotypes with the codes of PLACEHOLDER_ALLELES set to MISSING (a copy if anything changes)."""
+    codes = [VOCAB_BASE + i for i, allele in enumerate(coder.vocab) if allele in PLACEHOLDER_ALLELES]
+    placeholder = np.isin(genotypes, codes)
+    return np.where(placeholder, MISSING, genotypes).astype(np.int16) if placeholder.any() else genotypes
+
+
+def filled_loci(genotypes: np.ndarray) -> np.ndarray:
+    """Number of loci with at least one allele, per animal."""
+    return (genotypes != MISSING).any(axis=2).sum(axis=1)
+
+
+def compare_loci(children: np.ndarray, bulls: np.ndarray,
+                 steps: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-locus comparison: (shared, compared) boolean arrays of shape (children, bulls, loci).
+
+    A locus is compared when both animals have at least one allele there and shared
+    when they have a common non-missing allele. With steps (repeat length per locus, 0 = exact
+    only) a locus is also shared when a child and a bull allele are one repeat apart.
+    """
+    c1 = children[:, None, :, 0]
+    c2 = children[:, None, :, 1]
+    f1 = bulls[None, :, :, 0]
+    f2 = bulls[None, :, :, 1]
+
+    child_has = (children != MISSING).any(axis=2)
+    bull_has = (bulls != MISSING).any(axis=2)
+    compared = child_has[:, None, :] & bull_has[None, :, :]
+
+    # equality with a non-missing child allele implies the bull allele is present too
+    shared = ((c1 == f1) | (c1 == f2)) & (c1 != MISSING)
+    shared |= ((c2 == f1) | (c2 == f2)) & (c2 != MISSING)
+    if steps is not None:
+        add_step_matches(shared, compared, children, bulls, steps)
+    return shared, compared
+
+
+def add_step_matches(shared: np.ndarray, compared: np.ndarray, children: np.ndarray, bulls: np.ndarray,
+                     steps: np.ndarray) -> None:
+    """Mark compared, not shared loci where a child and a bull allele differ by exactly steps[locus].
+
+    Only those cells are gathered and checked, so the exact comparison costs the same as without
+    tolerance. Vocabulary alleles ("266.4", "X") have no size and never match by a step.
+    """
+    ci, bi, li = np.nonzero(compared & ~shared & (steps > 0))
+    if ci.size == 0:
+        return
+    c = children[ci, li].astype(np.int32)
+    f = bulls[bi, li].astype(np.int32)
+    c_sized = (c != MISSING) & (c < VOCAB_BASE)
+    f_sized = (f != MISSING) & (f < VOCAB_BASE)
+    one_step = np.abs(c[:, :, None] - f[:, None, :]) == steps[li][:, None, None]
+    near = (one_step & c_sized[:, :, None] & f_sized[:, None, :]).any(axis=(1, 2))
+    shared[ci[near], bi[near], li[near]] = True
+
+
+def repeat_steps(loci: Sequence[str], repeat_size: int, overrides: Optional[Dict[str, int]] = None) -> np.ndarray:
+    """Per-locus repeat lengths for the steps argument: overrides[locus], else repeat_size."""
+    overrides = overrides or {}
+    return np.array([overrides.get(locus, repeat_size) for locus in loci], dtype=np.int32)
+
+
+def match_counts(children: np.ndarray, bulls: np.ndarray,
+                 steps: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Batched evaluate_match: (matches, mismatches, compared), each of shape (children, bulls)."""
+    shared, compared_mask = compare_loci(children, bulls, steps)
+    matches = shared.sum(axis=2, dtype=np.int16)
+    compared = compared_mask.sum(axis=2, dtype=np.int16)
+    return matches, compared - matches, compared
+
+
+def paternal_alleles(children: np.ndarray, mothers: np.ndarray) -> np.ndarray:
+    """Trio reduction: the child alleles the father must supply, given the mother (same shape as children).
+
+    Per locus, if exactly one child allele can come from the mother, the father must carry the
+    other one (left in slot 0, slot 1 missing). If the mother could give either, the father needs
+    one of the two, which is the pairwise rule. Where the mother is untyped, shares no allele with
+    the child (wrong mother or a maternal mutation) or the child has a single allele, both child
+    alleles are kept, so that locus is checked pairwise and never blamed on the father.
+
+    Scoring the result with compare_loci / match_counts / AlleleIndex is the trio check: a locus
+    matches when one child allele is the mother's and the other is the father's.
+    """
+    c1 = children[..., 0]
+    c2 = children[..., 1]
+    m1 = mothers[..., 0]
+    m2 = mothers[..., 1]
+    both = (c1 != MISSING) & (c2 != MISSING)
+    from_mother1 = both & ((c1 == m1) | (c1 == m2))
+    from_mother2 = both & ((c2 == m1) | (c2 == m2))
+
+    out = children.copy()
+    only1 = from_mother1 & ~from_mother2  # c1 is maternal: father gives c2
+    only2 = from_mother2 & ~from_mother1  # c2 is maternal: father gives c1
+    out[..., 0] = np.where(only1, c2, c1)
+    out[..., 1] = np.where(only1 | only2, MISSING, c2)
+    return out
+
+
+def trio_counts(children: np.ndarray, mothers: np.ndarray, bulls: np.ndarray,
+                steps: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """match_counts for child-mother-father trios: (matches, mismatches, compared), each (children, bulls)."""
+    return match_counts(paternal_alleles(children, mothers), bulls, steps)
+
+
+def transmission(parents: np.ndarray, alleles: np.ndarray) -> np.ndarray:
+    """Chance that a parent (..., loci, 2) passes on the allele (..., loci): its share of the parent's typed alleles."""
+    typed = (parents != MISSING).sum(axis=-1)
+    same = ((parents == alleles[..., None]) & (alleles[..., None] != MISSING)).sum(axis=-1)
+    return same / np.maximum(typed, 1)
+
+
+def lod_scores(children: np.ndarray, mothers: Optional[np.ndarray], fathers: np.ndarray,
+               freqs: np.ndarray, error_rate: float = GENOTYPE_ERROR) -> np.ndarray:
+    """LOD per aligned (child, mother, father) row: natural log of P(child | father) / P(child | unrelated bull).
+
+    All arrays are (pairs, loci, 2); freqs is (loci, codes) from AlleleFrequencies.table. For a
+    child a/b a locus adds ln LR with LR = (Ma*Fb + Mb*Fa) / (Ma*pb + Mb*pa), where F and M
+    are the chances that the father and the mother transmit the allele and p its frequency.
+    Without a mother (or where she shares no allele with the child) M is the frequency, which
+    is the usual pairwise ratio. The error rate mixes in the unrelated case, (1 - e) * LR + e,
+    so a single mismatch costs ln(e) instead of excluding the bull. Loci where the child has
+    fewer than two alleles or the father is untyped add 0.
+    """
+    loci = np.arange(children.shape[1])
+    c1 = children[..., 0]
+    c2 = children[..., 1]
+    pa = freqs[loci, c1]
+    pb = freqs[loci, c2]
+    typed = (c1 != MISSING) & (c2 != MISSING)
+    ma, mb = pa, pb
+    if mothers is not None:
+        ma_mother = transmission(mothers, c1)
+        mb_mother = transmission(mothers, c2)
+        informative = typed & ((ma_mother > 0) | (mb_mother > 0))
+        ma = np.where(informative, ma_mother, pa)
+        mb = np.where(informative, mb_mother, pb)
+    ratio = (ma * transmission(fathers, c2) + mb * transmission(fathers, c1)) / (ma * pb + mb * pa)
+    compared = typed & (fathers != MISSING).any(axis=2)
+    return np.where(compared, np.log((1 - error_rate) * ratio + error_rate), 0.0).sum(axis=1)
+
+
+def exclusion_probabilities(paternal: np.ndarray, fathers: np.ndarray, freqs: np.ndarray) -> np.ndarray:
+    """Combined exclusion probability per aligned (child, father) row over the loci compared between them.
+
+    paternal is the child genotype, or paternal_alleles() of it in a trio. At a locus an unrelated
+    bull is excluded when it carries none of the alleles the father must have given:
+    PE = (1 - q)^2 with q their total frequency; combined over loci, 1 - prod(1 - PE).
+    """
+    loci = np.arange(paternal.shape[1])
+    p1 = paternal[..., 0]
+    p2 = paternal[..., 1]
+    q = np.where(p1 != MISSING, freqs[loci, p1], 0.0)
+    q = q + np.where((p2 != MISSING) & (p2 != p1), freqs[loci, p2], 0.0)
+    compared = (paternal != MISSING).any(axis=2) & (fathers != MISSING).any(axis=2)
+    pe = np.where(compared, np.square(1 - np.minimum(q, 1.0)), 0.0)
+    return 1 - np.exp(np.log1p(-pe).sum(axis=1))
+
+
+def mismatch_bits(child: np.ndarray, bulls: np.ndarray, steps: Optional[np.ndarray] = None) -> np.ndarray:
+    """For one child (loci x 2) and some bulls: bitmask per bull of compared loci without a shared allele."""
+    if bulls.shape[1] > MAX_MASK_LOCI:
+        raise ValueError(f"mismatch bitmasks hold at most {MAX_MASK_LOCI} loci, got {bulls.shape[1]}")
+    shared, compared = compare_loci(child[None], bulls, steps)
+    weights = np.left_shift(np.int64(1), np.arange(bulls.shape[1], dtype=np.int64))
+    return ((compared[0] & ~shared[0]) * weights).sum(axis=1)
+
+
+def rank_key(matches: np.ndarray, mismatches: np.ndarray, compared: np.ndarray, n_loci: int) -> np.ndarray:
+    """Single integer key ordering scores as matches desc, mismatches asc, compared desc."""
+    base = n_loci + 1
+    m = matches.astype(np.int32)
+    return (m * base + (n_loci - mismatches)) * base + compared
+
+
+def rank_candidates(matches: np.ndarray, mismatches: np.ndarray, compared: np.ndarray,
+                    min_matched: int, max_mutations: int, n_loci: int) -> List[Candidate]:
+    """Bulls passing the thresholds for one child, best first; ties keep registry order."""
+    idx = np.flatnonzero((matches >= min_matched) & (mismatches <= max_mutations))
+    if idx.size == 0:
+        return []
+    key = rank_key(matches[idx], mismatches[idx], compared[idx], n_loci)
+    idx = idx[np.argsort(-key, kind="stable")]
+    return [(int(bi), (int(matches[bi]), int(mismatches[bi]), int(compared[bi]))) for bi in idx]
+
+
+def best_overall(matches: np.ndarray, mismatches: np.ndarray, compared: np.ndarray, n_loci: int) -> Tuple[Optional[int], Score]:
+    """Best bull for one child ignoring thresholds (first in registry order among ties)."""
+    if matches.size == 0:
+        return None, (-1, 999, -1)
+    bi = int(np.argmax(rank_key(matches, mismatches, compared, n_loci)))
+    return bi, (int(matches[bi]), int(mismatches[bi]), int(compared[bi]))
+
+
+class AlleleIndex:
+    """Inverted index (locus, allele) -> sorted bull rows carrying that allele.
+
+    Stored CSR-style: sorted `keys`, `offsets` into `postings` (bull rows), so it
+    can be saved and memory-mapped as plain arrays.
+    """
+
+    def __init__(self, keys: np.ndarray, offsets: np.ndarray, postings: np.ndarray, n_bulls: int):
+        self.keys = keys
+        self.offsets = offsets
+        self.postings = postings
+        self.n_bulls = n_bulls
+
+    @classmethod
+    def build(cls, bulls: np.ndarray) -> "AlleleIndex":
+        n_bulls, n_loci, _ = bulls.shape
+        rows = np.broadcast_to(np.arange(n_bulls, dtype=np.int64)[:, None, None], bulls.shape)
+        loci = np.broadcast_to(np.arange(n_loci, dtype=np.int64)[None, :, None], bulls.shape)
+        present = bulls != MISSING
+        stride = max(1, n_bulls)
+        keys_all = loci[present] * KEY_STRIDE + bulls[present]
+        # one posting per (key, bull): homozygous bulls are listed once
+        pairs = np.unique(keys_all * stride + rows[present])
+        keys, starts = np.unique(pairs // stride, return_index=True)
+        offsets = np.append(starts, len(pairs)).astype(np.int64)
+        postings = (pairs % stride).astype(np.int32)
+        return cls(keys.astype(np.int32), offsets, postings, n_bulls)
+
+    def postings_for(self, locus: int, code: int) -> np.ndarray:
+        key = locus * KEY_STRIDE + int(code)
+        pos = int(np.searchsorted(self.keys, key))
+        if pos == len(self.keys) or self.keys[pos] != key:
+            return self.postings[:0]
+        return self.postings[self.offsets[pos]:self.offsets[pos + 1]]
+
+    def hit_counts(self, child: np.ndarray, steps: Optional[np.ndarray] = None) -> np.ndarray:
+        """For one child (loci x 2): number of loci at which each bull shares an allele.
+
+        The count is exactly the `matches` value match_counts would give for that bull (with
+        the same steps). Besides one zeroed counter per bull, work is proportional to the postings touched.
+        """
+        if steps is not None:
+            return self._step_hit_counts(child, steps)
+        counts = np.zeros(self.n_bulls, dtype=np.int16)
+        for locus, (a1, a2) in enumerate(child):
+            hit1 = self.postings_for(locus, a1) if a1 != MISSING else self.postings[:0]
+            counts[hit1] += 1
+            if a2 == MISSING or a2 == a1:
+                continue
+            hit2 = self.postings_for(locus, a2)
+            if hit1.size and hit2.size:
+                # a bull carrying both child alleles still matches this locus once
+                hit2 = hit2[~np.isin(hit2, hit1, assume_unique=True, kind="sort")]
+            counts[hit2] += 1
+        return counts
+
+    def _step_hit_counts(self, child: np.ndarray, steps: np.ndarray) -> np.ndarray:
+        """hit_counts with stepwise tolerance: the child's alleles and their +-1 repeat neighbours are looked up."""
+        counts = np.zeros(self.n_bulls, dtype=np.int16)
+        # a bull reached through several keys still matches the locus once
+        hit = np.zeros(self.n_bulls, dtype=bool)
+        for locus, alleles in enumerate(child.tolist()):
+            keys = {a for a in alleles if a != MISSING}
+            step = int(steps[locus])
+            if step:
+                keys |= {a + d for a in keys if a < VOCAB_BASE for d in (-step, step) if MISSING < a + d < VOCAB_BASE}
+            hits = [h for h in (self.postings_for(locus, a) for a in keys) if h.size]
+            if len(hits) == 1:
+                counts[hits[0]] += 1
+            elif hits:
+                hit[:] = False
+                for h in hits:
+                    hit[h] = True
+                counts += hit
+        return counts
+
+    def candidates(self, child: np.ndarray, min_matched: int, steps: Optional[np.ndarray] = None) -> np.ndarray:
+        """Sorted bull rows that share alleles with the child at >= min_matched loci."""
+        return np.flatnonzero(self.hit_counts(child, steps) >= min_matched)
+
+
+class TopCandidates:
+    """Best K candidates per child in fixed-size arrays (memory bounded by children x K).
+
+    bulls: children x K bull rows (-1 = empty slot), scores: children x K x 3
+    (matches, mismatches, compared), mismatches: children x K bitmask of mismatched
+    loci (bit j = locus j), total: number of candidates before truncation;
+    lod / exclusion: children x K likelihood scores, NaN until add_likelihood.
+    """
+
+    def __init__(self, n_children: int, k: int):
+        self.k = k
+        self.bulls = np.full((n_children, k), -1, dtype=np.int32)
+        self.scores = np.zeros((n_children, k, 3), dtype=np.int16)
+        self.mismatches = np.zeros((n_children, k), dtype=np.int64)
+        self.total = np.zeros(n_children, dtype=np.int32)
+        self.lod = np.full((n_children, k), np.nan, dtype=np.float32)
+        self.exclusion = np.full((n_children, k), np.nan, dtype=np.float32)
+
+    def store(self, ci: int, candidates: List[Candidate], children: np.ndarray, bulls: np.ndarray,
+              steps: Optional[np.ndarray] = None) -> None:
+        """Keep the first K of an already ranked candidate list, with their mismatched loci."""
+        self.total[ci] = len(candidates)
+        kept = candidates[:self.k]
+        if not kept:
+            return
+        rows = np.array([bi for bi, _ in kept], dtype=np.int32)
+        self.bulls[ci, :len(kept)] = rows
+        self.scores[ci, :len(kept)] = [score for _, score in kept]
+        self.mismatches[ci, :len(kept)] = mismatch_bits(children[ci], bulls[rows], steps)
+
+    def add_likelihood(self, children: np.ndarray, mothers: Optional[np.ndarray], paternal: np.ndarray,
+                       bulls: np.ndarray, freqs: np.ndarray, rank: bool = False) -> None:
+        """LOD and exclusion probability of every kept candidate, over all (child, candidate) pairs block by block.
+
+        paternal is what the candidates were scored against (children, or paternal_alleles in a trio).
+        With rank the kept candidates of each child are reordered by LOD, highest first; equal
+        LODs keep the count-based order.
+        """
+        kept = np.arange(self.k)[None, :] < np.minimum(self.total, self.k)[:, None]
+        rows, slots = np.nonzero(kept)
+        # a few float64 temporaries per (pair, locus) cell
+        step = max(1, BLOCK_CELLS // (16 * max(1, children.shape[1])))
+        for start in range(0, len(rows), step):
+            r = rows[start:start + step]
+            sl = slots[start:start + step]
+            fathers = bulls[self.bulls[r, sl]]
+            self.lod[r, sl] = lod_scores(children[r], None if mothers is None else mothers[r], fathers, freqs)
+            self.exclusion[r, sl] = exclusion_probabilities(paternal[r], fathers, freqs)
+        if rank:
+            order = np.argsort(-np.where(kept, self.lod, -np.inf), axis=1, kind="stable")
+            for name in ("bulls", "scores", "mismatches", "lod", "exclusion"):
+                arr = getattr(self, name)
+                idx = order if arr.ndim == 2 else order[:, :, None]
+                setattr(self, name, np.take_along_axis(arr, idx, axis=1))
+
+    def likelihood(self, ci: int, slot: int) -> Tuple[float, float]:
+        return float(self.lod[ci, slot]), float(self.exclusion[ci, slot])
+
+    def mismatch_loci(self, ci: int, slot: int) -> int:
+        return int(self.mismatches[ci, slot])
+
+    def get(self, ci: int) -> List[Candidate]:
+        n = min(int(self.total[ci]), self.k)
+        return [(int(self.bulls[ci, slot]), tuple(int(x) for x in self.scores[ci, slot])) for slot in range(n)]
+
+    def best(self, ci: int) -> Optional[int]:
+        return int(self.bulls[ci, 0]) if self.total[ci] else None
+
+
+def block_size(n_bulls: int, n_loci: int, block_cells: int = BLOCK_CELLS) -> int:
+    return max(1, block_cells // max(1, n_bulls * n_loci))
+
+
+def score_children(children: np.ndarray, bulls: np.ndarray, child_indices: Sequence[int],
+                   min_matched: int, max_mutations: int,
+                   index: Optional[AlleleIndex] = None,
+                   steps: Optional[np.ndarray] = None) -> Iterator[Tuple[int, List[Candidate]]]:
+    """Score children (rows of `children`) against the bulls.
+
+    Yields (child index, candidates passing thresholds) in input order. With an
+    AlleleIndex only bulls that can still reach min_matched are scored; without
+    it children are scored block by block against all bulls. steps enables the
+    one-repeat tolerance of compare_loci.
+    """
+    n_loci = bulls.shape[1]
+    child_indices = list(child_indices)
+    if index is not None and min_matched > 0:
+        for ci in child_indices:
+            rows = index.candidates(children[ci], min_matched, steps)
+            matches, mismatches, compared = match_counts(children[ci:ci + 1], bulls[rows], steps)
+            found = rank_candidates(matches[0], mismatches[0], compared[0], min_matched, max_mutations, n_loci)
+            yield ci, [(int(rows[bi]), score) for bi, score in found]
+        return
+
+    # the tolerance pass gathers ~40 bytes of indices and alleles per unmatched cell
+    step = block_size(bulls.shape[0], n_loci, BLOCK_CELLS if steps is None else BLOCK_CELLS // 16)
+    for start in range(0, len(child_indices), step):
+        block_idx = child_indices[start:start + step]
+        matches, mismatches, compared = match_counts(children[block_idx], bulls, steps)
+        for row, ci in enumerate(block_idx):
+            yield ci, rank_candidates(matches[row], mismatches[row], compared[row], min_matched, max_mutations, n_loci)
+
+
+def best_overall_for_child(child: np.ndarray, bulls: np.ndarray,
+                           steps: Optional[np.ndarray] = None) -> Tuple[Optional[int], Score]:
+    """Diagnostics: best bull for one child (loci x 2) regardless of thresholds."""
+    matches, mismatches, compared = match_counts(child[None], bulls, steps)
+    return best_overall(matches[0], mismatches[0], compared[0], bulls.shape[1])
@@ -4,12 +4,17 @@
 Пакетный парсер быков с обработкой в новых вкладках
 """
 
+import argparse
 import csv
 import time
 import random
+import queue
+import threading
 import os
 import json
-import re
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
@@ -17,84 +22,122 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import (NoSuchElementException, 
                                        TimeoutException, 
-                                       StaleElementReferenceException)
+                                       StaleElementReferenceException,
+                                       WebDriverException)
+
+from bull_profiles import (CSV_KEYS, LOCI_KEYS, build_record, extract_list_rows, extract_micro_profile,
+                           parse_profile_to_dict, pick_birth_date, pick_id_number, url_key)
+import genotype_db
+from genotype_store import read_csv_table, store_path, write_store
+from page_cache import HtmlCache
 
 # Настройки Chrome
-options = Options()
-options.headless = False  # Для отладки
-options.add_argument("--disable-blink-features=AutomationControlled")
-options.add_argument("--window-size=1920,1080")
-options.add_argument("--no-sandbox")
-options.add_argument("--disable-dev-shm-usage")
-options.add_argument("--disable-gpu")
-options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36")
+def make_options(headless=False):
+    """Опции Chrome; воркеры пула запускаются без окна"""
+    options = Options()
+    if headless:
+        options.add_argument("--headless=new")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36")
+    return options
+
+options = make_options(headless=False)  # Для отладки окно браузера видно
 
 # Конфигурационные параметры
 MAX_PAGES = 1000  # Максимальное количество страниц
 SAVE_INTERVAL = 10  # Сохранять прогресс каждые N страниц
 PROFILE_DELAY = 0.5  # Пауза между обработкой профилей (секунды)
+BROWSERS = 1  # Браузеров в пуле (больше 1 - параллельный режим, headless)
+DRIVER_RESTARTS = 3  # Сколько раз подряд воркер пула перезапускает упавший браузер
+TASK_RETRIES = 2  # Повторов задачи после перезапуска браузера
 
-# Маркеры и требуемый порядок колонок
-ORDERED_LOCI = [
-    "TGLA227", "BM2113", "TGLA53", "ETH10", "SPS115", "TGLA122", "INRA23",
-    "TGLA126", "BM1818", "ETH225", "BM1824", "CSRM60", "CSSM43", "ETH3",
-    "ILST006", "HAUT27", "AMEL",
-]
+ROWS_WAIT = 30  # Ожидание строк списка после перехода (секунды)
+PROFILE_WAIT = 10  # Ожидание ячейки микросателлитного профиля (секунды)
+PROFILE_EMPTY_WAIT = 1  # Ожидание текста в появившейся, но пустой ячейке профиля (секунды)
+WAIT_POLL = 0.1  # Как часто проверять условие ожидания (секунды)
 
-# Нормализация названий локусов
-LOCUS_NORMALIZATION = {
-    "INRA023": "INRA23",
-    "ILSTS006": "ILST006",
-    "SPS113": "SPS115",
-}
+BASE_URL = 'https://xn--90aof1e.xn--p1ai/bulls/list'
+ROWS_XPATH = '//div[@ng-repeat="animal in animals"]'
+PROFILE_CELL_XPATH = '//td[contains(text(), "Микросателлитный профиль")]/following-sibling::td'
 
-# Регулярка для пары locus_allele1/allele2
-PAIR_RE = re.compile(r"^([A-Za-z0-9]+)\s*[_\-]\s*([0-9]+)\s*/\s*([0-9]+)\s*$")
+# Данные всех строк списка за один вызов execute_script: ссылка, инв. номер,
+# тексты вложенных div (в них ищутся ID и дата рождения) и текст строки для диагностики
+ROWS_JS = """
+var rows = document.querySelectorAll('div[ng-repeat="animal in animals"]');
+return Array.prototype.map.call(rows, function (row) {
+    var link = row.querySelector('a[ng-href*="/bulls/bull/"]');
+    return {
+        url: link ? link.href : null,
+        inv: link ? link.innerText.trim() : '',
+        divs: Array.prototype.map.call(row.querySelectorAll('div'), function (div) {
+            return (div.innerText || '').trim();
+        }),
+        text: row.innerText || ''
+    };
+});
+"""
 
 # Файлы для сохранения
 csv_file = 'bulls_data.csv'
-progress_file = 'progress.json'
-links_file = 'bulls_links.json'  # Файл для сохранения всех ссылок
+progress_file = 'progress.json'  # Прогресс старых версий, переносится в журнал
+journal_file = 'parser_journal.jsonl'  # Журнал собранных страниц и обработанных профилей
+registry_file = 'bulls_data_converted.csv'  # Готовый реестр быков (для режима --sync)
+cache_dir = 'html_cache'  # Кэш HTML страниц быков (для --reparse-from-cache)
+db_file = genotype_db.DB_FILE  # База генотипов (genotype_db), None - не обновлять
+CACHE_MAX_MB = 2048  # Предельный размер кэша страниц
+CACHE_MAX_AGE_DAYS = None  # Удалять из кэша страницы старше N дней (None - не удалять)
 
-def normalize_locus(raw: str) -> str:
-    """Нормализация названия локуса"""
-    name = raw.strip().upper()
-    name = LOCUS_NORMALIZATION.get(name, name)
-    return name
-
-def parse_profile_to_dict(profile_text: str) -> dict:
-    """Разобрать строку профиля вида "BM1818_266/270, ..." -> {"BM1818": ("266","270"), ...}"""
-    result = {}
-    if not isinstance(profile_text, str) or not profile_text.strip():
-        return result
-
-    parts = [p.strip() for p in profile_text.split(",") if p.strip()]
-    for part in parts:
-        m = PAIR_RE.match(part)
-        if not m:
-            alt = re.sub(r"\s+", "_", part)
-            m = PAIR_RE.match(alt)
-        if not m:
-            continue
+html_cache = None  # HtmlCache текущего запуска, None - кэш выключен
+links_file = 'bulls_links.json'  # Файл для сохранения всех ссылок
 
-        locus_raw, a1, a2 = m.group(1), m.group(2), m.group(3)
-        locus = normalize_locus(locus_raw)
-        if locus not in ORDERED_LOCI:
-            continue
-        result[locus] = (a1, a2)
+class StepTimer:
+    """Сколько времени уходит на каждый шаг (переход, ожидание, разбор)"""
+    
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+    
+    def add(self, name, elapsed):
+        with self.lock:
+            self.totals[name] += elapsed
+            self.counts[name] += 1
+    
+    @contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+    
+    def report(self):
+        if not self.totals:
+            return
+        print("\n=== ВРЕМЯ ПО ШАГАМ ===")
+        print(f"  {'шаг':<18}{'раз':>8}{'всего, с':>12}{'среднее, с':>12}")
+        for name in sorted(self.totals, key=self.totals.get, reverse=True):
+            total, count = self.totals[name], self.counts[name]
+            print(f"  {name:<18}{count:>8}{total:>12.1f}{total / count:>12.2f}")
 
-    return result
+timer = StepTimer()
 
-def init_driver():
+def init_driver(headless=False):
     """Инициализация драйвера с обработкой ошибок"""
     try:
         print("  Создание Chrome WebDriver...")
-        driver = webdriver.Chrome(options=options)
+        driver = webdriver.Chrome(options=make_options(headless=True) if headless else options)
         print("  WebDriver создан успешно")
         
         print("  Настройка таймаутов...")
         driver.set_page_load_timeout(60)
-        driver.implicitly_wait(10)
+        # неявное ожидание выключено: каждый неудачный find_element стоил бы 10 секунд,
+        # готовность страниц проверяется явными условиями
+        driver.implicitly_wait(0)
         print("  Таймауты настроены")
         
         return driver
@@ -142,11 +185,6 @@ def load_progress():
             return json.load(f)
     return {'last_page': 0, 'processed_pages': [], 'collected_links': 0}
 
-def save_progress(progress):
-    """Сохранение прогресса"""
-    with open(progress_file, 'w', encoding='utf-8') as f:
-        json.dump(progress, f, ensure_ascii=False, indent=2)
-
 def load_links():
     """Загрузка собранных ссылок"""
     if os.path.exists(links_file):
@@ -159,24 +197,199 @@ def save_links(links):
     with open(links_file, 'w', encoding='utf-8') as f:
         json.dump(links, f, ensure_ascii=False, indent=2)
 
+def load_saved_urls():
+    """Ссылки профилей, уже записанных в CSV"""
+    if not os.path.isfile(csv_file):
+        return set()
+    with open(csv_file, 'r', newline='', encoding='utf-8-sig') as f:
+        return {row['Ссылка'] for row in csv.DictReader(f, delimiter=';') if row.get('Ссылка')}
+
+class Journal:
+    """
+    Журнал работы парсера (JSONL, только дозапись): одна строка на собранную
+    страницу списка ({"event": "page", "page": N, "links": [...]}) или на
+    обработанный профиль ({"event": "profile", "url": ..., "saved": true}).
+    После перезапуска уже собранные страницы и обработанные профили пропускаются.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.pages = {}
+        self.done_urls = set()
+        
+        if not os.path.exists(path):
+            self.migrate()
+        self.load()
+        # профиль мог попасть в CSV, а в журнал - нет, если парсер упал между записями
+        self.done_urls |= load_saved_urls()
+        self.file = open(path, 'a', encoding='utf-8')
+    
+    def load(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # недописанная строка после аварийного завершения
+            if entry.get('event') == 'page':
+                self.pages[entry['page']] = entry['links']
+            elif entry.get('event') == 'profile' and entry.get('saved'):
+                # неудачные попытки (таймаут, падение драйвера, нет таблицы) повторяются при следующем запуске
+                self.done_urls.add(entry['url'])
+        if data and not data.endswith(b"\n"):
+            with open(self.path, 'ab') as f:
+                f.write(b"\n")
+    
+    def migrate(self):
+        """Перенос прогресса из progress.json и bulls_links.json"""
+        progress = load_progress()
+        pages = {}
+        for link in load_links():
+            pages.setdefault(link['page'], []).append(link)
+        processed = set(progress.get('processed_pages', [])) or set(pages)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            for page in sorted(processed & set(pages)):
+                f.write(json.dumps({'event': 'page', 'page': page, 'links': pages[page]}, ensure_ascii=False) + "\n")
+        if pages:
+            print(f"  Прогресс прошлых сессий перенесен в {self.path}: {len(processed & set(pages))} страниц")
+    
+    def write(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.file.flush()
+    
+    def add_page(self, page, links):
+        self.write({'event': 'page', 'page': page, 'links': links})
+        self.pages[page] = links
+    
+    def add_profile(self, url, saved):
+        self.write({'event': 'profile', 'url': url, 'saved': saved})
+        if saved:
+            self.done_urls.add(url)
+    
+    @property
+    def last_page(self):
+        """Последняя страница, до которой все страницы собраны"""
+        page = 0
+        while page + 1 in self.pages:
+            page += 1
+        return page
+    
+    def links(self):
+        return [link for page in sorted(self.pages) for link in self.pages[page]]
+    
+    def close(self):
+        self.file.close()
+
+def write_csv(data_list):
+    """Перезаписать CSV целиком (через временный файл)"""
+    tmp_file = csv_file + '.tmp'
+    with open(tmp_file, 'w', newline='', encoding='utf-8-sig') as output_file:
+        writer = csv.DictWriter(output_file, CSV_KEYS, delimiter=';')
+        writer.writeheader()
+        writer.writerows(data_list)
+    os.replace(tmp_file, csv_file)
+
 def append_to_csv(data_list):
     """Запись данных в CSV"""
     file_exists = os.path.isfile(csv_file)
     
-    meta_keys = ['Идентификационный номер', 'Дата рождения', 'Ссылка']
-    loci_keys = []
-    for locus in ORDERED_LOCI:
-        loci_keys.append(f"1_{locus}")
-        loci_keys.append(f"2_{locus}")
-    
-    all_keys = meta_keys + loci_keys
-    
     with open(csv_file, 'a', newline='', encoding='utf-8-sig') as output_file:
-        writer = csv.DictWriter(output_file, all_keys, delimiter=';')
+        writer = csv.DictWriter(output_file, CSV_KEYS, delimiter=';')
         if not file_exists:
             writer.writeheader()
         writer.writerows(data_list)
 
+def save_store():
+    """
+    Колоночная копия bulls_data.csv (bulls_data.npz) для assing_fathers и registry_cache
+    и быки реестра в базе генотипов db_file (заменяются целиком одной транзакцией)
+    """
+    if not os.path.isfile(csv_file):
+        return
+    table = read_csv_table(csv_file)
+    write_store(store_path(csv_file), table)
+    if db_file:
+        conn = genotype_db.connect(db_file)
+        try:
+            genotype_db.load_bulls(conn, table.to_frame(), genotype_db.SOURCE_REGISTRY)
+        finally:
+            conn.close()
+
+def rows_signature(driver):
+    """Ссылка в первой строке списка; меняется, когда Angular перерисовал страницу"""
+    links = driver.find_elements(By.XPATH, ROWS_XPATH + '[1]//a[contains(@ng-href, "/bulls/bull/")]')
+    return links[0].get_attribute('href') if links else None
+
+def wait_rows_changed(driver, old_signature, timeout=ROWS_WAIT):
+    """Дождаться строк списка, отличных от old_signature"""
+    def rows_changed(d):
+        signature = rows_signature(d)
+        return signature is not None and signature != old_signature
+    try:
+        with timer.step("list.wait"):
+            WebDriverWait(driver, timeout, poll_frequency=WAIT_POLL,
+                          ignored_exceptions=(StaleElementReferenceException,)).until(rows_changed)
+        return True
+    except TimeoutException:
+        print(f"  ⚠️ Строки списка не обновились за {timeout} с")
+        return False
+
+def wait_profile_cell(driver, timeout=PROFILE_WAIT, empty_timeout=PROFILE_EMPTY_WAIT):
+    """
+    Текст ячейки микросателлитного профиля: None - ячейки нет, '' - ячейка пустая.
+    Полный timeout ждем только появления ячейки; текст пустой ячейки (Angular может
+    заполнить ее позже) ждем еще empty_timeout, а не весь timeout
+    """
+    def cell_state(d):
+        cells = d.find_elements(By.XPATH, PROFILE_CELL_XPATH)
+        # кортеж истинен и для пустой ячейки
+        return (cells[0].text.strip(),) if cells else False
+    
+    def cell_text(d):
+        state = cell_state(d)
+        return state[0] if state else False
+    
+    def wait(seconds):
+        return WebDriverWait(driver, seconds, poll_frequency=WAIT_POLL,
+                             ignored_exceptions=(StaleElementReferenceException,))
+    
+    with timer.step("profile.wait"):
+        try:
+            text, = wait(timeout).until(cell_state)
+        except TimeoutException:
+            return None
+        if text:
+            return text
+        try:
+            return wait(empty_timeout).until(cell_text)
+        except TimeoutException:
+            return ""
+
+def list_page_url(page_num):
+    return f"{BASE_URL}?page={page_num}"
+
+def list_page_number(key):
+    """Номер страницы списка по ключу кэша (url_key) или None, если это не страница списка"""
+    parts = urlsplit(key)
+    if urlunsplit((parts.scheme, parts.netloc, parts.path, '', '')) != BASE_URL:
+        return None
+    page = dict(parse_qsl(parts.query)).get('page', '')
+    return int(page) if page.isdigit() else None
+
+def row_link(row, page_num):
+    """Запись ссылки (bulls_links.json) из строки списка (ROWS_JS / extract_list_rows) или None"""
+    if not row.get('url'):
+        return None
+    # ID обычно в формате US0018553781, дата рождения - DD.MM.YYYY
+    return {
+        'url': row['url'],
+        'inv_number': row['inv'],
+        'id_number': pick_id_number(row['divs']),
+        'birth_date': pick_birth_date(row['divs']),
+        'page': page_num
+    }
+
 def collect_links_from_page(driver, page_num):
     """Сбор ссылок с одной страницы"""
     links = []
@@ -185,70 +398,34 @@ def collect_links_from_page(driver, page_num):
         
         # Ждем загрузки AngularJS данных
         print("  Ожидаем загрузки данных...")
-        WebDriverWait(driver, 30).until(
-            EC.presence_of_element_located((By.XPATH, '//div[@ng-repeat="animal in animals"]'))
-        )
+        with timer.step("list.wait"):
+            WebDriverWait(driver, ROWS_WAIT, poll_frequency=WAIT_POLL).until(
+                EC.presence_of_element_located((By.XPATH, ROWS_XPATH))
+            )
         
-        # Дополнительная проверка загрузки
-        time.sleep(3)
-        animal_rows = driver.find_elements(By.XPATH, '//div[@ng-repeat="animal in animals"]')
+        extract_start = time.perf_counter()
+        # Все строки одним вызовом: каждое обращение к элементу - отдельный запрос к браузеру
+        animal_rows = driver.execute_script(ROWS_JS) or []
         print(f"  Найдено {len(animal_rows)} строк с быками")
         
         for i, row in enumerate(animal_rows):
-            try:
-                # Ищем ссылку на профиль
-                inv_link = row.find_element(By.XPATH, './/a[contains(@ng-href, "/bulls/bull/")]')
-                profile_url = inv_link.get_attribute('href')
-                inv_number = inv_link.text.strip()
-                
-                # Ищем ID номер - упрощенный поиск
-                id_number = 'Не найдено'
-                try:
-                    # Ищем по тексту в div элементах - ID обычно в формате US0018553781
-                    all_divs = row.find_elements(By.XPATH, './/div')
-                    for div in all_divs:
-                        text = div.text.strip()
-                        # Ищем ID по паттерну: 2-3 буквы + много цифр
-                        if text and len(text) > 8 and any(c.isalpha() for c in text[:3]) and any(c.isdigit() for c in text[3:]):
-                            id_number = text
-                            break
-                except:
-                    pass
-                
-                # Ищем дату рождения - упрощенный поиск
-                birth_date = 'Не найдено'
-                try:
-                    # Ищем дату в формате DD.MM.YYYY
-                    all_divs = row.find_elements(By.XPATH, './/div')
-                    for div in all_divs:
-                        text = div.text.strip()
-                        # Проверяем формат даты: DD.MM.YYYY
-                        if text and '.' in text and len(text) == 10 and text.count('.') == 2:
-                            parts = text.split('.')
-                            if len(parts) == 3 and all(part.isdigit() for part in parts):
-                                birth_date = text
-                                break
-                except:
-                    pass
-                
-                links.append({
-                    'url': profile_url,
-                    'inv_number': inv_number,
-                    'id_number': id_number,
-                    'birth_date': birth_date,
-                    'page': page_num
-                })
-                
-                print(f"    {i+1}. Инв: {inv_number} | ID: {id_number} | Дата: {birth_date}")
-                
-                # Краткая диагностика только для первых 2 элементов
-                if i < 2:
-                    print(f"      Текст: {row.text[:100]}...")
-                
-            except Exception as e:
-                print(f"    Ошибка обработки строки {i+1}: {e}")
+            link = row_link(row, page_num)
+            if link is None:
+                print(f"    Ошибка обработки строки {i+1}: нет ссылки на профиль")
                 continue
+            links.append(link)
+            
+            print(f"    {i+1}. Инв: {link['inv_number']} | ID: {link['id_number']} | Дата: {link['birth_date']}")
+            
+            # Краткая диагностика только для первых 2 элементов
+            if i < 2:
+                print(f"      Текст: {row['text'][:100]}...")
         
+        timer.add("list.extract", time.perf_counter() - extract_start)
+        if html_cache is not None and links:
+            # страница списка - источник ID и дат рождения для --reparse-from-cache
+            with timer.step("list.cache"):
+                html_cache.put(list_page_url(page_num), driver.page_source)
         print(f"  === СОБРАНО {len(links)} ССЫЛОК СО СТРАНИЦЫ {page_num} ===")
         
     except Exception as e:
@@ -261,42 +438,39 @@ def process_profile_in_new_tab(driver, profile_info):
     try:
         print(f"  Обрабатываем профиль: {profile_info['inv_number']}")
         
-        # Открываем новую вкладку
-        driver.execute_script("window.open('');")
-        driver.switch_to.window(driver.window_handles[-1])
-        
-        # Переходим на профиль
-        if not safe_get(driver, profile_info['url']):
+        with timer.step("profile.navigate"):
+            # Открываем новую вкладку
+            driver.execute_script("window.open('');")
+            driver.switch_to.window(driver.window_handles[-1])
+            
+            # Переходим на профиль
+            loaded = safe_get(driver, profile_info['url'])
+        if not loaded:
             print(f"    ✗ Не удалось загрузить профиль")
             driver.close()
             driver.switch_to.window(driver.window_handles[0])
             return None
         
-        time.sleep(2)  # Пауза для загрузки
-        
-        # Ищем микросателлитный профиль
-        micro_profile = 'Не найдено'
-        try:
-            profile_row = driver.find_element(By.XPATH, '//td[contains(text(), "Микросателлитный профиль")]/following-sibling::td')
-            micro_profile_text = profile_row.text.strip()
-            
-            if micro_profile_text and micro_profile_text != '':
-                micro_profile = micro_profile_text
-                print(f"    ✓ Найден микросателлитный профиль: {micro_profile[:100]}...")
-            else:
-                print(f"    ✗ Микросателлитный профиль пустой")
-                driver.close()
-                driver.switch_to.window(driver.window_handles[0])
-                return None
-                
-        except Exception as e:
-            print(f"    ✗ Микросателлитный профиль не найден: {e}")
+        # Ждем появления микросателлитного профиля
+        micro_profile = wait_profile_cell(driver)
+        if html_cache is not None:
+            with timer.step("profile.cache"):
+                html_cache.put(profile_info['url'], driver.page_source)
+        if micro_profile is None:
+            print(f"    ✗ Микросателлитный профиль не найден")
+            driver.close()
+            driver.switch_to.window(driver.window_handles[0])
+            return None
+        if not micro_profile:
+            print(f"    ✗ Микросателлитный профиль пустой")
             driver.close()
             driver.switch_to.window(driver.window_handles[0])
             return None
+        print(f"    ✓ Найден микросателлитный профиль: {micro_profile[:100]}...")
         
         # Парсим профиль
-        parsed_profile = parse_profile_to_dict(micro_profile)
+        with timer.step("profile.extract"):
+            parsed_profile = parse_profile_to_dict(micro_profile)
         
         if not parsed_profile:
             print(f"    ✗ Не удалось распарсить микросателлитный профиль")
@@ -307,20 +481,7 @@ def process_profile_in_new_tab(driver, profile_info):
         print(f"    ✓ Парсинг профиля: найдено {len(parsed_profile)} локусов")
         
         # Создаем запись
-        record = {
-            'Идентификационный номер': profile_info['id_number'],
-            'Дата рождения': profile_info['birth_date'],
-            'Ссылка': profile_info['url']
-        }
-        
-        # Добавляем колонки для каждого локуса
-        for locus in ORDERED_LOCI:
-            if locus in parsed_profile:
-                record[f"1_{locus}"] = parsed_profile[locus][0]
-                record[f"2_{locus}"] = parsed_profile[locus][1]
-            else:
-                record[f"1_{locus}"] = ""
-                record[f"2_{locus}"] = ""
+        record = build_record(profile_info, parsed_profile)
         
         # Закрываем вкладку и возвращаемся к основной
         driver.close()
@@ -337,10 +498,492 @@ def process_profile_in_new_tab(driver, profile_info):
             pass
         return None
 
-def main():
+def driver_alive(driver):
+    """Отвечает ли браузер (после падения Chrome любая команда бросает исключение)"""
+    try:
+        driver.current_url
+        return True
+    except WebDriverException:
+        return False
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+def open_list_page(driver, page_num):
+    """Перейти на страницу списка page_num в браузере воркера пула"""
+    # list_page - страница, которую сейчас показывает браузер воркера
+    if getattr(driver, 'list_page', None) == page_num:
+        return True
+    try:
+        old_signature = rows_signature(driver)
+        with timer.step("list.navigate"):
+            driver.execute_script(f"goToPage({page_num})")
+        wait_rows_changed(driver, old_signature)
+        driver.list_page = page_num
+        return True
+    except Exception as e:
+        print(f"  Ошибка JavaScript навигации на страницу {page_num}: {e}")
+    with timer.step("list.navigate"):
+        loaded = safe_get(driver, list_page_url(page_num))
+    driver.list_page = page_num if loaded else None
+    return loaded
+
+def start_pool_driver(worker_id):
+    """Headless-браузер воркера, открытый на списке быков, или None"""
+    print(f"  [браузер {worker_id}] Запуск...")
+    driver = init_driver(headless=True)
+    if driver is None:
+        return None
+    with timer.step("list.navigate"):
+        loaded = safe_get(driver, BASE_URL)
+    if not loaded:
+        quit_driver(driver)
+        return None
+    driver.list_page = 1
+    return driver
+
+def pool_worker(worker_id, tasks, handle, results):
+    """
+    Воркер пула: берет задачи из общей очереди и отдает результаты писателю.
+    Если браузер упал, воркер перезапускает его и повторяет задачу; когда
+    перезапуски исчерпаны, задача возвращается в очередь другим воркерам.
+    """
+    driver = None
+    restarts = 0
+    try:
+        while True:
+            try:
+                item = tasks.get_nowait()
+            except queue.Empty:
+                return
+            
+            result = None
+            for attempt in range(TASK_RETRIES + 1):
+                if driver is None:
+                    if restarts > DRIVER_RESTARTS:
+                        break
+                    driver = start_pool_driver(worker_id)
+                    restarts += 1
+                    if driver is None:
+                        continue
+                try:
+                    result = handle(driver, item)
+                except Exception as e:
+                    print(f"  [браузер {worker_id}] Ошибка задачи {item[0]}: {e}")
+                    result = None
+                # пустой результат от живого браузера - это ответ сайта, а не сбой
+                if result or driver_alive(driver):
+                    restarts = 0
+                    break
+                print(f"  [браузер {worker_id}] Браузер не отвечает, перезапуск")
+                quit_driver(driver)
+                driver = None
+            
+            if driver is None and restarts > DRIVER_RESTARTS:
+                print(f"  [браузер {worker_id}] Перезапуски исчерпаны, воркер остановлен")
+                tasks.put(item)
+                return
+            results.put((item, result))
+    finally:
+        if driver is not None:
+            quit_driver(driver)
+        results.put(None)
+
+def run_browser_pool(n_browsers, items, handle, on_result):
+    """
+    Раздать items по n_browsers браузерам. handle(driver, item) выполняется в
+    потоках воркеров, on_result(item, result) - только в вызывающем потоке,
+    поэтому файлы пишет единственный писатель. Возвращает необработанные задачи.
+    """
+    tasks = queue.Queue()
+    for item in items:
+        tasks.put(item)
+    results = queue.Queue()
+    
+    workers = [threading.Thread(target=pool_worker, args=(w + 1, tasks, handle, results), daemon=True)
+               for w in range(min(n_browsers, len(items)))]
+    for t in workers:
+        t.start()
+    
+    running = len(workers)
+    while running:
+        message = results.get()
+        if message is None:
+            running -= 1
+            continue
+        on_result(*message)
+    
+    for t in workers:
+        t.join()
+    left = []
+    while not tasks.empty():
+        left.append(tasks.get_nowait())
+    return left
+
+def collect_links_pool(n_browsers, journal):
+    """Этап 1 в пуле браузеров: страницы списка раздаются воркерам"""
+    processed_pages = set(journal.pages)
+    # страницы за первой пустой страницей уже не запрашиваются
+    stop = {'page': MAX_PAGES + 1}
+    lock = threading.Lock()
+    
+    def handle(driver, item):
+        page_num, = item
+        with lock:
+            if page_num >= stop['page']:
+                return None
+        if not open_list_page(driver, page_num):
+            return None
+        page_links = collect_links_from_page(driver, page_num)
+        if not page_links and driver_alive(driver):
+            with lock:
+                stop['page'] = min(stop['page'], page_num)
+        return page_links
+    
+    collected = {'links': sum(len(links) for links in journal.pages.values())}
+    
+    def on_result(item, page_links):
+        page_num, = item
+        if not page_links:
+            return
+        journal.add_page(page_num, page_links)
+        collected['links'] += len(page_links)
+        print(f"  Страница {page_num}: {len(page_links)} ссылок, всего собрано: {collected['links']}")
+    
+    pages = [(p,) for p in range(1, MAX_PAGES + 1) if p not in processed_pages]
+    left = run_browser_pool(n_browsers, pages, handle, on_result)
+    left = [p for p, in left if p < stop['page']]
+    if left:
+        print(f"  Не обработаны страницы (все браузеры остановлены): {left[:20]}")
+
+def process_profiles_pool(n_browsers, all_links, journal):
+    """Этап 2 в пуле браузеров; CSV пишется в порядке ссылок"""
+    pending = {}
+    state = {'next': 0, 'saved': 0}
+    
+    def handle(driver, item):
+        _i, profile_info = item
+        return process_profile_in_new_tab(driver, profile_info)
+    
+    def on_result(item, profile_data):
+        pending[item[0]] = profile_data
+        while state['next'] in pending:
+            record = pending.pop(state['next'])
+            if record:
+                append_to_csv([record])
+                state['saved'] += 1
+            if record is not False:
+                journal.add_profile(all_links[state['next']]['url'], bool(record))
+            state['next'] += 1
+            if state['next'] % SAVE_INTERVAL == 0:
+                print(f"\n  Обработано {state['next']}/{len(all_links)} профилей")
+    
+    left = run_browser_pool(n_browsers, list(enumerate(all_links)), handle, on_result)
+    # задачи, которые не успел взять ни один воркер, не должны задерживать остальные записи;
+    # в журнал они не попадают и будут обработаны при следующем запуске
+    for i, _profile_info in left:
+        on_result((i,), False)
+    if left:
+        print(f"  Не обработано профилей (все браузеры остановлены): {len(left)}")
+    return state['next'] - len(left), state['saved']
+
+def report_done(processed_count, successful_count):
+    """Итоги этапа 2"""
+    print(f"\n=== РАБОТА ЗАВЕРШЕНА ===")
+    print(f"Обработано профилей: {processed_count}")
+    print(f"Успешно сохранено: {successful_count}")
+    save_store()
+    print(f"Результаты сохранены в {csv_file} и {store_path(csv_file)}")
+    timer.report()
+
+def main_pool(n_browsers):
+    """Оба этапа в пуле из n_browsers headless-браузеров"""
+    print(f"Режим пула: {n_browsers} браузеров")
+    journal = Journal(journal_file)
+    print(f"Загружено {sum(len(links) for links in journal.pages.values())} ссылок из предыдущих сессий")
+    
+    print("\n=== ЭТАП 1: СБОР ВСЕХ ССЫЛОК ===")
+    collect_links_pool(n_browsers, journal)
+    all_links = journal.links()
+    save_links(all_links)
+    print(f"\n=== СБОР ССЫЛОК ЗАВЕРШЕН ===")
+    print(f"Всего собрано: {len(all_links)} ссылок")
+    
+    print(f"\n=== ЭТАП 2: ОБРАБОТКА ПРОФИЛЕЙ ===")
+    todo_links = [link for link in all_links if link['url'] not in journal.done_urls]
+    print(f"Уже обработано в прошлых сессиях: {len(all_links) - len(todo_links)}")
+    processed_count, successful_count = process_profiles_pool(n_browsers, todo_links, journal)
+    journal.close()
+    
+    report_done(processed_count, successful_count)
+
+def process_profiles_sequential(driver, all_links, journal):
+    """Этап 2 в одном браузере, профили по очереди"""
+    processed_count = 0
+    successful_count = 0
+    
+    for i, profile_info in enumerate(all_links):
+        # Показываем прогресс каждые 10 профилей или для первых 5
+        if i < 5 or (i + 1) % 10 == 0:
+            print(f"\nОбрабатываем профиль {i+1}/{len(all_links)} ({((i+1)/len(all_links)*100):.1f}%)")
+        else:
+            print(f"  {i+1}/{len(all_links)}", end=" ", flush=True)
+        
+        # Обрабатываем профиль в новой вкладке
+        profile_data = process_profile_in_new_tab(driver, profile_info)
+        
+        if profile_data:
+            # Сохраняем данные
+            append_to_csv([profile_data])
+            successful_count += 1
+            if i < 5 or (i + 1) % 10 == 0:
+                print(f"  ✓ Профиль сохранен")
+        else:
+            if i < 5 or (i + 1) % 10 == 0:
+                print(f"  ✗ Профиль пропущен")
+        
+        journal.add_profile(profile_info['url'], bool(profile_data))
+        processed_count += 1
+        
+        # Периодически сохраняем прогресс
+        if processed_count % SAVE_INTERVAL == 0:
+            print(f"\n  Обработано {processed_count}/{len(all_links)} профилей")
+        
+        # Пауза между профилями
+        with timer.step("profile.delay"):
+            time.sleep(PROFILE_DELAY)
+    
+    return processed_count, successful_count
+
+def process_profiles_http(all_links, journal, concurrency=None, host_interval=None):
+    """Этап 2 без браузера: профили загружаются по HTTP параллельно (None - значения из profile_fetcher)"""
+    # aiohttp нужен только этому режиму, браузерный парсер работает и без него
+    from profile_fetcher import HOST_MIN_INTERVAL, HTTP_CONCURRENCY, run_fetch
+    
+    if concurrency is None:
+        concurrency = HTTP_CONCURRENCY
+    if host_interval is None:
+        host_interval = HOST_MIN_INTERVAL
+    print(f"Профилей: {len(all_links)}, одновременных запросов: {concurrency}, "
+          f"интервал к хосту: {host_interval} с")
+    
+    def on_record(record):
+        append_to_csv([record])
+        journal.add_profile(record['Ссылка'], True)
+    
+    return run_fetch(all_links, on_record, concurrency=concurrency, host_interval=host_interval,
+                     cache=html_cache)
+
+def cached_list_links():
+    """Ссылки со страниц списка, сохраненных в кэше, по порядку страниц"""
+    pages = {}
+    for key in html_cache.keys():
+        page = list_page_number(key)
+        if page is not None:
+            pages[page] = key
+    links = []
+    for page in sorted(pages):
+        html = html_cache.get(pages[page])
+        if html is None:
+            continue
+        for row in extract_list_rows(html, BASE_URL):
+            link = row_link(row, page)
+            if link is not None:
+                links.append(link)
+    return links
+
+def reparse_from_cache():
+    """Пересобрать bulls_data.csv из кэша страниц, не обращаясь к сайту"""
+    journal = Journal(journal_file)
+    # журнал и bulls_links.json нужны только для быков, чьих страниц списка нет в кэше
+    all_links = journal.links() or load_links()
+    journal.close()
+    cached_links = cached_list_links()
+    
+    latest = {}
+    for link in all_links + cached_links:
+        latest[url_key(link['url'])] = link
+    print(f"Быков в ссылках: {len(latest)} (со страниц списка в кэше: {len(cached_links)}), "
+          f"страниц в кэше: {len(html_cache)}")
+    
+    records = []
+    not_cached = 0
+    for link in latest.values():
+        html = html_cache.get(link['url'])
+        if html is None:
+            not_cached += 1
+            continue
+        micro_profile = extract_micro_profile(html)
+        parsed_profile = parse_profile_to_dict(micro_profile) if micro_profile else {}
+        if parsed_profile:
+            records.append(build_record(link, parsed_profile))
+    
+    write_csv(records)
+    save_store()
+    print(f"Нет в кэше: {not_cached}, без профиля: {len(latest) - not_cached - len(records)}")
+    print(f"Записано профилей: {len(records)} в {csv_file}")
+
+def load_known_bulls():
+    """
+    Ключи (url_key) всех известных быков и тех, у кого микросателлитный профиль
+    уже есть в реестре или в bulls_data.csv
+    """
+    known, with_profile = set(), set()
+    for path in (registry_file, csv_file):
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f, delimiter=';'):
+                if not row.get('Ссылка'):
+                    continue
+                key = url_key(row['Ссылка'])
+                known.add(key)
+                if any((row.get(k) or '').strip() for k in LOCI_KEYS):
+                    with_profile.add(key)
+    for link in load_links():
+        known.add(url_key(link['url']))
+    return known, with_profile
+
+def sync_collect_links(driver, known):
+    """Страницы списка с первой, пока на странице есть неизвестные быки. Возвращает (новые, все просмотренные)"""
+    new_links = []
+    seen_links = []
+    for page_num in range(1, MAX_PAGES + 1):
+        print(f"\n--- Страница {page_num} ---")
+        if not open_list_page(driver, page_num):
+            print(f"  Не удалось загрузить страницу {page_num}")
+            break
+        page_links = collect_links_from_page(driver, page_num)
+        if not page_links:
+            print(f"  Не найдено ссылок на странице {page_num}, завершаем сбор")
+            break
+        
+        seen_links.extend(page_links)
+        fresh = [link for link in page_links if url_key(link['url']) not in known]
+        known.update(url_key(link['url']) for link in fresh)
+        new_links.extend(fresh)
+        print(f"  Новых быков на странице: {len(fresh)}")
+        if not fresh:
+            print(f"  На странице только известные быки, сбор завершен")
+            break
+    return new_links, seen_links
+
+def main_sync(args):
+    """Догрузка: только новые быки и быки без микросателлитного профиля"""
+    print("Режим синхронизации")
+    known, with_profile = load_known_bulls()
+    print(f"Известно быков: {len(known)}, с микросателлитным профилем: {len(with_profile)}")
+    
+    print("Инициализация браузера...")
+    driver = init_driver()
+    if not driver:
+        print("Не удалось инициализировать драйвер!")
+        return
+    with timer.step("list.navigate"):
+        loaded = safe_get(driver, BASE_URL)
+    if not loaded:
+        print("Не удалось загрузить главную страницу!")
+        driver.quit()
+        return
+    driver.list_page = 1
+    
+    print("\n=== ЭТАП 1: ПОИСК НОВЫХ БЫКОВ ===")
+    new_links, seen_links = sync_collect_links(driver, known)
+    all_links = load_links()
+    if new_links:
+        all_links.extend(new_links)
+        save_links(all_links)
+    print(f"\nНовых быков: {len(new_links)}")
+    
+    # по одной ссылке на быка: просмотренные сейчас несут самый свежий token
+    latest = {}
+    for link in all_links + seen_links:
+        latest[url_key(link['url'])] = link
+    todo_links = [link for key, link in latest.items() if key not in with_profile]
+    
+    print(f"\n=== ЭТАП 2: ПРОФИЛИ НОВЫХ БЫКОВ И БЕЗ ПРОФИЛЯ: {len(todo_links)} ===")
+    journal = Journal(journal_file)
+    if args.http:
+        driver.quit()
+        processed_count, successful_count = process_profiles_http(
+            todo_links, journal, args.concurrency, args.host_interval)
+    elif args.browsers > 1:
+        driver.quit()
+        processed_count, successful_count = process_profiles_pool(args.browsers, todo_links, journal)
+    else:
+        processed_count, successful_count = process_profiles_sequential(driver, todo_links, journal)
+        driver.quit()
+    journal.close()
+    report_done(processed_count, successful_count)
+
+def main(argv=None):
     """Основная функция"""
+    parser = argparse.ArgumentParser(description="Пакетный парсер быков")
+    parser.add_argument("--http", action="store_true",
+                        help=f"загрузить профили из {links_file} по HTTP без браузера (этап 2)")
+    parser.add_argument("--concurrency", type=int,
+                        help="одновременных HTTP-запросов в режиме --http (по умолчанию HTTP_CONCURRENCY из profile_fetcher)")
+    parser.add_argument("--host-interval", type=float,
+                        help="минимальный интервал между запросами к одному хосту, с (по умолчанию HOST_MIN_INTERVAL из profile_fetcher)")
+    parser.add_argument("--browsers", type=int, default=BROWSERS,
+                        help="браузеров в пуле; больше 1 - параллельный режим без окон")
+    parser.add_argument("--reparse-from-cache", action="store_true",
+                        help=f"пересобрать {csv_file} из сохраненных страниц ({cache_dir}) без обращения к сайту")
+    parser.add_argument("--no-cache", action="store_true", help="не сохранять страницы быков в кэш")
+    parser.add_argument("--cache-max-mb", type=float, default=CACHE_MAX_MB,
+                        help="предельный размер кэша страниц, МБ")
+    parser.add_argument("--cache-max-age-days", type=float, default=CACHE_MAX_AGE_DAYS,
+                        help="удалять из кэша страницы старше N дней")
+    parser.add_argument("--sync", action="store_true",
+                        help=f"догрузка: листать список, пока встречаются новые быки, и загрузить профили "
+                             f"только новых быков и быков без профиля в {registry_file}")
+    args = parser.parse_args(argv)
+    
     print("=== ПАКЕТНЫЙ ПАРСЕР БЫКОВ ===")
     
+    global html_cache
+    if not args.no_cache or args.reparse_from_cache:
+        html_cache = HtmlCache(cache_dir, max_bytes=int(args.cache_max_mb * 1024 * 1024),
+                               max_age_days=args.cache_max_age_days)
+    try:
+        run(args)
+    finally:
+        if html_cache is not None:
+            html_cache.close()
+            html_cache = None
+
+def run(args):
+    """Выбор режима работы"""
+    if args.reparse_from_cache:
+        reparse_from_cache()
+        return
+    
+    if args.sync:
+        main_sync(args)
+        return
+    
+    if args.http:
+        all_links = load_links()
+        if not all_links:
+            print(f"Нет ссылок в {links_file}, сначала выполните сбор ссылок (этап 1)")
+            return
+        print(f"\n=== ЭТАП 2: ОБРАБОТКА ПРОФИЛЕЙ ПО HTTP ===")
+        journal = Journal(journal_file)
+        todo_links = [link for link in all_links if link['url'] not in journal.done_urls]
+        print(f"Уже обработано в прошлых сессиях: {len(all_links) - len(todo_links)}")
+        processed_count, successful_count = process_profiles_http(
+            todo_links, journal, args.concurrency, args.host_interval)
+        journal.close()
+        report_done(processed_count, successful_count)
+        return
+    
+    if args.browsers > 1:
+        main_pool(args.browsers)
+        return
+    
     # Инициализация
     print("Инициализация браузера...")
     driver = init_driver()
@@ -348,11 +991,13 @@ def main():
         print("Не удалось инициализировать драйвер!")
         return
     
-    base_url = 'https://xn--90aof1e.xn--p1ai/bulls/list'
+    base_url = BASE_URL
     
     # Загружаем главную страницу
     print("Загрузка главной страницы...")
-    if not safe_get(driver, base_url):
+    with timer.step("list.navigate"):
+        loaded = safe_get(driver, base_url)
+    if not loaded:
         print("Не удалось загрузить главную страницу!")
         driver.quit()
         return
@@ -360,16 +1005,16 @@ def main():
     print("Главная страница загружена успешно!")
     
     # Загрузка прогресса
-    progress = load_progress()
-    all_links = load_links()
+    journal = Journal(journal_file)
+    all_links = journal.links()
     
     print(f"Загружено {len(all_links)} ссылок из предыдущих сессий")
     
     # ЭТАП 1: Сбор всех ссылок
     print("\n=== ЭТАП 1: СБОР ВСЕХ ССЫЛОК ===")
     
-    current_page = progress.get('last_page', 0) + 1
-    processed_pages = set(progress.get('processed_pages', []))
+    current_page = journal.last_page + 1
+    processed_pages = set(journal.pages)
     
     while current_page <= MAX_PAGES:
         print(f"\n--- Страница {current_page} ---")
@@ -384,10 +1029,12 @@ def main():
             page_url = base_url
         else:
             # Для AngularJS приложения используем JavaScript навигацию
+            old_signature = rows_signature(driver)
             try:
                 print(f"  Переход на страницу {current_page} через JavaScript...")
-                driver.execute_script(f"goToPage({current_page})")
-                time.sleep(3)  # Ждем загрузки
+                with timer.step("list.navigate"):
+                    driver.execute_script(f"goToPage({current_page})")
+                wait_rows_changed(driver, old_signature)
             except Exception as e:
                 print(f"  Ошибка JavaScript навигации: {e}")
                 
@@ -395,14 +1042,17 @@ def main():
                 try:
                     print(f"  Пробуем кликнуть по кнопке 'следующая страница'...")
                     next_btn = driver.find_element(By.XPATH, '//a[@title="следующая страница" and contains(@ng-click, "goToPage")]')
-                    driver.execute_script("arguments[0].click();", next_btn)
-                    time.sleep(3)
+                    with timer.step("list.navigate"):
+                        driver.execute_script("arguments[0].click();", next_btn)
+                    wait_rows_changed(driver, old_signature)
                 except Exception as e2:
                     print(f"  Ошибка клика по кнопке: {e2}")
                     
                     # Fallback 2: попробуем URL параметр
                     page_url = f"{base_url}?page={current_page}"
-                    if not safe_get(driver, page_url):
+                    with timer.step("list.navigate"):
+                        loaded = safe_get(driver, page_url)
+                    if not loaded:
                         print(f"  Не удалось загрузить страницу {current_page}")
                         break
                     continue
@@ -411,7 +1061,7 @@ def main():
         if current_page > 1:
             try:
                 # Проверяем, что данные изменились (не те же самые, что на предыдущей странице)
-                first_row = driver.find_element(By.XPATH, '//div[@ng-repeat="animal in animals"][1]')
+                first_row = driver.find_element(By.XPATH, ROWS_XPATH + '[1]')
                 first_text = first_row.text[:100]  # Берем первые 100 символов
                 print(f"  Первая строка на странице {current_page}: {first_text}...")
             except Exception as e:
@@ -421,15 +1071,10 @@ def main():
         page_links = collect_links_from_page(driver, current_page)
         
         if page_links:
-            all_links.extend(page_links)
-            save_links(all_links)
-            
             # Обновляем прогресс
+            journal.add_page(current_page, page_links)
+            all_links.extend(page_links)
             processed_pages.add(current_page)
-            progress['last_page'] = current_page
-            progress['processed_pages'] = list(processed_pages)
-            progress['collected_links'] = len(all_links)
-            save_progress(progress)
             
             print(f"  Всего собрано ссылок: {len(all_links)}")
             current_page += 1
@@ -437,50 +1082,24 @@ def main():
             print(f"  Не найдено ссылок на странице {current_page}, завершаем сбор")
             break
     
+    all_links = journal.links()
+    save_links(all_links)
     print(f"\n=== СБОР ССЫЛОК ЗАВЕРШЕН ===")
     print(f"Всего собрано: {len(all_links)} ссылок")
     
     # ЭТАП 2: Обработка профилей
     print(f"\n=== ЭТАП 2: ОБРАБОТКА ПРОФИЛЕЙ ===")
     
-    processed_count = 0
-    successful_count = 0
+    done_count = len(all_links)
+    all_links = [link for link in all_links if link['url'] not in journal.done_urls]
+    print(f"Уже обработано в прошлых сессиях: {done_count - len(all_links)}")
     
-    for i, profile_info in enumerate(all_links):
-        # Показываем прогресс каждые 10 профилей или для первых 5
-        if i < 5 or (i + 1) % 10 == 0:
-            print(f"\nОбрабатываем профиль {i+1}/{len(all_links)} ({((i+1)/len(all_links)*100):.1f}%)")
-        else:
-            print(f"  {i+1}/{len(all_links)}", end=" ", flush=True)
-        
-        # Обрабатываем профиль в новой вкладке
-        profile_data = process_profile_in_new_tab(driver, profile_info)
-        
-        if profile_data:
-            # Сохраняем данные
-            append_to_csv([profile_data])
-            successful_count += 1
-            if i < 5 or (i + 1) % 10 == 0:
-                print(f"  ✓ Профиль сохранен")
-        else:
-            if i < 5 or (i + 1) % 10 == 0:
-                print(f"  ✗ Профиль пропущен")
-        
-        processed_count += 1
-        
-        # Периодически сохраняем прогресс
-        if processed_count % SAVE_INTERVAL == 0:
-            print(f"\n  Обработано {processed_count}/{len(all_links)} профилей")
-        
-        # Пауза между профилями
-        time.sleep(PROFILE_DELAY)
+    processed_count, successful_count = process_profiles_sequential(driver, all_links, journal)
     
     # Завершение
+    journal.close()
     driver.quit()
-    print(f"\n=== РАБОТА ЗАВЕРШЕНА ===")
-    print(f"Обработано профилей: {processed_count}")
-    print(f"Успешно сохранено: {successful_count}")
-    print(f"Результаты сохранены в {csv_file}")
+    report_done(processed_count, successful_count)
 
 if __name__ == "__main__":
     main()
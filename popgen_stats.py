@@ -0,0 +1,274 @@
+import argparse
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from excel_to_csv import FIXED_LOCI
+from genotype_store import CSV_ENCODING, CSV_SEP
+from parentage_engine import PLACEHOLDER_ALLELES, normalize_allele
+
+
+# Configuration
+CHILD_DB = r"C:\Users\user\Desktop\genetic\zrya_processed\genotypes_unified.csv"
+HOZ_LIST = r"C:\Users\user\Desktop\genetic\zrya_processed\hoz_list.csv"
+REPORT_PATH = r"C:\Users\user\Desktop\genetic\zrya_processed\popgen_stats.xlsx"
+
+# Rows read from the CSV at a time (memory is bounded by one chunk plus the counters)
+CHUNK_ROWS = 50000
+
+# Brookfield's null allele frequency estimate above which a locus is flagged
+NULL_ALLELE_THRESHOLD = 0.05
+
+# Counts file (JSON): version, loci, farms {nomhoz: {locus: {"typed", "het", "alleles": {allele: count}}}}
+FORMAT_VERSION = 1
+
+# Pseudo-farm of every animal in the statistics tables
+ALL_FARMS = "все"
+
+
+class PopulationCounts:
+    """Per-farm, per-locus counters: typed animals, heterozygotes and allele counts.
+
+    Only animals typed for both alleles of a locus are counted there. Counters are plain sums, so
+    counts from different files, chunks or years merge by addition (merge) and every statistic is
+    computed from them afterwards.
+    """
+
+    def __init__(self, loci: Sequence[str] = FIXED_LOCI):
+        self.loci = list(loci)
+        self.farms: Dict[str, Dict[str, Dict]] = {}
+
+    def _locus(self, farm: str, locus: str) -> Dict:
+        return self.farms.setdefault(farm, {}).setdefault(locus, {"typed": 0, "het": 0, "alleles": {}})
+
+    def add_frame(self, df: pd.DataFrame, farm_col: str = "nomhoz") -> None:
+        """Count one chunk of genotypes_unified.csv (the animal's own 1_<locus>/2_<locus> columns)."""
+        farms = df[farm_col].fillna("").astype(str).str.strip().to_numpy(dtype=object)
+        farm_codes, farm_names = pd.factorize(farms)
+        for locus in self.loci:
+            c1, c2 = f"1_{locus}", f"2_{locus}"
+            if c1 not in df.columns or c2 not in df.columns:
+                continue
+            a1 = normalized(df[c1])
+            a2 = normalized(df[c2])
+            typed = (a1 != "") & (a2 != "")
+            if not typed.any():
+                continue
+            typed_n = np.bincount(farm_codes[typed], minlength=len(farm_names))
+            het_n = np.bincount(farm_codes[typed & (a1 != a2)], minlength=len(farm_names))
+            pairs = pd.DataFrame({"farm": np.concatenate([farm_codes[typed]] * 2),
+                                  "allele": np.concatenate([a1[typed], a2[typed]])})
+            for (f, allele), n in pairs.value_counts(sort=False).items():
+                alleles = self._locus(farm_names[f], locus)["alleles"]
+                alleles[allele] = alleles.get(allele, 0) + int(n)
+            for f in np.flatnonzero(typed_n).tolist():
+                counts = self._locus(farm_names[f], locus)
+                counts["typed"] += int(typed_n[f])
+                counts["het"] += int(het_n[f])
+
+    def merge(self, other: "PopulationCounts") -> "PopulationCounts":
+        """Add other's counters into this one (e.g. a year into the running total); returns self."""
+        self.loci.extend(locus for locus in other.loci if locus not in self.loci)
+        for farm, by_locus in other.farms.items():
+            for locus, src in by_locus.items():
+                dst = self._locus(farm, locus)
+                dst["typed"] += src["typed"]
+                dst["het"] += src["het"]
+                for allele, n in src["alleles"].items():
+                    dst["alleles"][allele] = dst["alleles"].get(allele, 0) + n
+        return self
+
+    def total(self) -> "PopulationCounts":
+        """All farms pooled into the single farm ALL_FARMS."""
+        pooled = PopulationCounts(self.loci)
+        for by_locus in self.farms.values():
+            single = PopulationCounts(self.loci)
+            single.farms[ALL_FARMS] = by_locus
+            pooled.merge(single)
+        return pooled
+
+    def save(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": FORMAT_VERSION, "loci": self.loci, "farms": self.farms}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PopulationCounts":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported counts version {data.get('version')}")
+        counts = cls(data["loci"])
+        counts.farms = data["farms"]
+        return counts
+
+
+def normalized(series: pd.Series) -> np.ndarray:
+    """Normalized allele strings of a column, "" where untyped; each distinct value normalized once."""
+    codes, uniques = pd.factorize(series)
+    values = [normalize_allele(u) for u in uniques]
+    values = ["" if v in PLACEHOLDER_ALLELES else v for v in values]
+    values.append("")  # factorize marks NaN as -1
+    return np.asarray(values, dtype=object)[codes]
+
+
+def count_csv(path: str, loci: Sequence[str] = FIXED_LOCI, chunk_rows: int = CHUNK_ROWS) -> PopulationCounts:
+    """Stream genotypes_unified.csv in chunks into per-farm counters."""
+    counts = PopulationCounts(loci)
+    wanted = {"nomhoz"} | {f"{k}_{locus}" for locus in loci for k in (1, 2)}
+    reader = pd.read_csv(path, sep=CSV_SEP, dtype=str, encoding=CSV_ENCODING, chunksize=chunk_rows,
+                         usecols=lambda c: c in wanted)
+    for chunk in reader:
+        counts.add_frame(chunk)
+    return counts
+
+
+def frequencies(locus_counts: Dict) -> Tuple[List[str], np.ndarray]:
+    """(alleles, frequencies) of one farm and locus, alleles sorted by size."""
+    alleles = sorted(locus_counts["alleles"], key=allele_sort_key)
+    n = np.array([locus_counts["alleles"][a] for a in alleles], dtype=np.float64)
+    return alleles, n / n.sum() if n.sum() else n
+
+
+def allele_sort_key(allele: str) -> Tuple[int, float, str]:
+    try:
+        return 0, float(allele), allele
+    except ValueError:
+        return 1, 0.0, allele
+
+
+def expected_heterozygosity(p: np.ndarray, typed: int) -> float:
+    """Nei's unbiased gene diversity: 2n / (2n - 1) * (1 - sum p^2)."""
+    if typed < 1:
+        return float("nan")
+    return 2 * typed / (2 * typed - 1) * (1 - float(np.square(p).sum()))
+
+
+def pic(p: np.ndarray) -> float:
+    """Polymorphic information content: 1 - sum p_i^2 - sum_{i<j} 2 p_i^2 p_j^2."""
+    sq = np.square(p)
+    return float(1 - sq.sum() - (np.square(sq.sum()) - np.square(sq).sum()))
+
+
+def locus_table(counts: PopulationCounts) -> pd.DataFrame:
+    """Per farm and locus: n, alleles, Ho, He, PIC, F_IS, null allele estimate and flag."""
+    rows = []
+    for farm, by_locus in counts.farms.items():
+        for locus in counts.loci:
+            c = by_locus.get(locus)
+            if not c or not c["typed"]:
+                continue
+            _alleles, p = frequencies(c)
+            ho = c["het"] / c["typed"]
+            he = expected_heterozygosity(p, c["typed"])
+            # Brookfield (1996) estimator 1 of the null allele frequency from the heterozygote deficit
+            null = (he - ho) / (1 + he)
+            rows.append({"nomhoz": farm, "locus": locus, "n": c["typed"], "alleles": len(p),
+                         "Ho": ho, "He": he, "PIC": pic(p), "F_IS": 1 - ho / he if he > 0 else float("nan"),
+                         "F_null": null, "null_suspect": bool(null > NULL_ALLELE_THRESHOLD)})
+    return pd.DataFrame(rows, columns=["nomhoz", "locus", "n", "alleles", "Ho", "He", "PIC", "F_IS",
+                                       "F_null", "null_suspect"])
+
+
+def frequency_table(counts: PopulationCounts) -> pd.DataFrame:
+    rows = []
+    for farm, by_locus in counts.farms.items():
+        for locus in counts.loci:
+            c = by_locus.get(locus)
+            if not c:
+                continue
+            alleles, p = frequencies(c)
+            for allele, freq in zip(alleles, p.tolist()):
+                rows.append({"nomhoz": farm, "locus": locus, "allele": allele,
+                             "count": c["alleles"][allele], "frequency": freq})
+    return pd.DataFrame(rows, columns=["nomhoz", "locus", "allele", "count", "frequency"])
+
+
+def hudson_fst(a: Dict[str, Dict], b: Dict[str, Dict], loci: Iterable[str]) -> float:
+    """Multi-locus Hudson Fst of two farms, 1 - sum(Hw) / sum(Hb) over loci typed in both.
+
+    Hw is the mean within-farm gene diversity (unbiased), Hb the chance that alleles drawn
+    from the two farms differ.
+    """
+    within = between = 0.0
+    for locus in loci:
+        ca, cb = a.get(locus), b.get(locus)
+        if not ca or not cb or ca["typed"] < 1 or cb["typed"] < 1:
+            continue
+        alleles = sorted(set(ca["alleles"]) | set(cb["alleles"]))
+        pa = np.array([ca["alleles"].get(x, 0) for x in alleles], dtype=np.float64)
+        pb = np.array([cb["alleles"].get(x, 0) for x in alleles], dtype=np.float64)
+        pa /= pa.sum()
+        pb /= pb.sum()
+        within += (expected_heterozygosity(pa, ca["typed"]) + expected_heterozygosity(pb, cb["typed"])) / 2
+        between += 1 - float(pa @ pb)
+    return 1 - within / between if between > 0 else float("nan")
+
+
+def fst_table(counts: PopulationCounts) -> pd.DataFrame:
+    """Farm x farm matrix of pairwise Hudson Fst."""
+    farms = sorted(counts.farms, key=allele_sort_key)
+    out = pd.DataFrame(0.0, index=farms, columns=farms)
+    for i, fa in enumerate(farms):
+        for fb in farms[i + 1:]:
+            out.loc[fa, fb] = out.loc[fb, fa] = hudson_fst(counts.farms[fa], counts.farms[fb], counts.loci)
+    return out
+
+
+def farm_names(path: Optional[str]) -> Dict[str, str]:
+    """nomhoz -> name_hoz from hoz_list.csv, {} if there is no such file."""
+    if not path or not os.path.exists(path):
+        return {}
+    df = pd.read_csv(path, sep=CSV_SEP, dtype=str, encoding=CSV_ENCODING).fillna("")
+    return dict(zip(df["nomhoz"].str.strip(), df["name_hoz"].str.strip()))
+
+
+def write_report(counts: PopulationCounts, path: str, names: Dict[str, str]) -> None:
+    """Workbook with sheets loci (per farm and pooled), frequencies and fst."""
+    pooled = counts.total()
+    loci = pd.concat([locus_table(counts), locus_table(pooled)], ignore_index=True)
+    freqs = pd.concat([frequency_table(counts), frequency_table(pooled)], ignore_index=True)
+    for table in (loci, freqs):
+        table.insert(1, "name_hoz", table["nomhoz"].map(names).fillna(""))
+    fst = fst_table(counts)
+    fst.index = [f"{f} {names[f]}" if f in names else f for f in fst.index]
+    fst.columns = fst.index
+    with pd.ExcelWriter(path, engine="xlsxwriter") as writer:
+        loci.to_excel(writer, sheet_name="loci", index=False)
+        freqs.to_excel(writer, sheet_name="frequencies", index=False)
+        fst.to_excel(writer, sheet_name="fst")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Популяционная статистика по локусам и хозяйствам")
+    parser.add_argument("--csv", default=CHILD_DB, help="genotypes_unified.csv (читается частями)")
+    parser.add_argument("--merge", nargs="+", metavar="COUNTS_JSON",
+                        help="не читать CSV, а сложить ранее сохраненные счетчики (например, по годам)")
+    parser.add_argument("--save-counts", metavar="COUNTS_JSON", help="сохранить счетчики для последующего --merge")
+    parser.add_argument("--hoz-list", default=HOZ_LIST, help="hoz_list.csv с названиями хозяйств")
+    parser.add_argument("--report", default=REPORT_PATH)
+    args = parser.parse_args(argv)
+
+    if args.merge:
+        counts = PopulationCounts.load(args.merge[0])
+        for path in args.merge[1:]:
+            counts.merge(PopulationCounts.load(path))
+    else:
+        counts = count_csv(args.csv)
+    if args.save_counts:
+        counts.save(args.save_counts)
+        print(f"Счетчики сохранены: {args.save_counts}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+    write_report(counts, args.report, farm_names(args.hoz_list))
+    animals = max((c["typed"] for c in counts.total().farms.get(ALL_FARMS, {}).values()), default=0)
+    print(f"Хозяйств: {len(counts.farms)}, генотипированных животных: {animals}")
+    print(f"Отчет: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
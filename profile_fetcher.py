@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Загрузка профилей быков по HTTP без браузера (asyncio + aiohttp, общий пул соединений)
+"""
+
+import asyncio
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from bull_profiles import build_record, extract_micro_profile, parse_profile_to_dict
+
+# Конфигурационные параметры
+HTTP_CONCURRENCY = 8  # Одновременных запросов
+HOST_MIN_INTERVAL = 0.1  # Минимальный интервал между запросами к одному хосту (секунды)
+REQUEST_TIMEOUT = 60  # Таймаут одного запроса (секунды)
+MAX_RETRIES = 3  # Попыток на профиль
+RETRY_DELAY = 3  # Пауза перед повторной попыткой (секунды)
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36"
+
+# Ответы, после которых есть смысл повторить запрос
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HostRateLimiter:
+    """Не чаще одного запроса в min_interval секунд к каждому хосту"""
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self.next_slot = {}
+        self.lock = asyncio.Lock()
+
+    async def wait(self, host: str):
+        if self.min_interval <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        async with self.lock:
+            now = loop.time()
+            start = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = start + self.min_interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def fetch_html(session, limiter, url: str, max_retries: int = MAX_RETRIES):
+    """HTML страницы или (None, причина) после исчерпания попыток"""
+    host = urlsplit(url).netloc
+    reason = "нет попыток"
+    for attempt in range(max_retries):
+        await limiter.wait(host)
+        try:
+            async with session.get(url) as resp:
+                if resp.status == 200:
+                    return await resp.text(), None
+                reason = f"HTTP {resp.status}"
+                if resp.status not in RETRY_STATUSES:
+                    return None, reason
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            reason = f"{type(e).__name__}: {e}"
+        if attempt < max_retries - 1:
+            await asyncio.sleep(RETRY_DELAY)
+    return None, reason
+
+
+async def fetch_profile(session, limiter, profile_info: dict, max_retries: int = MAX_RETRIES, cache=None):
+    """Запись для bulls_data.csv или (None, причина пропуска); загруженная страница сохраняется в cache"""
+    html, reason = await fetch_html(session, limiter, profile_info['url'], max_retries)
+    if html is None:
+        return None, f"не удалось загрузить профиль ({reason})"
+    if cache is not None:
+        cache.put(profile_info['url'], html)
+
+    micro_profile = extract_micro_profile(html)
+    if micro_profile is None:
+        return None, "микросателлитный профиль не найден"
+    if not micro_profile:
+        return None, "микросателлитный профиль пустой"
+
+    parsed_profile = parse_profile_to_dict(micro_profile)
+    if not parsed_profile:
+        return None, "не удалось распарсить микросателлитный профиль"
+    return build_record(profile_info, parsed_profile), None
+
+
+async def fetch_profiles(links, on_record, concurrency: int = HTTP_CONCURRENCY,
+                         host_interval: float = HOST_MIN_INTERVAL, max_retries: int = MAX_RETRIES, cache=None):
+    """
+    Загрузить профили по ссылкам. on_record(record) вызывается в порядке links,
+    поэтому CSV получается таким же, как при последовательном обходе.
+    Возвращает (обработано, сохранено).
+    """
+    concurrency = max(1, concurrency)
+    limiter = HostRateLimiter(host_interval)
+    queue = asyncio.Queue()
+    for i in range(len(links)):
+        queue.put_nowait(i)
+
+    # буфер упорядочивания: готовые результаты ждут, пока не будут записаны все предыдущие
+    pending = {}
+    state = {'next': 0, 'saved': 0}
+
+    def flush():
+        while state['next'] in pending:
+            record = pending.pop(state['next'])
+            if record is not None:
+                on_record(record)
+                state['saved'] += 1
+            state['next'] += 1
+            done = state['next']
+            if done % 10 == 0 or done == len(links):
+                print(f"  Обработано {done}/{len(links)} профилей, сохранено {state['saved']}")
+
+    async def worker(session):
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            profile_info = links[i]
+            try:
+                record, reason = await fetch_profile(session, limiter, profile_info, max_retries, cache)
+            except Exception as e:
+                record, reason = None, f"ошибка обработки: {e}"
+            if record is None:
+                print(f"    ✗ {profile_info.get('inv_number', '')} {profile_info['url']}: {reason}")
+            pending[i] = record
+            flush()
+
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                     headers={"User-Agent": USER_AGENT}) as session:
+        await asyncio.gather(*(worker(session) for _ in range(min(concurrency, len(links)))))
+
+    return state['next'], state['saved']
+
+
+def run_fetch(links, on_record, concurrency: int = HTTP_CONCURRENCY,
+              host_interval: float = HOST_MIN_INTERVAL, max_retries: int = MAX_RETRIES, cache=None):
+    """Синхронная обертка над fetch_profiles"""
+    return asyncio.run(fetch_profiles(links, on_record, concurrency, host_interval, max_retries, cache))
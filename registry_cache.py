@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import struct
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from allele_bins import AlleleBins
+from genotype_store import GenotypeTable, read_table
+from parentage_engine import AlleleCoder, AlleleIndex
+
+
+# Compiled registry file: MAGIC, uint32 header length, JSON header, then 64-byte aligned arrays
+MAGIC = b"CGREG01\n"
+FORMAT_VERSION = 3
+ALIGN = 64
+
+
+def get_father_id_column(columns: Sequence[str]) -> str:
+    candidates = [
+        "reganimal",
+        "regotca",
+        "bull_id",
+        "id",
+        "ID",
+        "Идентификационный номер",
+        "Номер",
+        "Number",
+    ]
+    for c in candidates:
+        if c in columns:
+            return c
+    # fallback: first column
+    return columns[0]
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def default_cache_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".registry.bin"
+
+
+class BullRegistry:
+    """Normalized bull registry: IDs, int16 genotypes (bulls x loci x 2) and allele index."""
+
+    def __init__(self, ids_blob: np.ndarray, ids_offsets: np.ndarray, loci: List[str],
+                 genotypes: np.ndarray, index: AlleleIndex, coder: AlleleCoder, path: Optional[str] = None):
+        self.ids_blob = ids_blob
+        self.ids_offsets = ids_offsets
+        self.loci = loci
+        self.genotypes = genotypes
+        self.index = index
+        self.coder = coder
+        self.path = path  # compiled file this registry is memory-mapped from, if any
+        self._ids: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return self.genotypes.shape[0]
+
+    def bull_id(self, bi: int) -> str:
+        return bytes(self.ids_blob[self.ids_offsets[bi]:self.ids_offsets[bi + 1]]).decode("utf-8")
+
+    @property
+    def ids(self) -> List[str]:
+        if self._ids is None:
+            self._ids = [self.bull_id(bi) for bi in range(len(self))]
+        return self._ids
+
+
+def compile_registry(csv_path: str, loci_pairs: List[Tuple[str, str, str]],
+                     bins: Optional[AlleleBins] = None, source: str = "") -> BullRegistry:
+    """Read the registry CSV (or its columnar store) and encode it (the slow path the cache avoids).
+
+    With bins the raw allele sizes are binned as reported by source before encoding.
+    """
+    table = read_table(csv_path)
+    if bins is not None:
+        bins.apply(table, source)
+    return registry_from_table(table, loci_pairs)
+
+
+def registry_from_table(table: GenotypeTable, loci_pairs: List[Tuple[str, str, str]]) -> BullRegistry:
+    """In-memory registry from any bull table, e.g. one read from the genotype database."""
+    id_col = get_father_id_column(table.column_names)
+    coder = table.coder
+    loci = [locus for locus, _, _ in loci_pairs]
+    genotypes = table.genotypes(loci)
+    encoded_ids = [str(v).strip().encode("utf-8") for v in table.column(id_col).tolist()]
+    ids_offsets = np.zeros(len(encoded_ids) + 1, dtype=np.int64)
+    ids_offsets[1:] = np.cumsum([len(b) for b in encoded_ids])
+    ids_blob = np.frombuffer(b"".join(encoded_ids), dtype=np.uint8)
+    return BullRegistry(ids_blob, ids_offsets, loci, genotypes, AlleleIndex.build(genotypes), coder)
+
+
+def write_registry_cache(path: str, registry: BullRegistry, source_hash: str) -> None:
+    arrays: Dict[str, np.ndarray] = {
+        "genotypes": np.ascontiguousarray(registry.genotypes, dtype=np.int16),
+        "ids_blob": np.ascontiguousarray(registry.ids_blob, dtype=np.uint8),
+        "ids_offsets": np.ascontiguousarray(registry.ids_offsets, dtype=np.int64),
+        "index_keys": np.ascontiguousarray(registry.index.keys, dtype=np.int32),
+        "index_offsets": np.ascontiguousarray(registry.index.offsets, dtype=np.int64),
+        "index_postings": np.ascontiguousarray(registry.index.postings, dtype=np.int32),
+    }
+    layout: Dict[str, Dict] = {}
+    offset = 0
+    for name, arr in arrays.items():
+        layout[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += -(-arr.nbytes // ALIGN) * ALIGN
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "source_hash": source_hash,
+        "loci": registry.loci,
+        "vocab": registry.coder.vocab,
+        "arrays": layout,
+    }, ensure_ascii=False).encode("utf-8")
+    data_start = -(-(len(MAGIC) + 4 + len(header)) // ALIGN) * ALIGN
+
+    # write next to the target and swap in, so readers never see a partial file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for name, arr in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(arr.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, path)
+
+
+def read_registry_cache(path: str) -> Tuple[Dict, Optional[BullRegistry]]:
+    """Memory-map a compiled registry. Returns (header, registry) or ({}, None) if unreadable."""
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return {}, None
+            (header_len,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_len).decode("utf-8"))
+    except (OSError, ValueError, struct.error):
+        return {}, None
+    if header.get("version") != FORMAT_VERSION:
+        return {}, None
+    data_start = -(-(len(MAGIC) + 4 + header_len) // ALIGN) * ALIGN
+
+    arrays: Dict[str, np.ndarray] = {}
+    for name, spec in header["arrays"].items():
+        shape = tuple(spec["shape"])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.zeros(shape, dtype=spec["dtype"])
+        else:
+            arrays[name] = np.memmap(path, dtype=spec["dtype"], mode="r", offset=data_start + spec["offset"], shape=shape)
+    genotypes = arrays["genotypes"]
+    index = AlleleIndex(arrays["index_keys"], arrays["index_offsets"], arrays["index_postings"], genotypes.shape[0])
+    registry = BullRegistry(arrays["ids_blob"], arrays["ids_offsets"], header["loci"], genotypes, index,
+                            AlleleCoder(header["vocab"]), path)
+    return header, registry
+
+
+def load_registry(csv_path: str, loci_pairs: List[Tuple[str, str, str]], cache_path: Optional[str] = None,
+                  bins: Optional[AlleleBins] = None, source: str = "") -> BullRegistry:
+    """Load the encoded registry from its compiled cache, recompiling when the CSV, loci or bins changed."""
+    cache_path = cache_path or default_cache_path(csv_path)
+    source_hash = file_sha256(csv_path)
+    if bins is not None:
+        source_hash += ":bins:" + bins.digest(source)
+    loci = [locus for locus, _, _ in loci_pairs]
+
+    header, registry = read_registry_cache(cache_path)
+    if registry is not None and header.get("source_hash") == source_hash and header.get("loci") == loci:
+        return registry
+
+    print(f"Компиляция реестра быков: {csv_path} -> {cache_path}")
+    registry = compile_registry(csv_path, loci_pairs, bins, source)
+    try:
+        write_registry_cache(cache_path, registry, source_hash)
+    except OSError as e:
+        print(f"Не удалось сохранить кэш реестра ({e}), продолжаем без него")
+        return registry
+    # reopen memory-mapped so this run behaves like the cached ones
+    _header, cached = read_registry_cache(cache_path)
+    return cached if cached is not None else registry
@@ -0,0 +1,69 @@
+from typing import List, Sequence, Tuple
+
+import xlsxwriter
+
+
+class PairReportWriter:
+    """Streams child/father/blank row triples straight into an xlsx sheet.
+
+    The workbook is opened in xlsxwriter constant_memory mode, so rows are flushed
+    to disk as they are written and memory does not grow with the report size.
+    Loci flagged in mismatch_bits (bit j = loci[j]) are written with a red fill.
+    Optional extra columns (e.g. LOD) follow the loci and are filled on the father row.
+    """
+
+    META_COLS = ["reganimal", "father", "role"]
+
+    def __init__(self, path: str, loci: List[str], sheet_name: str = "report", extra_cols: Sequence[str] = ()):
+        self.workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        self.sheet = self.workbook.add_worksheet(sheet_name)
+        self.red_fmt = self.workbook.add_format({"bg_color": "#FFC7CE"})
+        header_fmt = self.workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+        self.loci = loci
+        self.pairs = 0
+
+        columns = list(self.META_COLS)
+        for locus in loci:
+            columns.append(f"{locus}_1")
+            columns.append(f"{locus}_2")
+        columns.extend(extra_cols)
+        for col, name in enumerate(columns):
+            self.sheet.write(0, col, name, header_fmt)
+        self.row = 1
+
+    def __enter__(self) -> "PairReportWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _write_animal(self, reganimal: str, father_id: str, role: str,
+                      alleles: Sequence[Tuple[str, str]], mismatch_bits: int, extra: Sequence = ()) -> None:
+        ws = self.sheet
+        ws.write(self.row, 0, reganimal)
+        ws.write(self.row, 1, father_id)
+        ws.write(self.row, 2, role)
+        col = len(self.META_COLS)
+        for j, (a1, a2) in enumerate(alleles):
+            fmt = self.red_fmt if mismatch_bits >> j & 1 else None
+            ws.write(self.row, col, a1, fmt)
+            ws.write(self.row, col + 1, a2, fmt)
+            col += 2
+        for value in extra:
+            ws.write(self.row, col, value)
+            col += 1
+        self.row += 1
+
+    def write_pair(self, reganimal: str, father_id: str, child_alleles: Sequence[Tuple[str, str]],
+                   father_alleles: Sequence[Tuple[str, str]], mismatch_bits: int, extra: Sequence = ()) -> None:
+        """Child row, father row (with the extra column values) and a blank separator row."""
+        self._write_animal(reganimal, father_id, "child", child_alleles, mismatch_bits)
+        self._write_animal(reganimal, father_id, "father", father_alleles, mismatch_bits, extra)
+        self.row += 1
+        self.pairs += 1
+
+    def add_worksheet(self, name: str):
+        return self.workbook.add_worksheet(name)
+
+    def close(self) -> None:
+        self.workbook.close()
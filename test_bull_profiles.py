@@ -0,0 +1,35 @@
+import numpy as np
+
+from bull_profiles import ORDERED_LOCI, canonical_allele, parse_profile_to_dict, parse_profiles_batch
+
+# locus spellings: canonical, lower case, synonyms, unknown
+LOCUS_POOL = ORDERED_LOCI + ["bm1818", "INRA023", "ilsts006", "SPS113", "XYZ1"]
+ALLELE_POOL = ["266", "270", "80", "0266", "0", "12345", "9999", "100", "102"]
+SEPARATORS = ["_", "-", " _ ", " ", "__", ""]
+
+
+def random_profiles(rng, n):
+    texts = []
+    for _ in range(n):
+        parts = []
+        for _ in range(rng.integers(0, 8)):
+            locus, sep = rng.choice(LOCUS_POOL), rng.choice(SEPARATORS)
+            a1, a2 = rng.choice(ALLELE_POOL, size=2)
+            parts.append(rng.choice([f"{locus}{sep}{a1}/{a2}", f" {locus}{sep}{a1} / {a2} ", f"{locus}{sep}{a1}", ""]))
+        texts.append(", ".join(parts))
+    return texts + [None, "", " , ,"]
+
+
+def test_batch_parser_matches_parse_profile_to_dict():
+    texts = random_profiles(np.random.default_rng(3), 500)
+    batch = parse_profiles_batch(texts)
+    assert len(batch) == len(texts)
+    for row, text in enumerate(texts):
+        assert batch.profile(row) == parse_profile_to_dict(text), text
+
+
+def test_strict_encoder_rejects_padded_and_long_alleles():
+    batch = parse_profiles_batch(["BM1818_0266/270, ETH3_12345/100, TGLA227_80/82, XYZ1_1/2"], encode=canonical_allele)
+    assert batch.rejected == [(0, "BM1818_0266/270"), (0, "ETH3_12345/100"), (0, "XYZ1_1/2")]
+    assert [ORDERED_LOCI[i] for i in np.flatnonzero(batch.valid[0])] == ["TGLA227"]
+    assert batch.alleles[0, ORDERED_LOCI.index("TGLA227")].tolist() == [80, 82]
@@ -0,0 +1,16 @@
+import excel_to_csv
+
+
+def test_parse_cache_key_covers_parser_version_and_loci(tmp_path, monkeypatch):
+    monkeypatch.setattr(excel_to_csv, "output_folder", str(tmp_path))
+    parsed = {"records": [], "errors": [], "log": [], "read_ok": True}
+    excel_to_csv.save_cached_parse("abc", "book.xlsx", parsed)
+    assert excel_to_csv.load_cached_parse("abc", "book.xlsx") == parsed
+
+    monkeypatch.setattr(excel_to_csv, "PARSE_VERSION", excel_to_csv.PARSE_VERSION + 1)
+    assert excel_to_csv.load_cached_parse("abc", "book.xlsx") is None
+    monkeypatch.undo()
+
+    monkeypatch.setattr(excel_to_csv, "output_folder", str(tmp_path))
+    monkeypatch.setattr(excel_to_csv, "FIXED_LOCI", excel_to_csv.CANONICAL_LOCI_ORDER[:15])
+    assert excel_to_csv.load_cached_parse("abc", "book.xlsx") is None
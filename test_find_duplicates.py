@@ -0,0 +1,89 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from find_duplicates import MAX_DIFFERENT_LOCI, MIN_COMPARED_LOCI, Records, canonical_id, find_duplicates
+from genotype_store import GenotypeTable
+
+LOCI = [f"L{i}" for i in range(12)]
+
+
+def test_canonical_id():
+    assert canonical_id("US003213323985") == "US3213323985"
+    assert canonical_id(" ru-000.123_4 ") == "RU1234"
+    assert canonical_id("не найдено") == ""
+    assert canonical_id("DE 0576") == "DE576"
+
+
+def frame(ids, genotypes):
+    data = {"bull_id": ids}
+    for j, locus in enumerate(LOCI):
+        data[f"1_{locus}"] = [g[j][0] for g in genotypes]
+        data[f"2_{locus}"] = [g[j][1] for g in genotypes]
+    return pd.DataFrame(data)
+
+
+def random_genotype(rng):
+    return [tuple(str(a) for a in rng.choice(np.arange(100, 132, 2), size=2)) for _ in LOCI]
+
+
+def brute_force_groups(records, genotypes):
+    """All-pairs scalar reference: groups of records that are the same genotype."""
+    def same(a, b):
+        compared = different = 0
+        for (a1, a2), (b1, b2) in zip(a, b):
+            x, y = [v for v in (a1, a2) if v], [v for v in (b1, b2) if v]
+            if not x or not y:
+                continue
+            compared += 1
+            if len(x) == 1 or len(y) == 1:
+                single, other = (x, y) if len(x) == 1 else (y, x)
+                different += single[0] not in other
+            else:
+                different += sorted(x) != sorted(y)
+        return compared >= MIN_COMPARED_LOCI and different <= MAX_DIFFERENT_LOCI
+
+    keys = list(zip(records.sources, records.rows))
+    groups = {k: {k} for k in keys}
+    for p, q in itertools.combinations(range(len(keys)), 2):
+        if same(genotypes[p], genotypes[q]):
+            merged = groups[keys[p]] | groups[keys[q]]
+            for k in merged:
+                groups[k] = merged
+    return {frozenset(g) for g in groups.values() if len(g) > 1}
+
+
+def test_find_duplicates_matches_all_pairs_reference():
+    rng = np.random.default_rng(7)
+    bases = [random_genotype(rng) for _ in range(30)]
+    registry_ids = [f"RU-00{12345 + k}" for k in range(30)]
+
+    lab_ids, lab = [], []
+    for k in range(10):  # same animal, allele order swapped, ID without padding and separators
+        lab_ids.append(f"RU{12345 + k}")
+        lab.append([(a2, a1) for a1, a2 in bases[k]])
+    for k in range(10, 15):  # same genotype up to one locus, another ID
+        g = list(bases[k])
+        g[3] = ("98", "98")
+        lab_ids.append(f"DE{k}")
+        lab.append(g)
+    for k in range(15, 18):  # one allele lost, same ID as written
+        g = list(bases[k])
+        g[5] = (g[5][0], "")
+        lab_ids.append(registry_ids[k])
+        lab.append(g)
+    lab_ids.append(registry_ids[20])  # an ID on someone else's genotype
+    lab.append(random_genotype(rng))
+
+    records = Records()
+    records.add("registry", GenotypeTable.from_frame(frame(registry_ids, bases)))
+    records.add("lab", GenotypeTable.from_frame(frame(lab_ids, lab)))
+    report = find_duplicates(records)
+
+    found = {frozenset(zip(g["source"], g["row"])) for _, g in report[report["kind"] != "id_conflict"].groupby("group")}
+    assert found == brute_force_groups(records, bases + lab)
+    kinds = report.drop_duplicates("group")["kind"].value_counts().to_dict()
+    assert kinds == {"id_format": 10, "same_genotype_other_id": 5, "duplicate": 3, "id_conflict": 1}
+    conflict = report[report["kind"] == "id_conflict"]
+    assert set(zip(conflict["source"], conflict["row"])) == {("registry", 21), ("lab", len(lab))}
@@ -0,0 +1,26 @@
+import pandas as pd
+import pytest
+
+import genotype_db
+
+
+def index_names(conn):
+    return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_failed_bulk_load_keeps_rows_and_indexes(tmp_path, monkeypatch):
+    conn = genotype_db.connect(str(tmp_path / genotype_db.DB_NAME))
+    herd = pd.DataFrame({"nomanimal": [1], "reganimal": ["RU1"], "1_BM1": ["100"], "2_BM1": ["102"]})
+    genotype_db.load_herd(conn, herd)
+    indexes = index_names(conn)
+
+    def broken_rows(*_args, **_kwargs):
+        raise RuntimeError("load failed")
+        yield
+
+    monkeypatch.setattr(genotype_db, "allele_rows", broken_rows)
+    with pytest.raises(RuntimeError):
+        genotype_db.load_herd(conn, herd.assign(nomanimal=[2]))
+    assert index_names(conn) == indexes
+    assert conn.execute("SELECT nomanimal FROM animals").fetchall() == [(1,)]
+    conn.close()
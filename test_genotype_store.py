@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from genotype_store import GenotypeTable, read_store, write_store
+
+
+def test_allele_columns_keep_raw_text(tmp_path):
+    df = pd.DataFrame({
+        "reganimal": ["a", "b", "c"],
+        "1_BM1818": ["266,4", "-", np.nan],
+        "2_BM1818": ["266", "268", "0"],
+        "1_BM1818_materi": ["─", " 270", "."],
+        "2_BM1818_materi": ["─", "270", ""],
+    })
+    table = GenotypeTable.from_frame(df)
+    expected = df.fillna("")
+    pd.testing.assert_frame_equal(table.to_frame(), expected)
+
+    # matching sees the normalized alleles
+    assert [table.coder.decode(c) for c in table.genotypes(["BM1818"])[:, 0, 0]] == ["266.4", "", ""]
+    assert table.genotypes(["BM1818"], suffix="_materi")[1, 0].tolist() == [270, 270]
+
+    path = str(tmp_path / "herd.npz")
+    write_store(path, table)
+    stored = read_store(path)
+    pd.testing.assert_frame_equal(stored.to_frame(), expected)
+    np.testing.assert_array_equal(stored.alleles, table.alleles)
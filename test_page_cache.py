@@ -0,0 +1,72 @@
+import csv
+import time
+
+import page_cache
+import parser_batch
+from page_cache import HtmlCache
+
+BULL = "https://xn--90aof1e.xn--p1ai/bulls/bull/{n}?token=abc"
+LIST_PAGE = ('<div class="list">{rows}</div>')
+LIST_ROW = ('<div ng-repeat="animal in animals"><div><a ng-href="/bulls/bull/{n}?token=abc" '
+            'href="/bulls/bull/{n}?token=abc">{n}</a></div><div>Бык {n}</div><div>US00185537{n}</div>'
+            '<div>0{n}.02.2020</div></div>')
+PROFILE_PAGE = ("<table><tr><td>Микросателлитный профиль</td>"
+                "<td>TGLA227_80/{n}, BM2113_128/130</td></tr></table>")
+
+
+def old_entry(cache, monkeypatch, url, days):
+    now = time.time()
+    monkeypatch.setattr(page_cache.time, "time", lambda: now - days * 86400)
+    cache.put(url, f"<html>{url}</html>")
+    monkeypatch.setattr(page_cache.time, "time", lambda: now)
+
+
+def test_read_only_close_does_not_evict(tmp_path, monkeypatch):
+    root = str(tmp_path / "cache")
+    cache = HtmlCache(root)
+    old_entry(cache, monkeypatch, BULL.format(n=1), days=30)
+    cache.close()
+
+    cache = HtmlCache(root, max_age_days=7)
+    cache.close()
+    assert BULL.format(n=1) in HtmlCache(root)
+
+    cache = HtmlCache(root, max_age_days=7)
+    cache.put(BULL.format(n=2), "<html>new</html>")
+    cache.close()
+    cache = HtmlCache(root)
+    assert BULL.format(n=1) not in cache and BULL.format(n=2) in cache
+    cache.close()
+
+
+def test_read_only_close_evicts_over_size_limit(tmp_path):
+    root = str(tmp_path / "cache")
+    cache = HtmlCache(root)
+    for n in range(5):
+        cache.put(BULL.format(n=n), f"<html>{'x' * 1000}{n}</html>")
+    cache.close()
+    limit = HtmlCache(root).total_bytes() // 2
+    HtmlCache(root, max_bytes=limit).close()
+    cache = HtmlCache(root)
+    assert 0 < len(cache) < 5 and cache.total_bytes() <= limit
+    cache.close()
+
+
+def test_reparse_takes_ids_and_dates_from_cached_list_pages(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(parser_batch, "db_file", None)
+    cache = HtmlCache(parser_batch.cache_dir)
+    monkeypatch.setattr(parser_batch, "html_cache", cache)
+    cache.put(parser_batch.list_page_url(1), LIST_PAGE.format(rows=LIST_ROW.format(n=1) + LIST_ROW.format(n=2)))
+    cache.put(parser_batch.list_page_url(2), LIST_PAGE.format(rows=LIST_ROW.format(n=3)))
+    for n in (1, 3):  # bull 2 has no cached profile page
+        cache.put(BULL.format(n=n), PROFILE_PAGE.format(n=80 + n))
+
+    parser_batch.reparse_from_cache()
+    cache.close()
+
+    with open(parser_batch.csv_file, encoding="utf-8-sig", newline="") as f:
+        rows = [(r["Идентификационный номер"], r["Дата рождения"], r["Ссылка"], r["2_TGLA227"])
+                for r in csv.DictReader(f, delimiter=";")]
+    assert rows == [("US001855371", "01.02.2020", BULL.format(n=1), "81"),
+                    ("US001855373", "03.02.2020", BULL.format(n=3), "83")]
@@ -0,0 +1,190 @@
+import numpy as np
+import pytest
+
+from assing_fathers import evaluate_match
+from parentage_engine import (
+    MISSING,
+    AlleleCoder,
+    PLACEHOLDER_ALLELES,
+    GENOTYPE_ERROR,
+    MAX_MASK_LOCI,
+    AlleleIndex,
+    exclusion_probabilities,
+    filled_loci,
+    lod_scores,
+    mask_placeholders,
+    match_counts,
+    mismatch_bits,
+    normalize_allele,
+    paternal_alleles,
+    repeat_steps,
+    score_children,
+    trio_counts,
+)
+
+LOCI = [f"L{i}" for i in range(8)]
+# odd spellings of the lab files: separators, padding, dashes, placeholders, leading zeros, text
+RAW_POOL = ["100", "102", "104", "106", " 102", "102 ", "266,4", "266.4", "266 .4", "0102", "X", "─", "0",
+            "", "-", ".", None, "98", "2", "9999"]
+
+
+def encode(rows, coder):
+    """[[(a1, a2) per locus] per animal] of raw cells -> (animals, loci, 2) int16 codes."""
+    return np.array([[[coder.encode(normalize_allele(a)) for a in pair] for pair in row] for row in rows],
+                    dtype=np.int16)
+
+
+def test_placeholder_mother_is_untyped_and_keeps_child_alleles():
+    coder = AlleleCoder()
+    children = encode([[("266", "270"), ("100", "102")]], coder)
+    mothers = mask_placeholders(encode([[("─", "─"), ("0", "0")]], coder), coder)
+    assert (mothers == MISSING).all()
+    assert filled_loci(mothers).tolist() == [0]
+    np.testing.assert_array_equal(paternal_alleles(children, mothers), children)
+
+
+def test_typed_mother_narrows_paternal_allele():
+    coder = AlleleCoder()
+    children = encode([[("266", "270")]], coder)
+    mothers = mask_placeholders(encode([[("266", "─")]], coder), coder)
+    assert paternal_alleles(children, mothers).tolist() == [[[270, MISSING]]]
+
+
+def test_pairwise_matching_compares_placeholders_as_text():
+    # evaluate_match semantics: only "", "-" and "." are missing
+    coder = AlleleCoder()
+    child = encode([[("0", "102"), ("─", "─")]], coder)
+    bull = encode([[("0", "104"), ("─", "─")]], coder)
+    assert [int(x[0, 0]) for x in match_counts(child, bull)] == [2, 0, 2]
+
+
+def random_herd(rng, n):
+    """n animals of raw cells; about a third of the loci homozygous."""
+    raw = rng.choice(np.array(RAW_POOL, dtype=object), size=(n, len(LOCI), 2))
+    homozygous = rng.random((n, len(LOCI))) < 0.3
+    raw[homozygous, 1] = raw[homozygous, 0]
+    return raw
+
+
+def scalar_view(raw, i):
+    return {locus: (normalize_allele(raw[i, j, 0]), normalize_allele(raw[i, j, 1])) for j, locus in enumerate(LOCI)}
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+@pytest.mark.parametrize("tolerant", [False, True])
+def test_engine_matches_scalar_evaluate_match(seed, tolerant):
+    rng = np.random.default_rng(seed)
+    coder = AlleleCoder()
+    raw_children, raw_bulls = random_herd(rng, 40), random_herd(rng, 150)
+    children, bulls = encode(raw_children, coder), encode(raw_bulls, coder)
+    steps = repeat_steps(LOCI, 2, {"L3": 4, "L5": 0}) if tolerant else None
+    step_of = {locus: int(s) for locus, s in zip(LOCI, steps)} if tolerant else None
+
+    matches, mismatches, compared = match_counts(children, bulls, steps)
+    expected = np.array([[evaluate_match(scalar_view(raw_children, i), scalar_view(raw_bulls, k), step_of)
+                          for k in range(len(bulls))] for i in range(len(children))])
+    np.testing.assert_array_equal(np.stack([matches, mismatches, compared], axis=2), expected)
+
+    index = AlleleIndex.build(bulls)
+    for i in range(len(children)):
+        np.testing.assert_array_equal(index.hit_counts(children[i], steps), matches[i])
+        bits = mismatch_bits(children[i], bulls, steps)
+        assert [bin(int(b)).count("1") for b in bits] == mismatches[i].tolist()
+
+    min_matched, max_mutations = 3, 2
+    reference = []
+    for i in range(len(children)):
+        passing = [(k, tuple(int(x) for x in expected[i, k])) for k in range(len(bulls))
+                   if expected[i, k, 0] >= min_matched and expected[i, k, 1] <= max_mutations]
+        passing.sort(key=lambda c: (-c[1][0], c[1][1], -c[1][2], c[0]))
+        reference.append((i, passing))
+    rows = range(len(children))
+    assert list(score_children(children, bulls, rows, min_matched, max_mutations, None, steps)) == reference
+    assert list(score_children(children, bulls, rows, min_matched, max_mutations, index, steps)) == reference
+
+
+def scalar_paternal(child, mother):
+    """Scalar paternal_alleles: locus -> (a1, a2) of the child the father must explain."""
+    out = {}
+    for locus, (c1, c2) in child.items():
+        m = {a for a in mother[locus] if a and a not in PLACEHOLDER_ALLELES}
+        if c1 and c2 and (c1 in m) != (c2 in m):
+            out[locus] = (c2, "") if c1 in m else (c1, "")
+        else:
+            out[locus] = (c1, c2)
+    return out
+
+
+def test_trio_needs_the_non_maternal_allele():
+    coder = AlleleCoder()
+    child = encode([[("100", "102")]], coder)
+    mother = encode([[("100", "104")]], coder)
+    bulls = encode([[("100", "106")], [("102", "108")], [("104", "106")]], coder)
+    assert [x[0].tolist() for x in match_counts(child, bulls)] == [[1, 1, 0], [0, 0, 1], [1, 1, 1]]
+    assert [x[0].tolist() for x in trio_counts(child, mother, bulls)] == [[0, 1, 0], [1, 0, 1], [1, 1, 1]]
+
+
+@pytest.mark.parametrize("seed", [4, 5])
+@pytest.mark.parametrize("tolerant", [False, True])
+def test_trio_counts_match_scalar_reference(seed, tolerant):
+    rng = np.random.default_rng(seed)
+    coder = AlleleCoder()
+    raw_children, raw_mothers, raw_bulls = random_herd(rng, 40), random_herd(rng, 40), random_herd(rng, 120)
+    # half of the mothers are the real ones: give the child one of her alleles
+    real = rng.random((40, len(LOCI))) < 0.5
+    raw_children[real, 0] = raw_mothers[real, rng.integers(0, 2, size=int(real.sum()))]
+    children = encode(raw_children, coder)
+    mothers = mask_placeholders(encode(raw_mothers, coder), coder)
+    bulls = encode(raw_bulls, coder)
+    steps = repeat_steps(LOCI, 2, {"L3": 4, "L5": 0}) if tolerant else None
+    step_of = {locus: int(s) for locus, s in zip(LOCI, steps)} if tolerant else None
+
+    matches, mismatches, compared = trio_counts(children, mothers, bulls, steps)
+    for i in range(len(children)):
+        paternal = scalar_paternal(scalar_view(raw_children, i), scalar_view(raw_mothers, i))
+        expected = [evaluate_match(paternal, scalar_view(raw_bulls, k), step_of) for k in range(len(bulls))]
+        assert list(zip(matches[i].tolist(), mismatches[i].tolist(), compared[i].tolist())) == expected
+
+
+def hand_case():
+    """Two loci: A with alleles 100/102/104 at 0.5/0.3/0.2, B with 200/202 at 0.6/0.4."""
+    coder = AlleleCoder()
+    freqs = np.zeros((2, 300))
+    freqs[0, [100, 102, 104]] = [0.5, 0.3, 0.2]
+    freqs[1, [200, 202]] = [0.6, 0.4]
+    child = encode([[("100", "102"), ("200", "200")]], coder)
+    mother = encode([[("102", "104"), ("", "")]], coder)
+    return coder, freqs, child, mother
+
+
+def test_lod_scores_hand_computed():
+    coder, freqs, child, mother = hand_case()
+    e = GENOTYPE_ERROR
+    homozygous_father = encode([[("100", "100"), ("202", "202")]], coder)
+    het_father = encode([[("100", "104"), ("", "")]], coder)
+    # pairwise, A: (0.5*0 + 0.3*1) / (0.5*0.3 + 0.3*0.5) = 1; B: no allele 200 in the father, LR 0
+    assert lod_scores(child, None, homozygous_father, freqs) == pytest.approx(np.log((1 - e) * 1 + e) + np.log(e))
+    # trio, A: the mother gives 102 only, so the father must give 100: LR = 1 / p(100) = 2
+    assert lod_scores(child, mother, homozygous_father, freqs) == pytest.approx(np.log((1 - e) * 2 + e) + np.log(e))
+    # pairwise, A: (0.5*0 + 0.3*0.5) / 0.3 = 0.5; B untyped in the father adds 0
+    assert lod_scores(child, None, het_father, freqs) == pytest.approx(np.log((1 - e) * 0.5 + e))
+
+
+def test_exclusion_probabilities_hand_computed():
+    _coder, freqs, child, mother = hand_case()
+    father = child.copy()
+    # pairwise: A excludes bulls without 100 or 102, (1 - 0.8)^2; B without 200, (1 - 0.6)^2
+    expected = 1 - (1 - 0.2 ** 2) * (1 - 0.4 ** 2)
+    assert exclusion_probabilities(child, father, freqs) == pytest.approx(expected)
+    # trio: at A the father must carry 100, (1 - 0.5)^2
+    expected = 1 - (1 - 0.5 ** 2) * (1 - 0.4 ** 2)
+    assert exclusion_probabilities(paternal_alleles(child, mother), father, freqs) == pytest.approx(expected)
+
+
+def test_mismatch_bits_refuse_more_loci_than_fit_the_mask():
+    n = MAX_MASK_LOCI
+    child = np.full((n, 2), 100, dtype=np.int16)
+    bulls = np.full((1, n, 2), 102, dtype=np.int16)
+    assert int(mismatch_bits(child, bulls)[0]) == (1 << n) - 1
+    with pytest.raises(ValueError):
+        mismatch_bits(np.vstack([child, child[:1]]), np.concatenate([bulls, bulls[:, :1]], axis=1))
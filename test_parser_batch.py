@@ -0,0 +1,49 @@
+import time
+
+import parser_batch
+
+
+class FakeCell:
+    def __init__(self, page):
+        self.page = page
+
+    @property
+    def text(self):
+        return self.page.text()
+
+
+class FakePage:
+    """Driver stand-in: the profile cell appears after `appear` s and gets `profile` after `filled` s."""
+
+    def __init__(self, appear=None, filled=None, profile="BM1818_266/270"):
+        self.start = time.monotonic()
+        self.appear, self.filled, self.profile = appear, filled, profile
+
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+    def text(self):
+        return self.profile if self.filled is not None and self.elapsed() >= self.filled else " "
+
+    def find_elements(self, _by, _xpath):
+        return [FakeCell(self)] if self.appear is not None and self.elapsed() >= self.appear else []
+
+
+def timed_wait(page):
+    start = time.monotonic()
+    return parser_batch.wait_profile_cell(page, timeout=2, empty_timeout=0.3), time.monotonic() - start
+
+
+def test_empty_profile_cell_waits_only_the_short_timeout():
+    text, elapsed = timed_wait(FakePage(appear=0.1))
+    assert text == "" and elapsed < 1
+
+
+def test_profile_cell_filled_after_it_appears():
+    text, elapsed = timed_wait(FakePage(appear=0.1, filled=0.25))
+    assert text == "BM1818_266/270" and elapsed < 1
+
+
+def test_missing_profile_cell_waits_the_full_timeout():
+    text, elapsed = timed_wait(FakePage())
+    assert text is None and elapsed >= 2
@@ -0,0 +1,98 @@
+import asyncio
+import csv
+import json
+import threading
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import parser_batch
+import profile_fetcher
+from profile_fetcher import run_fetch
+
+PAGE = ("<html><body><table><tr><td>Микросателлитный профиль</td>"
+        "<td>TGLA227_{n}/{m}, BM2113_128/130</td></tr></table></body></html>")
+NO_PROFILE = "<html><body><table><tr><td>Кличка</td><td>Бык</td></tr></table></body></html>"
+
+
+@pytest.fixture
+def site():
+    """Bull pages served from a background thread: (base url, [(path, time) of every request])."""
+    requests = []
+    failures = {"/bull/2": 2}  # 503 twice, then the page
+
+    async def bull(request):
+        requests.append((request.path, time.monotonic()))
+        if failures.get(request.path, 0) > 0:
+            failures[request.path] -= 1
+            return web.Response(status=503)
+        n = request.match_info["n"]
+        if n == "busy":
+            return web.Response(status=503)
+        if n == "gone":
+            return web.Response(status=404)
+        if n == "empty":
+            return web.Response(text=NO_PROFILE, content_type="text/html")
+        return web.Response(text=PAGE.format(n=80 + 2 * int(n), m=90), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/bull/{n}", bull)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = TestServer(app)
+    asyncio.run_coroutine_threadsafe(server.start_server(), loop).result()
+    yield f"http://{server.host}:{server.port}", requests
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def links(base, names):
+    return [{"url": f"{base}/bull/{n}", "id_number": f"RU{n}", "birth_date": "01.01.2020"} for n in names]
+
+
+def test_retries_rate_limit_and_order(site, monkeypatch):
+    base, requests = site
+    monkeypatch.setattr(profile_fetcher, "RETRY_DELAY", 0)
+    records = []
+    names = ["1", "2", "gone", "busy", "3", "empty", "4", "5"]
+    processed, saved = run_fetch(links(base, names), records.append, concurrency=4, host_interval=0.05, max_retries=3)
+
+    assert (processed, saved) == (len(names), 5)
+    # records come in link order even though the retried page finished last
+    assert [r["Идентификационный номер"] for r in records] == ["RU1", "RU2", "RU3", "RU4", "RU5"]
+    assert records[1]["1_TGLA227"] == "84"
+    count = {path: sum(1 for p, _ in requests if p == path) for path, _ in requests}
+    assert count["/bull/2"] == 3  # two 503, then the page
+    assert count["/bull/busy"] == 3  # every attempt used up
+    assert count["/bull/gone"] == 1  # 404 is not retried
+    # one host: requests are spread host_interval apart whatever the concurrency (single gaps
+    # jitter by the server's scheduling, so the whole span is checked)
+    starts = sorted(t for _, t in requests)
+    assert starts[-1] - starts[0] >= 0.9 * 0.05 * (len(starts) - 1)
+
+
+def test_http_stage_journals_saved_profiles(site, monkeypatch, tmp_path):
+    base, _requests = site
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(profile_fetcher, "RETRY_DELAY", 0)
+    monkeypatch.setattr(parser_batch, "html_cache", None)
+    all_links = links(base, ["1", "gone", "3"])
+
+    journal = parser_batch.Journal(parser_batch.journal_file)
+    assert parser_batch.process_profiles_http(all_links, journal, 2, 0.0) == (3, 2)
+    journal.close()
+
+    with open(parser_batch.csv_file, encoding="utf-8-sig", newline="") as f:
+        assert [row["Ссылка"] for row in csv.DictReader(f, delimiter=";")] == [all_links[0]["url"], all_links[2]["url"]]
+    with open(parser_batch.journal_file, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert [(e["url"], e["saved"]) for e in entries] == [(all_links[0]["url"], True), (all_links[2]["url"], True)]
+    # a restart skips the saved profiles and retries the failed one
+    journal = parser_batch.Journal(parser_batch.journal_file)
+    assert journal.done_urls == {all_links[0]["url"], all_links[2]["url"]}
+    journal.close()